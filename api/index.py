@@ -8,21 +8,20 @@ import os
 # Add backend directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, UploadFile, File
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+# Only what every route needs is imported here: each module loaded at import
+# time adds to every cold start. Optional clients (httpx) are imported by the
+# routes that use them.
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import RedirectResponse
 from mangum import Mangum
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timezone, timedelta
-import httpx
 import hashlib
-import secrets
-import base64
+import hmac
 import json
 
 # Load environment variables
@@ -44,28 +43,27 @@ if DATABASE_URL:
     DATABASE_URL = urllib.parse.unquote(DATABASE_URL)
 
 # ==================== DATABASE CONNECTION ====================
-import asyncpg
-from contextlib import asynccontextmanager
-
-_pool = None
-
-async def get_pool():
-    global _pool
-    if _pool is None:
-        _pool = await asyncpg.create_pool(
-            DATABASE_URL,
-            min_size=1,
-            max_size=5,
-            command_timeout=60,
-            statement_cache_size=0
-        )
-    return _pool
-
-@asynccontextmanager
-async def get_connection():
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        yield conn
+# Shared data-access module (backend/supabase_db.py); a serverless invocation
+# keeps one lazily opened connection across warm invocations instead of a pool
+from supabase_db import (
+    configure_database, request_connection, connection_metrics, get_connection, get_user_by_session_token,
+    get_user_by_email, create_session, delete_session,
+    get_profile_by_user_id, get_public_profile_bundle, update_profile, check_username_exists,
+    update_public_url, register_user, sign_in_oauth_user, new_account_data, new_session_data,
+    get_links_by_profile_id, create_link as db_create_link, get_link_by_id, delete_link as db_delete_link,
+    record_profile_view, record_link_click, record_analytics_event, get_analytics_totals,
+    get_physical_card, activate_physical_card, get_user_physical_cards, get_card_redirect
+)
+
+configure_database("serverless", DATABASE_URL)
+
+# vCards for the public profile's "Save contact" button
+from vcard import build_vcard, vcard_headers
+
+# Profile images reference content-addressed uploads; the files themselves are
+# stored, served and garbage collected by the backend
+from upload_store import UploadStore
+upload_store = UploadStore(Path(__file__).resolve().parent.parent / 'backend' / 'uploads')
 
 # ==================== PYDANTIC MODELS ====================
 
@@ -130,245 +128,19 @@ async def get_current_user(request: Request) -> dict:
     
     token = auth_header[7:]
     
-    async with get_connection() as conn:
-        session = await conn.fetchrow(
-            "SELECT * FROM user_sessions WHERE token = $1 AND expires_at > $2",
-            token, datetime.now(timezone.utc)
-        )
-        
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        
-        user = await conn.fetchrow(
-            "SELECT * FROM users WHERE user_id = $1",
-            session["user_id"]
-        )
-        
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        
-        user_dict = dict(user)
-        user_dict.pop("password", None)
-        user_dict.pop("id", None)
-        return user_dict
-
-# ==================== DATABASE OPERATIONS ====================
-
-async def get_user_by_email(email: str):
-    async with get_connection() as conn:
-        row = await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
-        return dict(row) if row else None
-
-async def get_user_by_id(user_id: str):
-    async with get_connection() as conn:
-        row = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
-        return dict(row) if row else None
-
-async def create_user(user_id: str, email: str, name: str, password: str = None, auth_type: str = "email", google_id: str = None, picture: str = None):
-    async with get_connection() as conn:
-        await conn.execute("""
-            INSERT INTO users (user_id, email, name, password, auth_type, google_id, picture, created_at, updated_at)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $8)
-            ON CONFLICT (email) DO NOTHING
-        """, user_id, email, name, password, auth_type, google_id, picture, datetime.now(timezone.utc))
-        return await get_user_by_email(email)
-
-async def create_session(session_id: str, user_id: str, token: str, expires_at: datetime):
-    async with get_connection() as conn:
-        await conn.execute("""
-            INSERT INTO user_sessions (session_id, user_id, token, created_at, expires_at)
-            VALUES ($1, $2, $3, $4, $5)
-        """, session_id, user_id, token, datetime.now(timezone.utc), expires_at)
-        return {"session_id": session_id, "user_id": user_id, "token": token}
-
-async def get_profile_by_user_id(user_id: str):
-    async with get_connection() as conn:
-        row = await conn.fetchrow("SELECT * FROM profiles WHERE user_id = $1", user_id)
-        if row:
-            result = dict(row)
-            emails = result.get("emails")
-            phones = result.get("phones")
-            if isinstance(emails, str):
-                try:
-                    result["emails"] = json.loads(emails)
-                except:
-                    result["emails"] = []
-            else:
-                result["emails"] = emails or []
-            if isinstance(phones, str):
-                try:
-                    result["phones"] = json.loads(phones)
-                except:
-                    result["phones"] = []
-            else:
-                result["phones"] = phones or []
-            return result
-        return None
-
-async def get_profile_by_username(username: str):
-    async with get_connection() as conn:
-        row = await conn.fetchrow("SELECT * FROM profiles WHERE username = $1", username)
-        if row:
-            result = dict(row)
-            emails = result.get("emails")
-            phones = result.get("phones")
-            if isinstance(emails, str):
-                try:
-                    result["emails"] = json.loads(emails)
-                except:
-                    result["emails"] = []
-            else:
-                result["emails"] = emails or []
-            if isinstance(phones, str):
-                try:
-                    result["phones"] = json.loads(phones)
-                except:
-                    result["phones"] = []
-            else:
-                result["phones"] = phones or []
-            return result
-        return None
-
-async def check_username_exists(username: str, exclude_user_id: str = None) -> bool:
-    async with get_connection() as conn:
-        if exclude_user_id:
-            row = await conn.fetchrow(
-                "SELECT 1 FROM profiles WHERE username = $1 AND user_id != $2", 
-                username, exclude_user_id
-            )
-        else:
-            row = await conn.fetchrow("SELECT 1 FROM profiles WHERE username = $1", username)
-        return row is not None
-
-async def create_profile(profile_data: dict):
-    async with get_connection() as conn:
-        emails = profile_data.get("emails", "[]")
-        if isinstance(emails, list):
-            emails = json.dumps(emails)
-        phones = profile_data.get("phones", "[]")
-        if isinstance(phones, list):
-            phones = json.dumps(phones)
-            
-        await conn.execute("""
-            INSERT INTO profiles (
-                profile_id, user_id, username, first_name, last_name, title, company,
-                bio, location, website, emails, phones, avatar, cover_image, cover_type,
-                cover_color, views, created_at, updated_at
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $18)
-        """, 
-            profile_data.get("profile_id"),
-            profile_data.get("user_id"),
-            profile_data.get("username"),
-            profile_data.get("first_name"),
-            profile_data.get("last_name"),
-            profile_data.get("title"),
-            profile_data.get("company"),
-            profile_data.get("bio"),
-            profile_data.get("location"),
-            profile_data.get("website"),
-            emails,
-            phones,
-            profile_data.get("avatar"),
-            profile_data.get("cover_image"),
-            profile_data.get("cover_type", "color"),
-            profile_data.get("cover_color", "#8645D6"),
-            profile_data.get("views", 0),
-            datetime.now(timezone.utc)
-        )
-        return await get_profile_by_username(profile_data.get("username"))
-
-async def update_profile(user_id: str, updates: dict):
-    async with get_connection() as conn:
-        set_clauses = []
-        values = []
-        idx = 1
-        
-        for key, value in updates.items():
-            if key not in ["profile_id", "user_id", "created_at"]:
-                set_clauses.append(f"{key} = ${idx}")
-                values.append(value)
-                idx += 1
-        
-        if set_clauses:
-            set_clauses.append(f"updated_at = ${idx}")
-            values.append(datetime.now(timezone.utc))
-            idx += 1
-            
-            values.append(user_id)
-            query = f"UPDATE profiles SET {', '.join(set_clauses)} WHERE user_id = ${idx}"
-            await conn.execute(query, *values)
-        
-        return await get_profile_by_user_id(user_id)
-
-async def update_public_url(user_id: str, public_url: str):
-    async with get_connection() as conn:
-        await conn.execute(
-            "UPDATE profiles SET public_url = $1, updated_at = $2 WHERE user_id = $3",
-            public_url, datetime.now(timezone.utc), user_id
-        )
-
-async def get_links_by_profile_id(profile_id: str, active_only: bool = False):
-    async with get_connection() as conn:
-        if active_only:
-            rows = await conn.fetch(
-                "SELECT * FROM links WHERE profile_id = $1 AND is_active = true ORDER BY position",
-                profile_id
-            )
-        else:
-            rows = await conn.fetch(
-                "SELECT * FROM links WHERE profile_id = $1 ORDER BY position",
-                profile_id
-            )
-        return [dict(row) for row in rows]
-
-async def increment_profile_views(profile_id: str):
-    async with get_connection() as conn:
-        await conn.execute("UPDATE profiles SET views = views + 1 WHERE profile_id = $1", profile_id)
-
-async def increment_link_clicks(link_id: str):
-    async with get_connection() as conn:
-        await conn.execute("UPDATE links SET clicks = clicks + 1 WHERE link_id = $1", link_id)
-
-async def get_physical_card(card_id: str):
-    async with get_connection() as conn:
-        row = await conn.fetchrow("SELECT * FROM physical_cards WHERE card_id = $1", card_id)
-        return dict(row) if row else None
-
-async def activate_physical_card(card_id: str, user_id: str, profile_id: str):
-    async with get_connection() as conn:
-        await conn.execute("""
-            UPDATE physical_cards 
-            SET status = 'activated', user_id = $1, profile_id = $2, activated_at = $3
-            WHERE card_id = $4
-        """, user_id, profile_id, datetime.now(timezone.utc), card_id)
-
-async def get_user_physical_cards(user_id: str):
-    async with get_connection() as conn:
-        rows = await conn.fetch(
-            "SELECT * FROM physical_cards WHERE user_id = $1 ORDER BY activated_at DESC",
-            user_id
-        )
-        return [dict(row) for row in rows]
-
-async def get_analytics_by_profile_id(profile_id: str):
-    async with get_connection() as conn:
-        views = await conn.fetchval(
-            "SELECT views FROM profiles WHERE profile_id = $1", profile_id
-        ) or 0
-        
-        clicks = await conn.fetchval(
-            "SELECT COALESCE(SUM(clicks), 0) FROM links WHERE profile_id = $1", profile_id
-        ) or 0
-        
-        contacts = await conn.fetchval(
-            "SELECT COUNT(*) FROM contacts WHERE profile_id = $1", profile_id
-        ) or 0
-        
-        return {
-            "total_views": views,
-            "total_clicks": clicks,
-            "total_contacts": contacts
-        }
+    # Session and user in one query
+    user = await get_user_by_session_token(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    
+    if not user.get("user_id"):
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    user_dict = dict(user)
+    user_dict.pop("session_expires_at", None)
+    user_dict.pop("password", None)
+    user_dict.pop("id", None)
+    return user_dict
 
 # ==================== FASTAPI APP ====================
 
@@ -383,7 +155,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-api_router = APIRouter(prefix="/api")
+# Each invocation borrows one connection, on first use, and flushes its analytics
+api_router = APIRouter(prefix="/api", dependencies=[Depends(request_connection)])
 
 # ==================== AUTH ROUTES ====================
 
@@ -396,6 +169,8 @@ async def exchange_session(request: Request, response: Response):
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id required")
     
+    import httpx
+    
     # Exchange session_id with Emergent auth
     async with httpx.AsyncClient() as client_http:
         try:
@@ -411,116 +186,33 @@ async def exchange_session(request: Request, response: Response):
             logger.error(f"Emergent auth error: {e}")
             raise HTTPException(status_code=401, detail="Authentication failed")
     
-    user_id = f"user_{uuid.uuid4().hex[:12]}"
-    now = datetime.now(timezone.utc)
-    
-    name_parts = user_data["name"].split(" ", 1)
-    first_name = name_parts[0]
-    last_name = name_parts[1] if len(name_parts) > 1 else ""
+    new_user, profile_data = new_account_data(
+        user_data["email"], user_data["name"], "google", picture=user_data.get("picture")
+    )
+    session = new_session_data()
+    user, _ = await sign_in_oauth_user(new_user, profile_data, session, f"{FRONTEND_URL}/u/")
     
-    existing_user = await get_user_by_email(user_data["email"])
-    if existing_user:
-        user_id = existing_user["user_id"]
-        async with get_connection() as conn:
-            await conn.execute(
-                "UPDATE users SET name = $1, picture = $2, updated_at = $3 WHERE user_id = $4",
-                user_data["name"], user_data.get("picture"), now, user_id
-            )
-    else:
-        await create_user(
-            user_id=user_id,
-            email=user_data["email"],
-            name=user_data["name"],
-            auth_type="google",
-            picture=user_data.get("picture")
-        )
-        
-        username = user_data["email"].split("@")[0].lower().replace(".", "")[:20]
-        if await check_username_exists(username):
-            username = f"{username}{uuid.uuid4().hex[:4]}"
-        
-        await create_profile({
-            "profile_id": f"profile_{uuid.uuid4().hex[:12]}",
-            "user_id": user_id,
-            "username": username,
-            "first_name": first_name,
-            "last_name": last_name,
-            "avatar": user_data.get("picture"),
-            "cover_color": "#8645D6",
-            "cover_type": "color",
-            "emails": json.dumps([{"type": "email", "value": user_data["email"], "label": "Principal"}]),
-            "phones": json.dumps([]),
-            "views": 0
-        })
-        
-        initial_public_url = f"{FRONTEND_URL}/u/{username}"
-        await update_public_url(user_id, initial_public_url)
-    
-    session_token = secrets.token_urlsafe(32)
-    session_id_new = f"session_{uuid.uuid4().hex[:12]}"
-    expires_at = now + timedelta(days=7)
-    
-    await create_session(session_id_new, user_id, session_token, expires_at)
-    
-    user = await get_user_by_id(user_id)
     user_dict = dict(user)
     user_dict.pop("password", None)
     user_dict.pop("id", None)
-    user_dict["session_token"] = session_token
+    user_dict["session_token"] = session["token"]
     return user_dict
 
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate, response: Response):
-    existing = await get_user_by_email(user_data.email)
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    user_id = f"user_{uuid.uuid4().hex[:12]}"
-    now = datetime.now(timezone.utc)
-    
-    name_parts = user_data.name.split(" ", 1)
-    first_name = name_parts[0]
-    last_name = name_parts[1] if len(name_parts) > 1 else ""
-    
-    await create_user(
-        user_id=user_id,
-        email=user_data.email,
-        name=user_data.name,
-        password=hash_password(user_data.password),
-        auth_type="email"
+    new_user, profile_data = new_account_data(
+        user_data.email, user_data.name, "email", password=hash_password(user_data.password)
     )
+    session = new_session_data(new_user["user_id"])
     
-    username = user_data.email.split("@")[0].lower().replace(".", "")[:20]
-    if await check_username_exists(username):
-        username = f"{username}{uuid.uuid4().hex[:4]}"
-    
-    await create_profile({
-        "profile_id": f"profile_{uuid.uuid4().hex[:12]}",
-        "user_id": user_id,
-        "username": username,
-        "first_name": first_name,
-        "last_name": last_name,
-        "cover_color": "#8645D6",
-        "cover_type": "color",
-        "emails": json.dumps([{"type": "email", "value": user_data.email, "label": "Principal"}]),
-        "phones": json.dumps([]),
-        "views": 0
-    })
-    
-    initial_public_url = f"{FRONTEND_URL}/u/{username}"
-    await update_public_url(user_id, initial_public_url)
-    
-    session_token = secrets.token_urlsafe(32)
-    session_id = f"session_{uuid.uuid4().hex[:12]}"
-    expires_at = now + timedelta(days=7)
-    
-    await create_session(session_id, user_id, session_token, expires_at)
+    user = await register_user(new_user, profile_data, session, f"{FRONTEND_URL}/u/")
+    if not user:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
-    user = await get_user_by_id(user_id)
     user_dict = dict(user)
     user_dict.pop("password", None)
     user_dict.pop("id", None)
-    user_dict["session_token"] = session_token
+    user_dict["session_token"] = session["token"]
     return user_dict
 
 @api_router.post("/auth/login")
@@ -535,17 +227,13 @@ async def login(credentials: UserLogin, response: Response):
     if not verify_password(credentials.password, user.get("password", "")):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    session_token = secrets.token_urlsafe(32)
-    session_id = f"session_{uuid.uuid4().hex[:12]}"
-    now = datetime.now(timezone.utc)
-    expires_at = now + timedelta(days=7)
-    
-    await create_session(session_id, user["user_id"], session_token, expires_at)
+    session = new_session_data(user["user_id"])
+    await create_session(session["session_id"], user["user_id"], session["token"], session["expires_at"])
     
     user_dict = dict(user)
     user_dict.pop("password", None)
     user_dict.pop("id", None)
-    user_dict["session_token"] = session_token
+    user_dict["session_token"] = session["token"]
     return user_dict
 
 @api_router.get("/auth/me")
@@ -574,7 +262,26 @@ async def update_my_profile(update_data: ProfileUpdate, user: dict = Depends(get
             else:
                 update_dict[k] = v
     
+    # An image set here replaces the uploaded one and its resized variants
+    old_profile = None
+    released = []
+    for image_field, variants_field in (("avatar", "avatar_variants"), ("cover_image", "cover_variants")):
+        if image_field not in update_dict:
+            continue
+        old_profile = old_profile or await get_profile_by_user_id(user["user_id"])
+        if old_profile and update_dict[image_field] == old_profile.get(image_field):
+            del update_dict[image_field]  # unchanged: keep its variants
+            continue
+        update_dict[variants_field] = None
+        if old_profile:
+            released.append(old_profile.get(image_field))
+            for sizes in (old_profile.get(variants_field) or {}).values():
+                released.extend(sizes.values())
+    
+    # Take the new references before dropping the old ones
+    await upload_store.retain([update_dict[field] for field in ("avatar", "cover_image") if field in update_dict])
     profile = await update_profile(user["user_id"], update_dict)
+    await upload_store.release(released)
     profile_dict = dict(profile)
     profile_dict.pop("id", None)
     return profile_dict
@@ -614,70 +321,78 @@ async def logout(request: Request):
     """Logout user"""
     auth_header = request.headers.get("Authorization")
     if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header[7:]
-        async with get_connection() as conn:
-            await conn.execute("DELETE FROM user_sessions WHERE token = $1", token)
+        await delete_session(auth_header[7:])
     return {"message": "Logged out"}
 
 # ==================== PUBLIC PROFILE ROUTES ====================
 
 @api_router.get("/public/{username}")
 async def get_public_profile(username: str, request: Request):
-    profile = await get_profile_by_username(username.lower())
-    if not profile:
+    # Profile and active links in a single round trip
+    bundle = await get_public_profile_bundle(username=username.lower())
+    if not bundle["profile"]:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    links = await get_links_by_profile_id(profile["profile_id"], active_only=True)
-    await increment_profile_views(profile["profile_id"])
-    
-    profile_dict = dict(profile)
+    profile_dict = dict(bundle["profile"])
     profile_dict.pop("id", None)
     
-    return {
-        "profile": profile_dict,
-        "links": [{"link_id": l["link_id"], "profile_id": l["profile_id"], "type": l["type"], 
-                   "platform": l["platform"], "url": l["url"], "title": l["title"],
-                   "clicks": l.get("clicks", 0), "position": l.get("position", 0), 
-                   "is_active": l.get("is_active", True), "created_at": l["created_at"]} for l in links]
-    }
+    # Written when the request's analytics are flushed
+    record_profile_view(profile_dict["profile_id"], request.headers.get("referer"))
+    
+    return {"profile": profile_dict, "links": bundle["links"]}
 
 @api_router.get("/public/{username}/card/{card_id}")
 async def get_public_profile_with_card(username: str, card_id: str, request: Request):
-    card = await get_physical_card(card_id.upper())
+    # Card, profile and active links in a single round trip
+    bundle = await get_public_profile_bundle(username=username.lower(), card_id=card_id.upper())
+    card = bundle["card"]
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
     
-    profile = await get_profile_by_username(username.lower())
-    if not profile:
+    if not bundle["profile"]:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    if card["status"] != "activated" or card.get("profile_id") != profile["profile_id"]:
+    profile_dict = dict(bundle["profile"])
+    profile_dict.pop("id", None)
+    
+    if card["status"] != "activated" or card.get("profile_id") != profile_dict["profile_id"]:
         raise HTTPException(status_code=403, detail="Card not linked to this profile")
     
-    links = await get_links_by_profile_id(profile["profile_id"], active_only=True)
-    await increment_profile_views(profile["profile_id"])
-    
-    profile_dict = dict(profile)
-    profile_dict.pop("id", None)
+    record_profile_view(profile_dict["profile_id"], f"card:{card_id.upper()}")
     
     return {
         "profile": profile_dict,
-        "links": [{"link_id": l["link_id"], "profile_id": l["profile_id"], "type": l["type"], 
-                   "platform": l["platform"], "url": l["url"], "title": l["title"],
-                   "clicks": l.get("clicks", 0), "position": l.get("position", 0), 
-                   "is_active": l.get("is_active", True), "created_at": l["created_at"]} for l in links],
+        "links": bundle["links"],
         "card_id": card_id.upper()
     }
 
 @api_router.post("/public/{username}/click/{link_id}")
 async def record_click(username: str, link_id: str):
-    profile = await get_profile_by_username(username.lower())
-    if not profile:
+    bundle = await get_public_profile_bundle(username=username.lower())
+    if not bundle["profile"]:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    await increment_link_clicks(link_id)
+    record_link_click(bundle["profile"]["profile_id"], link_id)
     return {"message": "Click recorded"}
 
+@api_router.get("/public/{username}/vcard")
+async def get_public_vcard(username: str, request: Request):
+    """Download the profile as a vCard (.vcf)"""
+    bundle = await get_public_profile_bundle(username=username.lower())
+    profile = bundle["profile"]
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    # Uploaded photos are stored on the backend's disk, so this vCard has none
+    content = build_vcard(profile, bundle["links"], f"{FRONTEND_URL}/u/{profile['username']}")
+    headers = vcard_headers(profile, content)
+    
+    record_analytics_event(profile["profile_id"], "contact_save", "vcard")
+    
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content, media_type="text/vcard; charset=utf-8", headers=headers)
+
 # ==================== CARDS ROUTES ====================
 
 @api_router.get("/cards/{card_id}")
@@ -734,6 +449,52 @@ async def get_my_cards(user: dict = Depends(get_current_user)):
     return {"cards": [{"card_id": c["card_id"], "status": c["status"], 
                        "activated_at": c.get("activated_at"), "created_at": c["created_at"]} for c in cards]}
 
+# ==================== CARD TAP REDIRECT ====================
+# Vercel rewrites /c/* here, so a tap is answered with one redirect instead of
+# loading the app only to ask the API where to go
+
+@app.get("/c/{card_id}")
+async def card_tap_redirect(card_id: str):
+    """Redirect a QR/NFC card tap straight to the profile (or activation page)"""
+    card = await get_card_redirect(card_id.upper())
+    if not card:
+        raise HTTPException(status_code=404, detail="Card not found")
+    
+    if card["status"] == "activated" and card["username"]:
+        location = f"{FRONTEND_URL}/u/{card['username']}/{card['card_id']}"
+    else:
+        location = f"{FRONTEND_URL}/activate/{card['card_id']}"
+    return RedirectResponse(location, status_code=302, headers={"Cache-Control": "no-store"})
+
+# ==================== PUBLIC PROFILE SNAPSHOTS ====================
+# Vercel rewrites /u/{username} here (not /u/{username}/{card_id}), so a shared
+# profile link paints from one HTML response while the React app loads behind it
+
+FRONTEND_BUILD_DIR = Path(os.environ.get("FRONTEND_BUILD_DIR", Path(__file__).resolve().parent.parent / "frontend" / "build"))
+SNAPSHOT_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+_app_assets = None
+
+@app.get("/u/{username}")
+async def public_profile_snapshot(username: str, request: Request):
+    """Pre-rendered public profile page (views are recorded by the app's API call)"""
+    from profile_snapshot import load_app_assets, render_profile_snapshot
+    global _app_assets
+    if _app_assets is None:
+        _app_assets = load_app_assets(FRONTEND_BUILD_DIR)
+    
+    bundle = await get_public_profile_bundle(username=username.lower())
+    if not bundle["profile"]:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    profile_dict = dict(bundle["profile"])
+    profile_dict.pop("id", None)
+    
+    html = render_profile_snapshot({"profile": profile_dict, "links": bundle["links"]}, FRONTEND_URL, _app_assets)
+    etag = f'"{hashlib.sha256(html.encode()).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": SNAPSHOT_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(html, media_type="text/html; charset=utf-8", headers=headers)
+
 # ==================== ANALYTICS ROUTES ====================
 
 @api_router.get("/analytics")
@@ -742,8 +503,7 @@ async def get_analytics(user: dict = Depends(get_current_user)):
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    analytics = await get_analytics_by_profile_id(profile["profile_id"])
-    return analytics
+    return await get_analytics_totals(profile["profile_id"])
 
 # ==================== LINKS ROUTES ====================
 
@@ -764,27 +524,15 @@ async def create_link(link_data: LinkCreate, user: dict = Depends(get_current_us
     
     link_id = f"link_{uuid.uuid4().hex[:12]}"
     
-    async with get_connection() as conn:
-        max_pos = await conn.fetchval(
-            "SELECT COALESCE(MAX(position), -1) FROM links WHERE profile_id = $1",
-            profile["profile_id"]
-        )
-        
-        await conn.execute("""
-            INSERT INTO links (link_id, profile_id, type, platform, url, title, clicks, position, is_active, created_at)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-        """,
-            link_id,
-            profile["profile_id"],
-            link_data.type,
-            link_data.platform,
-            link_data.url,
-            link_data.title or link_data.platform.title(),
-            0,
-            (max_pos or 0) + 1,
-            True,
-            datetime.now(timezone.utc)
-        )
+    # Appended after the last link; the position is assigned by the INSERT
+    await db_create_link({
+        "link_id": link_id,
+        "profile_id": profile["profile_id"],
+        "type": link_data.type,
+        "platform": link_data.platform,
+        "url": link_data.url,
+        "title": link_data.title or link_data.platform.title(),
+    })
     
     return {"link_id": link_id, "message": "Link created"}
 
@@ -794,11 +542,9 @@ async def delete_link(link_id: str, user: dict = Depends(get_current_user)):
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    async with get_connection() as conn:
-        result = await conn.execute(
-            "DELETE FROM links WHERE link_id = $1 AND profile_id = $2",
-            link_id, profile["profile_id"]
-        )
+    link = await get_link_by_id(link_id)
+    if link and link["profile_id"] == profile["profile_id"]:
+        await db_delete_link(link_id)
     
     return {"message": "Link deleted"}
 
@@ -808,6 +554,25 @@ async def delete_link(link_id: str, user: dict = Depends(get_current_user)):
 async def root():
     return {"message": "FlexCard API", "version": "2.0.0", "platform": "Vercel"}
 
+# Connection metrics reveal deployment details, so they are only returned to
+# callers sending this token in X-Health-Token; everyone else gets up/down
+HEALTH_CHECK_TOKEN = os.environ.get("HEALTH_CHECK_TOKEN", "")
+
+@api_router.get("/health/db")
+async def database_health(request: Request):
+    """Database up/down status, plus this function instance's connection metrics for internal callers"""
+    try:
+        async with get_connection() as conn:
+            await conn.fetchval("SELECT 1")
+    except Exception as e:
+        logger.error(f"Database health check failed: {e}")
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    
+    token = request.headers.get("x-health-token", "")
+    if HEALTH_CHECK_TOKEN and hmac.compare_digest(token, HEALTH_CHECK_TOKEN):
+        return {"status": "ok", **connection_metrics()}
+    return {"status": "ok"}
+
 # Include router
 app.include_router(api_router)
 
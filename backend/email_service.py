@@ -4,34 +4,42 @@ Handles all transactional emails for FlexCard
 """
 
 import os
+import random
 import asyncio
 import logging
-import resend
-from datetime import datetime
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from jinja2 import Environment, Template
+from markupsafe import Markup
+
+from supabase_db import enqueue_email, enqueue_emails, claim_emails, mark_email_sent, mark_email_unsent
 
 logger = logging.getLogger(__name__)
 
-# Initialize Resend
+# Resend settings (the SDK itself is imported on first send)
 RESEND_API_KEY = os.environ.get("RESEND_API_KEY", "")
 SENDER_EMAIL = os.environ.get("SENDER_EMAIL", "FlexCard <onboarding@resend.dev>")
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "https://flexcard.co")
 
-if RESEND_API_KEY:
-    resend.api_key = RESEND_API_KEY
-
 # Brand colors
 PRIMARY_COLOR = "#8645D6"
 DARK_COLOR = "#1a1a2e"
 
-def get_base_template(content: str, title: str = "FlexCard") -> str:
-    """Base HTML email template with FlexCard branding"""
-    return f"""
+# ==================== TEMPLATES ====================
+
+# Jinja2 templates, compiled once at import. Each email's content is placed in
+# the layout and the brand values are inlined before compiling, so everything
+# but the per-recipient fields is constant text in the compiled template and a
+# render only fills in (and HTML-escapes) those fields.
+
+LAYOUT_TEMPLATE = """
 <!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
+    <title>{{ subject }}</title>
 </head>
 <body style="margin: 0; padding: 0; background-color: #f4f4f5; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;">
     <table role="presentation" width="100%" cellspacing="0" cellpadding="0" style="background-color: #f4f4f5;">
@@ -40,7 +48,7 @@ def get_base_template(content: str, title: str = "FlexCard") -> str:
                 <table role="presentation" width="100%" cellspacing="0" cellpadding="0" style="max-width: 600px; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
                     <!-- Header -->
                     <tr>
-                        <td style="background: linear-gradient(135deg, {PRIMARY_COLOR} 0%, #6b21a8 100%); padding: 30px 40px; text-align: center;">
+                        <td style="background: linear-gradient(135deg, {{ primary_color }} 0%, #6b21a8 100%); padding: 30px 40px; text-align: center;">
                             <h1 style="margin: 0; color: #ffffff; font-size: 28px; font-weight: 700;">FlexCard</h1>
                             <p style="margin: 8px 0 0; color: rgba(255,255,255,0.9); font-size: 14px;">Votre carte de visite digitale</p>
                         </td>
@@ -48,14 +56,14 @@ def get_base_template(content: str, title: str = "FlexCard") -> str:
                     <!-- Content -->
                     <tr>
                         <td style="padding: 40px;">
-                            {content}
+                            {{ content }}
                         </td>
                     </tr>
                     <!-- Footer -->
                     <tr>
                         <td style="background-color: #f9fafb; padding: 24px 40px; text-align: center; border-top: 1px solid #e5e7eb;">
                             <p style="margin: 0 0 8px; color: #6b7280; font-size: 12px;">
-                                © {datetime.now().year} FlexCard. Tous droits réservés.
+                                © {{ year }} FlexCard. Tous droits réservés.
                             </p>
                             <p style="margin: 0; color: #9ca3af; font-size: 11px;">
                                 Cet email a été envoyé par FlexCard. Si vous n'avez pas demandé cet email, ignorez-le.
@@ -70,50 +78,42 @@ def get_base_template(content: str, title: str = "FlexCard") -> str:
 </html>
 """
 
-def get_welcome_email(user_name: str, verification_link: str = None) -> tuple:
-    """Welcome email for new users"""
-    subject = "Bienvenue sur FlexCard ! 🎉"
-    
-    verification_section = ""
-    if verification_link:
-        verification_section = f"""
-        <div style="text-align: center; margin: 30px 0;">
-            <a href="{verification_link}" style="display: inline-block; background: linear-gradient(135deg, {PRIMARY_COLOR} 0%, #6b21a8 100%); color: #ffffff; text-decoration: none; padding: 14px 32px; border-radius: 8px; font-weight: 600; font-size: 16px;">
-                Confirmer mon email
-            </a>
-        </div>
-        <p style="text-align: center; color: #6b7280; font-size: 12px; margin-top: 16px;">
-            Ou copiez ce lien : <span style="color: {PRIMARY_COLOR};">{verification_link}</span>
-        </p>
-        """
-    
-    content = f"""
-    <h2 style="margin: 0 0 16px; color: {DARK_COLOR}; font-size: 24px;">Bonjour {user_name} ! 👋</h2>
+BUTTON_STYLE = (
+    f"display: inline-block; background: linear-gradient(135deg, {PRIMARY_COLOR} 0%, #6b21a8 100%); "
+    "color: #ffffff; text-decoration: none; padding: 14px 32px; border-radius: 8px; font-weight: 600; font-size: 16px;"
+)
+
+EMAIL_TEMPLATES = {
+    "welcome": ("Bienvenue sur FlexCard ! 🎉", """
+    <h2 style="margin: 0 0 16px; color: {{ dark_color }}; font-size: 24px;">Bonjour {{ user_name }} ! 👋</h2>
     <p style="margin: 0 0 16px; color: #374151; font-size: 16px; line-height: 1.6;">
         Bienvenue sur <strong>FlexCard</strong> ! Nous sommes ravis de vous compter parmi nous.
     </p>
     <p style="margin: 0 0 24px; color: #374151; font-size: 16px; line-height: 1.6;">
         Avec FlexCard, créez votre carte de visite digitale professionnelle et partagez-la en un instant via QR code ou lien.
     </p>
-    {verification_section}
+    {% if verification_link %}
+    <div style="text-align: center; margin: 30px 0;">
+        <a href="{{ verification_link }}" style="{{ button_style }}">
+            Confirmer mon email
+        </a>
+    </div>
+    <p style="text-align: center; color: #6b7280; font-size: 12px; margin-top: 16px;">
+        Ou copiez ce lien : <span style="color: {{ primary_color }};">{{ verification_link }}</span>
+    </p>
+    {% endif %}
     <div style="background-color: #f3f4f6; border-radius: 12px; padding: 20px; margin-top: 24px;">
-        <h3 style="margin: 0 0 12px; color: {DARK_COLOR}; font-size: 16px;">🚀 Prochaines étapes :</h3>
+        <h3 style="margin: 0 0 12px; color: {{ dark_color }}; font-size: 16px;">🚀 Prochaines étapes :</h3>
         <ul style="margin: 0; padding-left: 20px; color: #4b5563; font-size: 14px; line-height: 1.8;">
             <li>Complétez votre profil avec vos informations</li>
             <li>Ajoutez vos réseaux sociaux</li>
             <li>Partagez votre carte avec vos contacts</li>
         </ul>
     </div>
-    """
-    
-    return subject, get_base_template(content, subject)
-
-def get_password_reset_email(user_name: str, reset_link: str) -> tuple:
-    """Password reset email"""
-    subject = "Réinitialisation de votre mot de passe FlexCard"
+    """),
     
-    content = f"""
-    <h2 style="margin: 0 0 16px; color: {DARK_COLOR}; font-size: 24px;">Bonjour {user_name},</h2>
+    "password_reset": ("Réinitialisation de votre mot de passe FlexCard", """
+    <h2 style="margin: 0 0 16px; color: {{ dark_color }}; font-size: 24px;">Bonjour {{ user_name }},</h2>
     <p style="margin: 0 0 16px; color: #374151; font-size: 16px; line-height: 1.6;">
         Vous avez demandé à réinitialiser votre mot de passe FlexCard.
     </p>
@@ -121,7 +121,7 @@ def get_password_reset_email(user_name: str, reset_link: str) -> tuple:
         Cliquez sur le bouton ci-dessous pour créer un nouveau mot de passe :
     </p>
     <div style="text-align: center; margin: 30px 0;">
-        <a href="{reset_link}" style="display: inline-block; background: linear-gradient(135deg, {PRIMARY_COLOR} 0%, #6b21a8 100%); color: #ffffff; text-decoration: none; padding: 14px 32px; border-radius: 8px; font-weight: 600; font-size: 16px;">
+        <a href="{{ reset_link }}" style="{{ button_style }}">
             Réinitialiser mon mot de passe
         </a>
     </div>
@@ -134,16 +134,10 @@ def get_password_reset_email(user_name: str, reset_link: str) -> tuple:
             Ignorez cet email, votre mot de passe restera inchangé.
         </p>
     </div>
-    """
+    """),
     
-    return subject, get_base_template(content, subject)
-
-def get_email_verification_email(user_name: str, verification_link: str) -> tuple:
-    """Email verification email"""
-    subject = "Confirmez votre adresse email - FlexCard"
-    
-    content = f"""
-    <h2 style="margin: 0 0 16px; color: {DARK_COLOR}; font-size: 24px;">Bonjour {user_name},</h2>
+    "email_verification": ("Confirmez votre adresse email - FlexCard", """
+    <h2 style="margin: 0 0 16px; color: {{ dark_color }}; font-size: 24px;">Bonjour {{ user_name }},</h2>
     <p style="margin: 0 0 16px; color: #374151; font-size: 16px; line-height: 1.6;">
         Merci de vous être inscrit sur FlexCard ! 
     </p>
@@ -151,68 +145,293 @@ def get_email_verification_email(user_name: str, verification_link: str) -> tupl
         Pour activer votre compte, veuillez confirmer votre adresse email en cliquant sur le bouton ci-dessous :
     </p>
     <div style="text-align: center; margin: 30px 0;">
-        <a href="{verification_link}" style="display: inline-block; background: linear-gradient(135deg, {PRIMARY_COLOR} 0%, #6b21a8 100%); color: #ffffff; text-decoration: none; padding: 14px 32px; border-radius: 8px; font-weight: 600; font-size: 16px;">
+        <a href="{{ verification_link }}" style="{{ button_style }}">
             Confirmer mon email
         </a>
     </div>
     <p style="text-align: center; color: #6b7280; font-size: 12px; margin-top: 16px;">
         Ce lien expire dans 24 heures.
     </p>
-    """
-    
-    return subject, get_base_template(content, subject)
-
-def get_card_activation_email(user_name: str, card_id: str, profile_link: str) -> tuple:
-    """Card activation confirmation email"""
-    subject = f"Votre carte FlexCard {card_id} est activée ! 🎉"
+    """),
     
-    content = f"""
-    <h2 style="margin: 0 0 16px; color: {DARK_COLOR}; font-size: 24px;">Félicitations {user_name} ! 🎉</h2>
+    "card_activation": ("Votre carte FlexCard {{ card_id }} est activée ! 🎉", """
+    <h2 style="margin: 0 0 16px; color: {{ dark_color }}; font-size: 24px;">Félicitations {{ user_name }} ! 🎉</h2>
     <p style="margin: 0 0 16px; color: #374151; font-size: 16px; line-height: 1.6;">
-        Votre carte FlexCard <strong style="color: {PRIMARY_COLOR};">{card_id}</strong> a été activée avec succès !
+        Votre carte FlexCard <strong style="color: {{ primary_color }};">{{ card_id }}</strong> a été activée avec succès !
     </p>
     <p style="margin: 0 0 24px; color: #374151; font-size: 16px; line-height: 1.6;">
         Quand quelqu'un scanne le QR code de votre carte, il sera redirigé vers votre profil FlexCard.
     </p>
     <div style="text-align: center; margin: 30px 0;">
-        <a href="{profile_link}" style="display: inline-block; background: linear-gradient(135deg, {PRIMARY_COLOR} 0%, #6b21a8 100%); color: #ffffff; text-decoration: none; padding: 14px 32px; border-radius: 8px; font-weight: 600; font-size: 16px;">
+        <a href="{{ profile_link }}" style="{{ button_style }}">
             Voir mon profil
         </a>
     </div>
     <div style="background-color: #f3f4f6; border-radius: 12px; padding: 20px; margin-top: 24px;">
-        <h3 style="margin: 0 0 12px; color: {DARK_COLOR}; font-size: 16px;">💡 Conseils :</h3>
+        <h3 style="margin: 0 0 12px; color: {{ dark_color }}; font-size: 16px;">💡 Conseils :</h3>
         <ul style="margin: 0; padding-left: 20px; color: #4b5563; font-size: 14px; line-height: 1.8;">
             <li>Gardez votre carte dans votre portefeuille</li>
             <li>Partagez votre carte lors de vos rencontres professionnelles</li>
             <li>Consultez vos analytics pour voir qui visite votre profil</li>
         </ul>
     </div>
+    """),
+}
+
+BRAND_FIELDS = {
+    "primary_color": PRIMARY_COLOR,
+    "dark_color": DARK_COLOR,
+    "button_style": BUTTON_STYLE,
+}
+
+_template_env = Environment(autoescape=True)
+
+def _compile(source: str) -> Template:
+    for name, value in BRAND_FIELDS.items():
+        source = source.replace("{{ %s }}" % name, value)
+    return _template_env.from_string(source)
+
+_layout_template = _compile(LAYOUT_TEMPLATE)
+
+# name -> (subject template, body template)
+_compiled_templates = {
+    name: (_compile(subject), _compile(LAYOUT_TEMPLATE.replace("{{ content }}", content)))
+    for name, (subject, content) in EMAIL_TEMPLATES.items()
+}
+
+def render_emails(name: str, recipients: Iterable[Dict]) -> List[Tuple[str, str]]:
+    """Render email template `name` once per recipient field dict; return [(subject, html)]
+
+    Values shared by the batch (the copyright year) are resolved once.
     """
+    subject_template, body_template = _compiled_templates[name]
+    year = datetime.now(timezone.utc).year
+    messages = []
+    for fields in recipients:
+        subject = subject_template.render(fields)
+        messages.append((subject, body_template.render(fields, subject=subject, year=year)))
+    return messages
+
+def render_email(name: str, **fields) -> Tuple[str, str]:
+    """Render a single email; return (subject, html)"""
+    return render_emails(name, [fields])[0]
+
+def get_base_template(content: str, title: str = "FlexCard") -> str:
+    """Base HTML email template with FlexCard branding, around already-built HTML content"""
+    return _layout_template.render(
+        content=Markup(content), subject=title, year=datetime.now(timezone.utc).year
+    )
+
+def get_welcome_email(user_name: str, verification_link: str = None) -> tuple:
+    """Welcome email for new users"""
+    return render_email("welcome", user_name=user_name, verification_link=verification_link)
+
+def get_password_reset_email(user_name: str, reset_link: str) -> tuple:
+    """Password reset email"""
+    return render_email("password_reset", user_name=user_name, reset_link=reset_link)
+
+def get_email_verification_email(user_name: str, verification_link: str) -> tuple:
+    """Email verification email"""
+    return render_email("email_verification", user_name=user_name, verification_link=verification_link)
+
+def get_card_activation_email(user_name: str, card_id: str, profile_link: str) -> tuple:
+    """Card activation confirmation email"""
+    return render_email("card_activation", user_name=user_name, card_id=card_id, profile_link=profile_link)
+
+def get_card_activation_emails(recipients: Iterable[Dict]) -> List[Tuple[str, str]]:
+    """Card activation emails for a campaign, one per {user_name, card_id, profile_link}"""
+    return render_emails("card_activation", recipients)
+
+# ==================== TRANSPORTS ====================
+
+class EmailNotConfigured(RuntimeError):
+    """Raised when the transport has no credentials to send with"""
+
+class ResendTransport:
+    """Sends through the Resend API"""
     
-    return subject, get_base_template(content, subject)
+    async def send(self, message: Dict) -> Optional[str]:
+        if not RESEND_API_KEY:
+            raise EmailNotConfigured("RESEND_API_KEY not configured")
+        import resend
+        resend.api_key = RESEND_API_KEY
+        # Run sync SDK in thread to keep FastAPI non-blocking
+        result = await asyncio.to_thread(resend.Emails.send, message)
+        return result.get("id")
 
-async def send_email(to_email: str, subject: str, html_content: str) -> dict:
-    """Send an email using Resend"""
-    if not RESEND_API_KEY:
-        logger.warning("RESEND_API_KEY not configured, email not sent")
-        return {"status": "skipped", "message": "Email service not configured"}
+class FakeTransport:
+    """Keeps sent messages in memory instead of sending them (local runs and tests)
+
+    The first `failures` sends raise, to exercise retries.
+    """
+    
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.sent: List[Dict] = []
     
-    params = {
+    async def send(self, message: Dict) -> Optional[str]:
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("Fake transport failure")
+        self.sent.append(message)
+        return f"fake_{len(self.sent)}"
+
+EMAIL_TRANSPORTS = {
+    "resend": ResendTransport,
+    "fake": FakeTransport,
+}
+
+email_transport = EMAIL_TRANSPORTS[os.environ.get("EMAIL_TRANSPORT", "resend")]()
+
+def build_message(to_email: str, subject: str, html_content: str) -> Dict:
+    return {
         "from": SENDER_EMAIL,
         "to": [to_email],
         "subject": subject,
         "html": html_content
     }
-    
+
+async def send_email(to_email: str, subject: str, html_content: str) -> dict:
+    """Send an email right away, bypassing the outbox"""
     try:
-        # Run sync SDK in thread to keep FastAPI non-blocking
-        result = await asyncio.to_thread(resend.Emails.send, params)
-        logger.info(f"Email sent successfully to {to_email}: {result}")
-        return {"status": "success", "message": f"Email sent to {to_email}", "email_id": result.get("id")}
+        email_id = await email_transport.send(build_message(to_email, subject, html_content))
+        logger.info(f"Email sent successfully to {to_email}: {email_id}")
+        return {"status": "success", "message": f"Email sent to {to_email}", "email_id": email_id}
+    except EmailNotConfigured:
+        logger.warning("RESEND_API_KEY not configured, email not sent")
+        return {"status": "skipped", "message": "Email service not configured"}
     except Exception as e:
         logger.error(f"Failed to send email to {to_email}: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+# ==================== OUTBOX ====================
+
+EMAIL_WORKER_CONCURRENCY = int(os.environ.get("EMAIL_WORKER_CONCURRENCY", "4"))
+EMAIL_BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", "20"))
+EMAIL_POLL_INTERVAL = float(os.environ.get("EMAIL_POLL_INTERVAL", "5"))
+EMAIL_LEASE_SECONDS = float(os.environ.get("EMAIL_LEASE_SECONDS", "300"))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_RETRY_BASE = float(os.environ.get("EMAIL_RETRY_BASE", "30"))
+EMAIL_RETRY_MAX = float(os.environ.get("EMAIL_RETRY_MAX", "3600"))
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, in seconds, after the given number of attempts"""
+    delay = min(EMAIL_RETRY_BASE * 2 ** (attempts - 1), EMAIL_RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+class OutboxWorker:
+    """Sends queued emails in the background with bounded concurrency and retries
+
+    Rows are claimed in batches with FOR UPDATE SKIP LOCKED, so several
+    workers (or server processes) can drain the same outbox. Each message
+    ends up 'sent', 'failed' (after max_attempts) or 'skipped' (no
+    transport credentials).
+    """
+    
+    def __init__(self, transport=None, concurrency: int = EMAIL_WORKER_CONCURRENCY,
+                 batch_size: int = EMAIL_BATCH_SIZE, poll_interval: float = EMAIL_POLL_INTERVAL,
+                 max_attempts: int = EMAIL_MAX_ATTEMPTS):
+        self.transport = transport or email_transport
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def notify(self) -> None:
+        """Wake the worker up for newly queued emails"""
+        self._wakeup.set()
+    
+    async def run_once(self) -> int:
+        """Claim and deliver one batch of due emails; return how many were claimed"""
+        emails = await claim_emails(self.batch_size, EMAIL_LEASE_SECONDS)
+        await asyncio.gather(*(self._deliver(email) for email in emails))
+        return len(emails)
+    
+    async def _deliver(self, email: Dict) -> None:
+        async with self._semaphore:
+            try:
+                provider_id = await self.transport.send(
+                    build_message(email["to_email"], email["subject"], email["html"])
+                )
+            except EmailNotConfigured as e:
+                logger.warning(f"Email {email['id']} not sent: {e}")
+                await mark_email_unsent(email["id"], "skipped", str(e))
+                return
+            except Exception as e:
+                if email["attempts"] >= self.max_attempts:
+                    logger.error(f"Giving up on email {email['id']} to {email['to_email']}: {e}")
+                    await mark_email_unsent(email["id"], "failed", str(e))
+                else:
+                    retry_at = datetime.now(timezone.utc) + timedelta(seconds=retry_delay(email["attempts"]))
+                    logger.warning(f"Email {email['id']} attempt {email['attempts']} failed, retrying: {e}")
+                    await mark_email_unsent(email["id"], "pending", str(e), retry_at)
+                return
+            await mark_email_sent(email["id"], provider_id)
+            logger.info(f"Email {email['id']} sent to {email['to_email']}: {provider_id}")
+    
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Email outbox worker failed: {e}")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    def start(self) -> None:
+        """Start the background worker task"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the worker; leased emails are retried once their lease expires"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+outbox_worker = OutboxWorker()
+
+async def queue_email(to_email: str, subject: str, html_content: str) -> int:
+    """Add an email to the outbox for the background worker; return its id"""
+    email_id = await enqueue_email(to_email, subject, html_content)
+    outbox_worker.notify()
+    return email_id
+
+async def queue_welcome_email(to_email: str, user_name: str, verification_link: str = None) -> int:
+    """Queue the welcome email for a new user"""
+    subject, html = get_welcome_email(user_name, verification_link)
+    return await queue_email(to_email, subject, html)
+
+async def queue_password_reset_email(to_email: str, user_name: str, reset_link: str) -> int:
+    """Queue a password reset email"""
+    subject, html = get_password_reset_email(user_name, reset_link)
+    return await queue_email(to_email, subject, html)
+
+async def queue_card_activation_emails(recipients: List[Dict]) -> List[int]:
+    """Render and queue a card activation campaign, one email per {email, user_name, card_id, profile_link}"""
+    if not recipients:
+        return []
+    rendered = get_card_activation_emails(recipients)
+    email_ids = await enqueue_emails([
+        (recipient["email"], subject, html) for recipient, (subject, html) in zip(recipients, rendered)
+    ])
+    outbox_worker.notify()
+    return email_ids
+
+# ==================== DIRECT SENDS ====================
+
 async def send_welcome_email(to_email: str, user_name: str, verification_link: str = None) -> dict:
     """Send welcome email to new user"""
     subject, html = get_welcome_email(user_name, verification_link)
@@ -0,0 +1,101 @@
+"""
+Image Processing Module using Pillow
+Turns uploaded profile images into fixed-size WebP/JPEG variants
+"""
+
+import io
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Variant sizes in pixels: square side for avatars, maximum width for covers
+VARIANT_SIZES = {
+    "avatar": (128, 256, 512),
+    "cover": (640, 1280),
+}
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# Resizing and encoding are CPU bound, keep them off the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("IMAGE_WORKERS", "2")),
+    thread_name_prefix="image"
+)
+
+class InvalidImageError(ValueError):
+    """Raised when an upload cannot be decoded as an image"""
+
+def _resize(image: Image.Image, kind: str, size: int) -> Image.Image:
+    """Resize without ever upscaling"""
+    width, height = image.size
+    if kind == "avatar":
+        side = min(size, width, height)
+        return ImageOps.fit(image, (side, side), Image.LANCZOS)
+    if width <= size:
+        return image.copy()
+    return image.resize((size, max(1, round(height * size / width))), Image.LANCZOS)
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """Convert to RGB, compositing any transparency on white"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+def _open(source: Path) -> Image.Image:
+    """Decode source as RGB with its EXIF orientation applied"""
+    try:
+        with Image.open(source) as opened:
+            image = ImageOps.exif_transpose(opened)
+            image.load()
+    except (OSError, Image.DecompressionBombError, SyntaxError) as e:
+        raise InvalidImageError(str(e)) from e
+    return _flatten(image)
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+def render_variants(source: Path, kind: str, store: Callable[[bytes, str], str]) -> Dict[str, Dict[str, str]]:
+    """Encode every variant of source and return {format: {size: filename}}
+
+    Each encoded variant is handed to store(data, extension), which persists it
+    and returns its filename. EXIF orientation is applied to the pixels and no
+    metadata is written to the variants.
+    """
+    image = _open(source)
+    variants = {"jpeg": {}, "webp": {}}
+
+    for size in VARIANT_SIZES[kind]:
+        resized = _resize(image, kind, size)
+        variants["jpeg"][str(size)] = store(_encode(resized, "jpeg"), "jpg")
+        variants["webp"][str(size)] = store(_encode(resized, "webp"), "webp")
+
+    return variants
+
+async def create_image_variants(source: Path, kind: str, store: Callable[[bytes, str], str]) -> Dict[str, Dict[str, str]]:
+    """Render and store variants in the image worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, render_variants, source, kind, store)
+
+def render_thumbnail(source: Path, size: int) -> bytes:
+    """Square JPEG thumbnail of source, at most size pixels wide"""
+    return _encode(_resize(_open(source), "avatar", size), "jpeg")
+
+async def create_thumbnail(source: Path, size: int) -> bytes:
+    """Render a JPEG thumbnail in the image worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, render_thumbnail, source, size)
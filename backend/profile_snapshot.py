@@ -0,0 +1,155 @@
+"""
+Public Profile Snapshot Module
+Renders a lightweight static HTML page of a public profile for /u/{username}, so
+a scanned card shows the profile after a single round trip while the React app
+loads behind it
+"""
+
+import re
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from jinja2 import Environment
+
+logger = logging.getLogger(__name__)
+
+# Links with any other scheme (javascript:, data:...) are left out of the snapshot
+SAFE_LINK_SCHEMES = ("http://", "https://", "mailto:", "tel:", "sms:")
+
+DEFAULT_PRIMARY_COLOR = "#8645D6"
+
+# Profile colors end up in the inline stylesheet, so only plain hex colors are used
+HEX_COLOR_RE = re.compile(r"^#[0-9a-fA-F]{3,8}$")
+
+SNAPSHOT_TEMPLATE = """<!doctype html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1, viewport-fit=cover">
+<meta name="theme-color" content="{{ color }}">
+<title>{{ name }} | FlexCard</title>
+<meta name="description" content="{{ description }}">
+<link rel="canonical" href="{{ page_url }}">
+<meta property="og:type" content="profile">
+<meta property="og:title" content="{{ name }}">
+<meta property="og:description" content="{{ description }}">
+<meta property="og:url" content="{{ page_url }}">
+{% if og_image %}
+<meta property="og:image" content="{{ og_image }}">
+{% endif %}
+<meta name="twitter:card" content="summary">
+{% for style in styles %}
+<link rel="stylesheet" href="{{ style }}" media="print" onload="this.media='all'">
+{% endfor %}
+<style>
+*{box-sizing:border-box}
+body{margin:0;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,sans-serif;-webkit-font-smoothing:antialiased;background:#f4f4f5;color:#1a1a2e}
+#root{min-height:100vh;min-height:100dvh}
+.fc-cover{height:120px;background:{{ cover }}}
+.fc-card{max-width:480px;margin:-56px auto 0;padding:0 20px 32px;text-align:center}
+.fc-avatar{width:112px;height:112px;border-radius:50%;border:4px solid #fff;background:#e5e7eb;object-fit:cover}
+h1{margin:12px 0 4px;font-size:24px}
+.fc-sub{margin:0;color:#4b5563;font-size:15px}
+.fc-bio{margin:16px 0 0;color:#374151;font-size:15px;line-height:1.5}
+.fc-links{list-style:none;margin:24px 0 0;padding:0}
+.fc-links a{display:block;margin:0 0 12px;padding:14px 16px;border-radius:12px;background:#fff;color:{{ color }};font-weight:600;text-decoration:none;box-shadow:0 1px 3px rgba(0,0,0,.08)}
+</style>
+</head>
+<body>
+<div id="root">
+<div class="fc-cover"></div>
+<main class="fc-card">
+{% if avatar %}
+<picture>
+{% if avatar.webp %}<source type="image/webp" srcset="{{ avatar.webp }}">{% endif %}
+<img class="fc-avatar" src="{{ avatar.src }}"{% if avatar.srcset %} srcset="{{ avatar.srcset }}"{% endif %} alt="{{ name }}" width="112" height="112">
+</picture>
+{% endif %}
+<h1>{{ name }}</h1>
+{% if headline %}<p class="fc-sub">{{ headline }}</p>{% endif %}
+{% if profile.location %}<p class="fc-sub">{{ profile.location }}</p>{% endif %}
+{% if profile.bio %}<p class="fc-bio">{{ profile.bio }}</p>{% endif %}
+{% if links %}
+<ul class="fc-links">
+{% for link in links %}
+<li><a href="{{ link.url }}" ping="{{ click_url }}{{ link.link_id }}" rel="noopener">{{ link.title or link.platform or link.url }}</a></li>
+{% endfor %}
+</ul>
+{% endif %}
+</main>
+</div>
+{% for script in scripts %}
+<script defer src="{{ script }}"></script>
+{% endfor %}
+</body>
+</html>
+"""
+
+_env = Environment(autoescape=True, trim_blocks=True, lstrip_blocks=True)
+_template = _env.from_string(SNAPSHOT_TEMPLATE)
+
+def load_app_assets(build_dir: Path) -> Dict[str, List[str]]:
+    """Entry point scripts and stylesheets of the React build, from its asset-manifest.json"""
+    try:
+        manifest = json.loads((build_dir / "asset-manifest.json").read_text())
+    except (OSError, ValueError) as e:
+        logger.warning(f"No frontend build for profile snapshots ({e}); serving them without the app")
+        return {"scripts": [], "styles": []}
+    entrypoints = [f"/{path.lstrip('/')}" for path in manifest.get("entrypoints", [])]
+    return {
+        "scripts": [path for path in entrypoints if path.endswith(".js")],
+        "styles": [path for path in entrypoints if path.endswith(".css")],
+    }
+
+def _absolute(url: Optional[str], site_url: str) -> Optional[str]:
+    if url and url.startswith("/"):
+        return f"{site_url}{url}"
+    return url
+
+def _color(value: Optional[str], default: str) -> str:
+    return value if value and HEX_COLOR_RE.match(value) else default
+
+def _avatar(profile: Dict) -> Optional[Dict]:
+    """1x/2x sources for a 112px avatar, from the resized variants when there are any"""
+    variants = profile.get("avatar_variants") or {}
+    if isinstance(variants, str):
+        variants = json.loads(variants)
+    jpeg, webp = variants.get("jpeg") or {}, variants.get("webp") or {}
+    if jpeg.get("128") and jpeg.get("256"):
+        return {
+            "src": jpeg["128"],
+            "srcset": f"{jpeg['128']} 1x, {jpeg['256']} 2x",
+            "webp": f"{webp['128']} 1x, {webp['256']} 2x" if webp.get("128") and webp.get("256") else None,
+            "large": jpeg.get("512") or jpeg["256"],
+        }
+    if profile.get("avatar"):
+        return {"src": profile["avatar"], "srcset": None, "webp": None, "large": profile["avatar"]}
+    return None
+
+def render_profile_snapshot(payload: Dict, site_url: str, assets: Dict[str, List[str]]) -> str:
+    """Render the snapshot page of a public {profile, links} payload"""
+    profile = payload["profile"]
+    username = profile["username"]
+    name = " ".join(part for part in (profile.get("first_name"), profile.get("last_name")) if part) or username
+    headline = " · ".join(part for part in (profile.get("title"), profile.get("company")) if part)
+    color = _color(profile.get("primary_color"), DEFAULT_PRIMARY_COLOR)
+    avatar = _avatar(profile)
+
+    return _template.render(
+        profile=profile,
+        name=name,
+        headline=headline,
+        description=headline or profile.get("bio") or "Carte de visite digitale FlexCard",
+        color=color,
+        cover=_color(profile.get("cover_color"), color),
+        avatar=avatar,
+        og_image=_absolute(avatar and avatar["large"], site_url),
+        page_url=f"{site_url}/u/{username}",
+        click_url=f"/api/public/{username}/click/",
+        links=[link for link in payload["links"] if (link.get("url") or "").lower().startswith(SAFE_LINK_SCHEMES)],
+        # The build is served by the frontend's host, which may not be the one serving this page
+        scripts=[_absolute(script, site_url) for script in assets["scripts"]],
+        styles=[_absolute(style, site_url) for style in assets["styles"]],
+    )
@@ -1,8 +1,8 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, UploadFile, File
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import UploadFile as StarletteUploadFile
 import os
 import logging
 from pathlib import Path
@@ -14,8 +14,14 @@ import httpx
 import hashlib
 import secrets
 import base64
+import tempfile
+import csv
+import io
 import aiofiles
 import json
+import time
+import asyncio
+from jose import jwt
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -29,31 +35,52 @@ FRONTEND_URL = os.environ.get("FRONTEND_URL", "https://flexcard.co")
 
 # Supabase database operations
 from supabase_db import (
-    get_pool, close_pool, get_connection,
-    create_user, get_user_by_email, get_user_by_id, delete_user,
-    create_session, get_session_by_token, delete_session, delete_user_sessions,
-    create_profile, get_profile_by_user_id, get_profile_by_username, 
-    update_profile, delete_profile, increment_profile_views, check_username_exists,
-    update_public_url,
-    create_link, get_link_by_id, get_links_by_profile_id, 
-    update_link, delete_link, increment_link_clicks,
-    create_contact, get_contacts_by_profile_id,
-    create_analytics_event, get_analytics_by_profile_id,
-    create_physical_card, get_physical_card, activate_physical_card,
-    get_user_physical_cards, unlink_physical_card
+    warm_up_database, close_pool, get_connection, request_connection, release_request_connection,
+    get_user_by_email, delete_user,
+    create_session, get_user_by_session_token, delete_session, delete_user_sessions,
+    get_profile_by_user_id, get_public_profile_bundle,
+    update_profile, delete_profile, check_username_exists,
+    update_public_url, register_user, sign_in_oauth_user, sign_in_supabase_user,
+    new_account_data, new_session_data, SESSION_DAYS,
+    create_link, append_links, get_link_by_id, get_links_by_profile_id, reorder_links, 
+    update_link, delete_link,
+    create_contact, get_contacts_page, iter_contacts, migrate_contacts_index,
+    get_analytics_totals, get_daily_analytics, migrate_analytics_daily,
+    record_analytics_event, record_profile_view, record_link_click,
+    start_analytics_flusher, stop_analytics_flusher, migrate_upload_refs, migrate_email_outbox,
+    create_physical_cards_bulk, get_physical_card, activate_physical_card,
+    get_user_physical_cards, unlink_physical_card, get_card_redirect
 )
 
 # Email service
 from email_service import (
-    send_welcome_email, send_password_reset_email, 
+    get_welcome_email, queue_password_reset_email, outbox_worker,
     send_verification_email, send_card_activation_email
 )
 
+# In-process caches
+from cache import TTLCache
+
+# Profile image variants
+from image_processing import VARIANT_SIZES, InvalidImageError, create_image_variants, create_thumbnail
+
+# Content-addressed upload storage
+from upload_store import UploadFiles, UploadStore
+from profile_snapshot import load_app_assets, render_profile_snapshot
+from vcard import build_vcard, build_contact_vcard, vcard_headers
+
+# Stored files are named by content hash and shared between profiles; a file is
+# deleted by the collector once no profile references it for UPLOAD_GC_GRACE seconds
+upload_store = UploadStore(UPLOADS_DIR)
+UPLOAD_GC_INTERVAL = float(os.environ.get("UPLOAD_GC_INTERVAL", "600"))
+UPLOAD_GC_GRACE = float(os.environ.get("UPLOAD_GC_GRACE", "3600"))
+
 app = FastAPI()
-api_router = APIRouter(prefix="/api")
+# Every API request borrows at most one pooled connection, on first use
+api_router = APIRouter(prefix="/api", dependencies=[Depends(request_connection)])
 
 # Serve static uploads via /api/uploads to avoid frontend route conflicts
-app.mount("/api/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
+app.mount("/api/uploads", UploadFiles(directory=str(UPLOADS_DIR)), name="uploads")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -195,6 +222,11 @@ class AnalyticsEvent(BaseModel):
 class LinksReorder(BaseModel):
     link_ids: List[str]
 
+MAX_LINK_BATCH = 200
+
+class LinksBatch(BaseModel):
+    links: List[LinkCreate]
+
 # ==================== PHYSICAL CARD MODELS ====================
 
 class PhysicalCardCreate(BaseModel):
@@ -222,10 +254,22 @@ def verify_password(password: str, hashed: str) -> bool:
 # Supabase JWT verification
 SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET", "")
 
+# Verified JWT payloads keyed by token hash; an entry never outlives the token's exp
+JWT_CACHE_SIZE = int(os.environ.get("JWT_CACHE_SIZE", "10000"))
+jwt_cache = TTLCache(maxsize=JWT_CACHE_SIZE, ttl=3600)
+
 async def verify_supabase_jwt(token: str) -> Optional[dict]:
     """Verify a Supabase JWT token"""
+    # Our own session tokens are not JWTs, don't bother decoding them
+    if token.count(".") != 2:
+        return None
+    
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    payload = jwt_cache.get(token_hash)
+    if payload is not None:
+        return payload
+    
     try:
-        from jose import jwt
         # Supabase uses HS256 with the JWT secret
         payload = jwt.decode(
             token, 
@@ -233,10 +277,28 @@ async def verify_supabase_jwt(token: str) -> Optional[dict]:
             algorithms=["HS256"],
             audience="authenticated"
         )
-        return payload
     except Exception as e:
         logger.debug(f"JWT verification failed: {e}")
         return None
+    
+    if payload.get("exp"):
+        jwt_cache.set(token_hash, payload, ttl=min(jwt_cache.ttl, payload["exp"] - time.time()))
+    return payload
+
+# Authenticated routes resolve the session token (or Supabase user) on every
+# request and the dashboard fires several in parallel, so keep the resolved user
+# in memory for a short time. Anything that ends a session or changes the user
+# must call evict_cached_user().
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", "30"))
+
+session_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+supabase_user_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+def evict_cached_user(user_id: str) -> None:
+    """Drop every cached session and Supabase lookup belonging to a user"""
+    session_cache.evict(lambda cached_user: cached_user["user_id"] == user_id)
+    supabase_user_cache.evict(lambda cached_user: cached_user["user_id"] == user_id)
 
 async def get_current_user(request: Request) -> dict:
     """Get current user from session token (cookie or header) or Supabase JWT"""
@@ -254,12 +316,17 @@ async def get_current_user(request: Request) -> dict:
                 # Get user by Supabase user ID
                 supabase_user_id = jwt_payload.get("sub")
                 if supabase_user_id:
+                    cached_user = supabase_user_cache.get(supabase_user_id)
+                    if cached_user is not None:
+                        return dict(cached_user)
+                    
                     user = await get_user_by_supabase_id(supabase_user_id)
                     if user:
                         user_dict = dict(user)
                         user_dict.pop("password", None)
                         user_dict.pop("id", None)
-                        return user_dict
+                        supabase_user_cache.set(supabase_user_id, user_dict)
+                        return dict(user_dict)
         
         # If not a valid Supabase JWT, try as session token
         session_token = token
@@ -267,12 +334,17 @@ async def get_current_user(request: Request) -> dict:
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    session = await get_session_by_token(session_token)
-    if not session:
-        raise HTTPException(status_code=401, detail="Invalid session")
+    cached_user = session_cache.get(session_token)
+    if cached_user is not None:
+        return dict(cached_user)
     
-    user = await get_user_by_id(session["user_id"])
+    # Session and user in a single query
+    user = await get_user_by_session_token(session_token)
     if not user:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    
+    session_expires_at = user.pop("session_expires_at")
+    if not user.get("user_id"):
         raise HTTPException(status_code=401, detail="User not found")
     
     # Convert to dict and remove sensitive fields
@@ -280,7 +352,11 @@ async def get_current_user(request: Request) -> dict:
     user_dict.pop("password", None)
     user_dict.pop("id", None)
     
-    return user_dict
+    # Never keep a session cached past its expiry
+    ttl = min(SESSION_CACHE_TTL, (session_expires_at - datetime.now(timezone.utc)).total_seconds())
+    session_cache.set(session_token, user_dict, ttl)
+    
+    return dict(user_dict)
 
 async def get_user_by_supabase_id(supabase_user_id: str) -> Optional[dict]:
     """Get user by Supabase user ID"""
@@ -291,14 +367,109 @@ async def get_user_by_supabase_id(supabase_user_id: str) -> Optional[dict]:
         )
         return dict(row) if row else None
 
+# ==================== PUBLIC PROFILE CACHE ====================
+
+# Public profiles are read on every NFC tap / QR scan, so keep the assembled
+# {profile, links} payload in memory. Every route that changes what the public
+# page shows must call invalidate_public_profile().
+PUBLIC_PROFILE_CACHE_SIZE = int(os.environ.get("PUBLIC_PROFILE_CACHE_SIZE", "500"))
+PUBLIC_PROFILE_CACHE_TTL = float(os.environ.get("PUBLIC_PROFILE_CACHE_TTL", "60"))
+
+public_profile_cache = TTLCache(maxsize=PUBLIC_PROFILE_CACHE_SIZE, ttl=PUBLIC_PROFILE_CACHE_TTL)
+
+def cache_public_profile(bundle: dict) -> Optional[dict]:
+    """Build the public {profile, links} payload from a profile bundle and cache it"""
+    if not bundle["profile"]:
+        return None
+    
+    profile_dict = dict(bundle["profile"])
+    profile_dict.pop("id", None)
+    
+    payload = {"profile": profile_dict, "links": bundle["links"]}
+    public_profile_cache.set(profile_dict["username"], payload)
+    return payload
+
+async def load_public_profile(username: str) -> Optional[dict]:
+    """Get the public {profile, links} payload for a username (cached)"""
+    payload = public_profile_cache.get(username)
+    if payload is not None:
+        return payload
+    
+    # Profile and active links in a single round trip
+    return cache_public_profile(await get_public_profile_bundle(username=username))
+
+def invalidate_public_profile(*usernames: Optional[str]) -> None:
+    """Drop cached public payloads (and their HTML snapshots) after the profile or links changed"""
+    for username in usernames:
+        if username:
+            public_profile_cache.pop(username.lower())
+            profile_snapshot_cache.pop(username.lower())
+
+# ==================== PUBLIC PROFILE SNAPSHOTS ====================
+
+# /u/{username} is answered with a static HTML rendering of the public profile
+# that loads the React app behind it, so a scanned card paints after one round
+# trip instead of after the JS bundle. A snapshot is re-rendered on the first
+# request after invalidate_public_profile() drops it.
+FRONTEND_BUILD_DIR = Path(os.environ.get("FRONTEND_BUILD_DIR", ROOT_DIR.parent / "frontend" / "build"))
+SNAPSHOT_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+app_assets = load_app_assets(FRONTEND_BUILD_DIR)
+profile_snapshot_cache = TTLCache(maxsize=PUBLIC_PROFILE_CACHE_SIZE, ttl=PUBLIC_PROFILE_CACHE_TTL)
+
+async def load_profile_snapshot(username: str) -> Optional[tuple]:
+    """Get (html, etag) of a username's profile snapshot (cached)"""
+    snapshot = profile_snapshot_cache.get(username)
+    if snapshot is not None:
+        return snapshot
+    
+    payload = await load_public_profile(username)
+    if not payload:
+        return None
+    html = render_profile_snapshot(payload, FRONTEND_URL, app_assets)
+    snapshot = (html, f'"{hashlib.sha256(html.encode()).hexdigest()[:32]}"')
+    profile_snapshot_cache.set(username, snapshot)
+    return snapshot
+
+# ==================== CARD REDIRECT MAP ====================
+
+# card_id -> (status, username) for GET /c/{card_id}, so repeated taps of a card
+# are answered with a redirect straight from memory. Filled on first tap;
+# activate/unlink/username changes update it, the TTL bounds staleness across workers.
+CARD_CACHE_SIZE = int(os.environ.get("CARD_CACHE_SIZE", "100000"))
+CARD_CACHE_TTL = float(os.environ.get("CARD_CACHE_TTL", "300"))
+
+card_redirect_cache = TTLCache(maxsize=CARD_CACHE_SIZE, ttl=CARD_CACHE_TTL)
+
+async def load_card_redirect(card_id: str) -> Optional[tuple]:
+    """Get (status, username) for a card, or None if it does not exist"""
+    entry = card_redirect_cache.get(card_id)
+    if entry is not None:
+        return entry
+    
+    card = await get_card_redirect(card_id)
+    if not card:
+        return None
+    entry = (card["status"], card["username"])
+    card_redirect_cache.set(card_id, entry)
+    return entry
+
+def invalidate_card_redirects(card_id: str = None, username: str = None) -> None:
+    """Drop redirect entries for a card and/or every card linked to a username"""
+    if card_id:
+        card_redirect_cache.pop(card_id)
+    if username:
+        card_redirect_cache.evict(lambda entry: entry[1] == username)
+
 # ==================== APP LIFECYCLE ====================
 
 @app.on_event("startup")
 async def startup():
     """Initialize the database connection pool and run migrations"""
     logger.info("Starting up - initializing Supabase connection pool...")
-    await get_pool()
+    await warm_up_database()
     logger.info("Supabase connection pool initialized")
+    upload_store.start_collector(UPLOAD_GC_INTERVAL, UPLOAD_GC_GRACE)
     
     # Run migrations - add public_url column if not exists
     try:
@@ -307,18 +478,69 @@ async def startup():
                 ALTER TABLE profiles ADD COLUMN IF NOT EXISTS public_url TEXT
             """)
             logger.info("Database migration completed - public_url column ensured")
+            await conn.execute("""
+                ALTER TABLE profiles
+                    ADD COLUMN IF NOT EXISTS avatar_variants JSONB,
+                    ADD COLUMN IF NOT EXISTS cover_variants JSONB
+            """)
+            logger.info("Database migration completed - image variant columns ensured")
+    except Exception as e:
+        logger.warning(f"Migration note: {e}")
+    
+    try:
+        await migrate_analytics_daily()
+        logger.info("Database migration completed - analytics_daily rollup ensured")
+    except Exception as e:
+        logger.warning(f"Migration note: {e}")
+    # Only flush once the rollup is in place, so no event misses both the backfill and the rollup
+    start_analytics_flusher()
+    
+    try:
+        await migrate_upload_refs()
+        logger.info("Database migration completed - upload_refs table ensured")
+    except Exception as e:
+        logger.warning(f"Migration note: {e}")
+    
+    try:
+        await migrate_email_outbox()
+        logger.info("Database migration completed - email_outbox table ensured")
+    except Exception as e:
+        logger.warning(f"Migration note: {e}")
+    outbox_worker.start()
+    
+    try:
+        await migrate_contacts_index()
+        logger.info("Database migration completed - contacts listing index ensured")
     except Exception as e:
         logger.warning(f"Migration note: {e}")
 
 @app.on_event("shutdown")
 async def shutdown():
-    """Close the database connection pool"""
+    """Drain the analytics buffer and close the database connection pool"""
+    await upload_store.stop_collector()
+    await outbox_worker.stop()
+    logger.info("Shutting down - flushing buffered analytics...")
+    try:
+        await stop_analytics_flusher()
+    except Exception as e:
+        logger.error(f"Failed to flush analytics on shutdown: {e}")
     logger.info("Shutting down - closing Supabase connection pool...")
     await close_pool()
     logger.info("Supabase connection pool closed")
 
 # ==================== AUTH ROUTES ====================
 
+def set_session_cookie(response: Response, session_token: str) -> None:
+    response.set_cookie(
+        key="session_token",
+        value=session_token,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        path="/",
+        max_age=SESSION_DAYS * 24 * 60 * 60
+    )
+
 @api_router.post("/auth/session")
 async def exchange_session(request: Request, response: Response):
     """Exchange Emergent session_id for our session token"""
@@ -343,157 +565,48 @@ async def exchange_session(request: Request, response: Response):
             logger.error(f"Emergent auth error: {e}")
             raise HTTPException(status_code=401, detail="Authentication failed")
     
-    user_id = f"user_{uuid.uuid4().hex[:12]}"
-    now = datetime.now(timezone.utc)
-    
-    # Parse name into first/last
-    name_parts = user_data["name"].split(" ", 1)
-    first_name = name_parts[0]
-    last_name = name_parts[1] if len(name_parts) > 1 else ""
-    
-    # Check if user exists
-    existing_user = await get_user_by_email(user_data["email"])
-    if existing_user:
-        user_id = existing_user["user_id"]
-        # Update user info
-        async with get_connection() as conn:
-            await conn.execute(
-                "UPDATE users SET name = $1, picture = $2, updated_at = $3 WHERE user_id = $4",
-                user_data["name"], user_data.get("picture"), now, user_id
-            )
-    else:
-        # Create new user
-        await create_user(
-            user_id=user_id,
-            email=user_data["email"],
-            name=user_data["name"],
-            auth_type="google",
-            picture=user_data.get("picture")
-        )
-        
-        # Create default profile
-        username = user_data["email"].split("@")[0].lower().replace(".", "")[:20]
-        if await check_username_exists(username):
-            username = f"{username}{uuid.uuid4().hex[:4]}"
-        
-        await create_profile({
-            "profile_id": f"profile_{uuid.uuid4().hex[:12]}",
-            "user_id": user_id,
-            "username": username,
-            "first_name": first_name,
-            "last_name": last_name,
-            "avatar": user_data.get("picture"),
-            "cover_color": "#8645D6",
-            "cover_type": "color",
-            "emails": json.dumps([{"type": "email", "value": user_data["email"], "label": "Principal"}]),
-            "phones": json.dumps([]),
-            "views": 0
-        })
-        
-        # Set initial public_url
-        initial_public_url = f"{FRONTEND_URL}/u/{username}"
-        await update_public_url(user_id, initial_public_url)
+    new_user, profile_data = new_account_data(
+        user_data["email"], user_data["name"], "google", picture=user_data.get("picture")
+    )
+    session = new_session_data()
     
-    # Create session
-    session_token = secrets.token_urlsafe(32)
-    session_id_new = f"session_{uuid.uuid4().hex[:12]}"
-    expires_at = now + timedelta(days=7)
+    # Refresh the existing user, or create user + profile, and open a session in one transaction
+    user, created = await sign_in_oauth_user(new_user, profile_data, session, f"{FRONTEND_URL}/u/")
+    if not created:
+        evict_cached_user(user["user_id"])
     
-    await create_session(session_id_new, user_id, session_token, expires_at)
+    set_session_cookie(response, session["token"])
     
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7 * 24 * 60 * 60
-    )
-    
-    user = await get_user_by_id(user_id)
     user_dict = dict(user)
     user_dict.pop("password", None)
     user_dict.pop("id", None)
     # Include session_token for frontend to store and use in Authorization header
-    user_dict["session_token"] = session_token
+    user_dict["session_token"] = session["token"]
     return user_dict
 
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate, response: Response):
     """Register with email/password"""
-    existing = await get_user_by_email(user_data.email)
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    user_id = f"user_{uuid.uuid4().hex[:12]}"
-    now = datetime.now(timezone.utc)
-    
-    # Parse name into first/last
-    name_parts = user_data.name.split(" ", 1)
-    first_name = name_parts[0]
-    last_name = name_parts[1] if len(name_parts) > 1 else ""
-    
-    # Create user with hashed password
-    await create_user(
-        user_id=user_id,
-        email=user_data.email,
-        name=user_data.name,
-        password=hash_password(user_data.password),
-        auth_type="email"
+    new_user, profile_data = new_account_data(
+        user_data.email, user_data.name, "email", password=hash_password(user_data.password)
     )
+    session = new_session_data(new_user["user_id"])
     
-    # Create default profile
-    username = user_data.email.split("@")[0].lower().replace(".", "")[:20]
-    if await check_username_exists(username):
-        username = f"{username}{uuid.uuid4().hex[:4]}"
-    
-    profile = await create_profile({
-        "profile_id": f"profile_{uuid.uuid4().hex[:12]}",
-        "user_id": user_id,
-        "username": username,
-        "first_name": first_name,
-        "last_name": last_name,
-        "cover_color": "#8645D6",
-        "cover_type": "color",
-        "emails": json.dumps([{"type": "email", "value": user_data.email, "label": "Principal"}]),
-        "phones": json.dumps([]),
-        "views": 0
-    })
-    
-    # Set initial public_url (without card_id, will be updated when card is activated)
-    initial_public_url = f"{FRONTEND_URL}/u/{username}"
-    await update_public_url(user_id, initial_public_url)
-    
-    # Send welcome email
-    try:
-        await send_welcome_email(user_data.email, first_name)
-    except Exception as e:
-        logger.error(f"Failed to send welcome email: {e}")
-    
-    # Create session
-    session_token = secrets.token_urlsafe(32)
-    session_id = f"session_{uuid.uuid4().hex[:12]}"
-    expires_at = now + timedelta(days=7)
+    # User, default profile (with its public_url), session and the outbox row
+    # of the welcome email in one transaction; the email is sent in the background
+    welcome_email = (user_data.email, *get_welcome_email(profile_data["first_name"]))
+    user = await register_user(new_user, profile_data, session, f"{FRONTEND_URL}/u/", emails=[welcome_email])
+    if not user:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    outbox_worker.notify()
     
-    await create_session(session_id, user_id, session_token, expires_at)
+    set_session_cookie(response, session["token"])
     
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7 * 24 * 60 * 60
-    )
-    
-    user = await get_user_by_id(user_id)
     user_dict = dict(user)
     user_dict.pop("password", None)
     user_dict.pop("id", None)
     # Include session_token for frontend to store and use in Authorization header
-    user_dict["session_token"] = session_token
+    user_dict["session_token"] = session["token"]
     return user_dict
 
 @api_router.post("/auth/login")
@@ -510,28 +623,16 @@ async def login(credentials: UserLogin, response: Response):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create session
-    session_token = secrets.token_urlsafe(32)
-    session_id = f"session_{uuid.uuid4().hex[:12]}"
-    now = datetime.now(timezone.utc)
-    expires_at = now + timedelta(days=7)
+    session = new_session_data(user["user_id"])
+    await create_session(session["session_id"], user["user_id"], session["token"], session["expires_at"])
     
-    await create_session(session_id, user["user_id"], session_token, expires_at)
-    
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7 * 24 * 60 * 60
-    )
+    set_session_cookie(response, session["token"])
     
     user_dict = dict(user)
     user_dict.pop("password", None)
     user_dict.pop("id", None)
     # Include session_token for frontend to store and use in Authorization header
-    user_dict["session_token"] = session_token
+    user_dict["session_token"] = session["token"]
     return user_dict
 
 @api_router.get("/auth/me")
@@ -545,13 +646,14 @@ async def logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     if session_token:
         await delete_session(session_token)
+        session_cache.pop(session_token)
     
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Logged out"}
 
 @api_router.post("/auth/forgot-password")
 async def forgot_password(data: ForgotPasswordRequest):
-    """Request password reset - sends email via Resend"""
+    """Request password reset - queues the email for the outbox worker"""
     logger.info(f"Password reset requested for: {data.email}")
     
     # Check if user exists
@@ -574,12 +676,12 @@ async def forgot_password(data: ForgotPasswordRequest):
                 VALUES ($1, $2, $3)
             """, user["user_id"], reset_token, expires_at)
         
-        # Send email via Resend
+        # Queue the email; the outbox worker sends it via Resend
         reset_link = f"{FRONTEND_URL}/auth/reset-password?token={reset_token}"
         user_name = user.get("name", "").split()[0] or "Utilisateur"
         
-        email_result = await send_password_reset_email(data.email, user_name, reset_link)
-        logger.info(f"Password reset email result: {email_result}")
+        email_id = await queue_password_reset_email(data.email, user_name, reset_link)
+        logger.info(f"Password reset email queued: {email_id}")
     
     # Always return success for security (don't reveal if email exists)
     return {"message": "Si un compte existe avec cet email, vous recevrez un lien de réinitialisation."}
@@ -626,6 +728,8 @@ async def reset_password(request: Request):
             token
         )
     
+    evict_cached_user(token_row["user_id"])
+    
     return {"message": "Mot de passe mis à jour avec succès"}
 
 @api_router.post("/auth/verify-email")
@@ -664,87 +768,25 @@ async def verify_email(request: Request):
             token
         )
     
+    evict_cached_user(token_row["user_id"])
+    
     return {"message": "Email vérifié avec succès"}
 
 @api_router.post("/auth/supabase-sync")
 async def supabase_sync(data: SupabaseSyncRequest, response: Response):
     """Sync Supabase user with our database and create session"""
-    now = datetime.now(timezone.utc)
-    
-    # Check if user already exists by Supabase ID
-    existing_user = await get_user_by_supabase_id(data.supabase_user_id)
+    new_user, profile_data = new_account_data(
+        data.email, data.name, "supabase", supabase_user_id=data.supabase_user_id
+    )
+    session = new_session_data()
     
-    if existing_user:
-        user_id = existing_user["user_id"]
-        # Update user info
-        async with get_connection() as conn:
-            await conn.execute(
-                "UPDATE users SET name = $1, email = $2, updated_at = $3 WHERE user_id = $4",
-                data.name, data.email, now, user_id
-            )
-    else:
-        # Check if user exists by email (legacy user)
-        user_by_email = await get_user_by_email(data.email)
-        if user_by_email:
-            user_id = user_by_email["user_id"]
-            # Link Supabase ID to existing user
-            async with get_connection() as conn:
-                await conn.execute(
-                    "UPDATE users SET supabase_user_id = $1, updated_at = $2 WHERE user_id = $3",
-                    data.supabase_user_id, now, user_id
-                )
-        else:
-            # Create new user
-            user_id = f"user_{uuid.uuid4().hex[:12]}"
-            
-            # Parse name into first/last
-            name_parts = data.name.split(" ", 1)
-            first_name = name_parts[0]
-            last_name = name_parts[1] if len(name_parts) > 1 else ""
-            
-            async with get_connection() as conn:
-                await conn.execute("""
-                    INSERT INTO users (user_id, supabase_user_id, email, name, auth_type, created_at, updated_at)
-                    VALUES ($1, $2, $3, $4, $5, $6, $6)
-                """, user_id, data.supabase_user_id, data.email, data.name, "supabase", now)
-            
-            # Create default profile
-            username = data.email.split("@")[0].lower().replace(".", "")[:20]
-            if await check_username_exists(username):
-                username = f"{username}{uuid.uuid4().hex[:4]}"
-            
-            await create_profile({
-                "profile_id": f"profile_{uuid.uuid4().hex[:12]}",
-                "user_id": user_id,
-                "username": username,
-                "first_name": first_name,
-                "last_name": last_name,
-                "cover_color": "#8645D6",
-                "cover_type": "color",
-                "emails": json.dumps([{"type": "email", "value": data.email, "label": "Principal"}]),
-                "phones": json.dumps([]),
-                "views": 0
-            })
-    
-    # Create session for our backend
-    session_token = secrets.token_urlsafe(32)
-    session_id = f"session_{uuid.uuid4().hex[:12]}"
-    expires_at = now + timedelta(days=7)
-    
-    await create_session(session_id, user_id, session_token, expires_at)
+    # Update/link the existing user, or create user + profile, and open a session in one transaction
+    user, created = await sign_in_supabase_user(new_user, profile_data, session, f"{FRONTEND_URL}/u/")
+    if not created:
+        evict_cached_user(user["user_id"])
     
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7 * 24 * 60 * 60
-    )
+    set_session_cookie(response, session["token"])
     
-    # Get user and return
-    user = await get_user_by_id(user_id)
     user_dict = dict(user)
     user_dict.pop("password", None)
     user_dict.pop("id", None)
@@ -775,7 +817,27 @@ async def update_my_profile(update_data: ProfileUpdate, user: dict = Depends(get
             else:
                 update_dict[k] = v
     
+    # An image set here (e.g. an external URL) replaces the uploaded one, whose
+    # variants would otherwise still be preferred when the profile is rendered
+    old_profile = None
+    replaced = []
+    for kind, (image_field, variants_field) in PROFILE_IMAGE_FIELDS.items():
+        if image_field not in update_dict:
+            continue
+        old_profile = old_profile or await get_profile_by_user_id(user["user_id"])
+        if old_profile and update_dict[image_field] == old_profile.get(image_field):
+            del update_dict[image_field]  # unchanged: keep its variants
+            continue
+        update_dict[variants_field] = None
+        replaced.append(kind)
+    
+    # Like set_profile_image, take the new references before dropping the old ones
+    await upload_store.retain([update_dict[PROFILE_IMAGE_FIELDS[kind][0]] for kind in replaced])
     profile = await update_profile(user["user_id"], update_dict)
+    if old_profile:
+        for kind in replaced:
+            await release_profile_image(old_profile, kind)
+    invalidate_public_profile(profile["username"])
     profile_dict = dict(profile)
     profile_dict.pop("id", None)
     return profile_dict
@@ -795,6 +857,7 @@ async def update_username(request: Request, user: dict = Depends(get_current_use
     if await check_username_exists(new_username, exclude_user_id=user["user_id"]):
         raise HTTPException(status_code=400, detail="Username already taken")
     
+    old_profile = await get_profile_by_user_id(user["user_id"])
     profile = await update_profile(user["user_id"], {"username": new_username})
     
     # Update public_url with new username
@@ -806,6 +869,8 @@ async def update_username(request: Request, user: dict = Depends(get_current_use
         # No card, just username
         new_public_url = f"{FRONTEND_URL}/u/{new_username}"
     await update_public_url(user["user_id"], new_public_url)
+    invalidate_public_profile(old_profile and old_profile["username"], new_username)
+    invalidate_card_redirects(username=old_profile and old_profile["username"])
     
     profile_dict = dict(profile)
     profile_dict.pop("id", None)
@@ -833,61 +898,223 @@ async def delete_profile_route(user: dict = Depends(get_current_user)):
                 WHERE user_id = $1
             """, user["user_id"])
         
-        # Delete uploaded files
-        if profile.get("avatar") and profile["avatar"].startswith("/"):
-            filename = profile["avatar"].replace("/api/uploads/", "").replace("/uploads/", "")
-            filepath = UPLOADS_DIR / filename
-            if filepath.exists():
-                filepath.unlink()
-        
-        if profile.get("cover_image") and profile["cover_image"].startswith("/"):
-            filename = profile["cover_image"].replace("/api/uploads/", "").replace("/uploads/", "")
-            filepath = UPLOADS_DIR / filename
-            if filepath.exists():
-                filepath.unlink()
-        
         # Delete profile
         await delete_profile(profile_id)
+        invalidate_card_redirects(username=profile["username"])
+        
+        # Release uploaded files
+        await release_profile_image(profile, "avatar")
+        await release_profile_image(profile, "cover")
+        invalidate_public_profile(profile["username"])
     
     # Delete user sessions and user
     await delete_user_sessions(user["user_id"])
+    evict_cached_user(user["user_id"])
     await delete_user(user["user_id"])
     
     return {"message": "Profile and account deleted successfully"}
 
 # ==================== IMAGE UPLOAD ROUTES ====================
 
-@api_router.post("/upload/avatar")
-async def upload_avatar(request: Request, user: dict = Depends(get_current_user)):
-    """Upload avatar image (base64)"""
-    data = await request.json()
+# Uploads are written to disk chunk by chunk, so a request never holds the whole
+# image in memory. They are staged in UPLOAD_TMP_DIR, outside the publicly
+# served UPLOADS_DIR, until they have been resized into their variants.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_TMP_DIR = Path(os.environ.get("UPLOAD_TMP_DIR") or Path(tempfile.gettempdir()) / "flexcard-uploads")
+UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+
+IMAGE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+def limit_request_body(request: Request, max_bytes: int) -> Request:
+    """The request, with its body capped at max_bytes as it is received
+
+    Unlike a Content-Length check, this also holds for chunked requests, and
+    stops the body before it is parsed or spooled any further.
+    """
+    received = 0
+    
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise HTTPException(status_code=413, detail="Image too large")
+        return message
+    
+    return Request(request.scope, receive)
+
+async def iter_upload_file(file: StarletteUploadFile):
+    """Yield the content of an uploaded file in chunks"""
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+async def iter_base64(image_data: str):
+    """Decode base64 text in slices instead of materializing the whole image"""
+    image_data = "".join(image_data.split())
+    # Slices must be a multiple of 4 characters to decode independently
+    slice_size = UPLOAD_CHUNK_SIZE // 3 * 4
+    for start in range(0, len(image_data), slice_size):
+        yield base64.b64decode(image_data[start:start + slice_size])
+
+async def save_upload(chunks, prefix: str, extension: str = "jpg") -> Path:
+    """Stream image chunks into a staging file in UPLOAD_TMP_DIR and return its path"""
+    size = 0
+    tmp_path = UPLOAD_TMP_DIR / f"{prefix}_{uuid.uuid4().hex}.{extension}"
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail="Image too large")
+                await f.write(chunk)
+        
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Image data required")
+        return tmp_path
+    except HTTPException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    except Exception as e:
+        tmp_path.unlink(missing_ok=True)
+        logger.error(f"Error saving {prefix}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save image")
+
+async def read_upload_form(request: Request) -> tuple:
+    """Parse a multipart image upload (field "file"); returns (form, file)"""
+    max_body = MAX_UPLOAD_BYTES + UPLOAD_CHUNK_SIZE
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_body:
+        raise HTTPException(status_code=413, detail="Image too large")
+    
+    # Don't hold a database connection while the body is uploaded
+    await release_request_connection()
+    form = await limit_request_body(request, max_body).form()
+    file = form.get("file")
+    if not isinstance(file, StarletteUploadFile):
+        await form.close()
+        raise HTTPException(status_code=400, detail="Image file required")
+    if file.content_type not in IMAGE_EXTENSIONS:
+        await form.close()
+        raise HTTPException(status_code=400, detail="Unsupported image type")
+    return form, file
+
+async def save_base64_upload(request: Request, prefix: str) -> Path:
+    """Save a {"image": "data:image/...;base64,..."} JSON upload"""
+    await release_request_connection()
+    # Base64 takes 4 characters per 3 bytes
+    data = await limit_request_body(request, MAX_UPLOAD_BYTES * 4 // 3 + UPLOAD_CHUNK_SIZE).json()
     image_data = data.get("image")
     
     if not image_data:
         raise HTTPException(status_code=400, detail="Image data required")
     
     # Handle base64 data
+    extension = "jpg"
     if "base64," in image_data:
-        image_data = image_data.split("base64,")[1]
-    
-    # Generate unique filename
-    filename = f"avatar_{user['user_id']}_{uuid.uuid4().hex[:8]}.jpg"
-    filepath = UPLOADS_DIR / filename
+        header, image_data = image_data.split("base64,", 1)
+        extension = IMAGE_EXTENSIONS.get(header.replace("data:", "").rstrip(";"), "jpg")
     
-    # Save image
+    return await save_upload(iter_base64(image_data), prefix, extension)
+
+# Profile column holding the displayed image and its variants, per image kind
+PROFILE_IMAGE_FIELDS = {
+    "avatar": ("avatar", "avatar_variants"),
+    "cover": ("cover_image", "cover_variants"),
+}
+
+async def set_profile_image(user_id: str, kind: str, source: Path) -> str:
+    """Resize a staged upload into its variants and attach them to the profile
+
+    Only the variants are kept: the original (with its EXIF metadata) is removed.
+    Variants go to the content-addressed store, so identical images share files.
+    The profile's image field points to the largest JPEG variant.
+    """
     try:
-        image_bytes = base64.b64decode(image_data)
-        async with aiofiles.open(filepath, 'wb') as f:
-            await f.write(image_bytes)
-    except Exception as e:
-        logger.error(f"Error saving avatar: {e}")
-        raise HTTPException(status_code=500, detail="Failed to save image")
+        filenames = await create_image_variants(source, kind, upload_store.put_bytes)
+    except InvalidImageError as e:
+        logger.warning(f"Rejected {kind} upload: {e}")
+        raise HTTPException(status_code=400, detail="Invalid image")
+    finally:
+        source.unlink(missing_ok=True)
+    
+    variants = {
+        fmt: {size: upload_store.url_for(filename) for size, filename in sizes.items()}
+        for fmt, sizes in filenames.items()
+    }
+    display_url = variants["jpeg"][str(max(VARIANT_SIZES[kind]))]
+    
+    image_field, variants_field = PROFILE_IMAGE_FIELDS[kind]
+    updates = {image_field: display_url, variants_field: json.dumps(variants)}
+    if kind == "cover":
+        updates["cover_type"] = "image"
+    
+    # Take the new references before dropping the old ones, so re-uploading the
+    # same image never lets its files reach zero references
+    old_profile = await get_profile_by_user_id(user_id)
+    await upload_store.retain(profile_image_urls(updates[image_field], variants))
+    profile = await update_profile(user_id, updates)
+    if old_profile:
+        await release_profile_image(old_profile, kind)
+    invalidate_public_profile(profile and profile["username"])
+    return display_url
+
+def delete_uploaded_file(image_url: Optional[str]) -> None:
+    """Remove a file served from /api/uploads (or legacy /uploads)"""
+    if upload_store.filename_for(image_url):
+        return  # shared content-addressed file, removed by the collector
+    if image_url and image_url.startswith("/"):
+        filename = image_url.replace("/api/uploads/", "").replace("/uploads/", "")
+        filepath = UPLOADS_DIR / filename
+        if filepath.exists():
+            filepath.unlink()
+
+def profile_image_urls(image_url: Optional[str], variants: Optional[dict]) -> List[str]:
+    """Every file URL making up a profile image: the image and its variants"""
+    urls = [image_url] if image_url else []
+    for sizes in (variants or {}).values():
+        urls.extend(sizes.values())
+    return urls
+
+async def release_profile_image(profile: dict, kind: str) -> None:
+    """Drop a profile's references to its image, deleting legacy per-user files"""
+    image_field, variants_field = PROFILE_IMAGE_FIELDS[kind]
+    urls = profile_image_urls(profile.get(image_field), profile.get(variants_field))
+    await upload_store.release(urls)
+    for image_url in urls:
+        delete_uploaded_file(image_url)
+
+@api_router.post("/upload/avatar")
+async def upload_avatar(request: Request, user: dict = Depends(get_current_user)):
+    """Upload avatar image (base64, kept for older clients - prefer /upload/avatar/file)"""
+    source = await save_base64_upload(request, "avatar")
     
-    # Return URL path that will be served via /api/uploads
-    image_url = f"/api/uploads/{filename}"
+    # Resize and update profile
+    image_url = await set_profile_image(user["user_id"], "avatar", source)
     
-    # Update profile
-    await update_profile(user["user_id"], {"avatar": image_url})
+    return {"avatar": image_url}
+
+@api_router.post("/upload/avatar/file")
+async def upload_avatar_file(request: Request, user: dict = Depends(get_current_user)):
+    """Upload avatar image (multipart/form-data, field "file")"""
+    form, file = await read_upload_form(request)
+    try:
+        source = await save_upload(iter_upload_file(file), "avatar", IMAGE_EXTENSIONS[file.content_type])
+    finally:
+        await form.close()
+    
+    # Resize and update profile
+    image_url = await set_profile_image(user["user_id"], "avatar", source)
     
     return {"avatar": image_url}
 
@@ -896,53 +1123,34 @@ async def delete_avatar(user: dict = Depends(get_current_user)):
     """Delete avatar image"""
     profile = await get_profile_by_user_id(user["user_id"])
     
-    if profile and profile.get("avatar"):
-        avatar_path = profile["avatar"]
-        if avatar_path.startswith("/api/uploads/"):
-            filename = avatar_path.replace("/api/uploads/", "")
-            filepath = UPLOADS_DIR / filename
-            if filepath.exists():
-                filepath.unlink()
-        elif avatar_path.startswith("/uploads/"):
-            filename = avatar_path.replace("/uploads/", "")
-            filepath = UPLOADS_DIR / filename
-            if filepath.exists():
-                filepath.unlink()
-    
-    await update_profile(user["user_id"], {"avatar": None})
+    await update_profile(user["user_id"], {"avatar": None, "avatar_variants": None})
+    if profile:
+        await release_profile_image(profile, "avatar")
+    invalidate_public_profile(profile and profile["username"])
     
     return {"message": "Avatar deleted"}
 
 @api_router.post("/upload/cover")
 async def upload_cover(request: Request, user: dict = Depends(get_current_user)):
-    """Upload cover image (base64)"""
-    data = await request.json()
-    image_data = data.get("image")
+    """Upload cover image (base64, kept for older clients - prefer /upload/cover/file)"""
+    source = await save_base64_upload(request, "cover")
     
-    if not image_data:
-        raise HTTPException(status_code=400, detail="Image data required")
-    
-    # Handle base64 data
-    if "base64," in image_data:
-        image_data = image_data.split("base64,")[1]
+    # Resize and update profile
+    image_url = await set_profile_image(user["user_id"], "cover", source)
     
-    # Generate unique filename
-    filename = f"cover_{user['user_id']}_{uuid.uuid4().hex[:8]}.jpg"
-    filepath = UPLOADS_DIR / filename
-    
-    # Save image
+    return {"cover_image": image_url}
+
+@api_router.post("/upload/cover/file")
+async def upload_cover_file(request: Request, user: dict = Depends(get_current_user)):
+    """Upload cover image (multipart/form-data, field "file")"""
+    form, file = await read_upload_form(request)
     try:
-        image_bytes = base64.b64decode(image_data)
-        async with aiofiles.open(filepath, 'wb') as f:
-            await f.write(image_bytes)
-    except Exception as e:
-        logger.error(f"Error saving cover: {e}")
-        raise HTTPException(status_code=500, detail="Failed to save image")
-    
-    image_url = f"/api/uploads/{filename}"
+        source = await save_upload(iter_upload_file(file), "cover", IMAGE_EXTENSIONS[file.content_type])
+    finally:
+        await form.close()
     
-    # Update profile
-    await update_profile(user["user_id"], {"cover_image": image_url, "cover_type": "image"})
+    # Resize and update profile
+    image_url = await set_profile_image(user["user_id"], "cover", source)
     
     return {"cover_image": image_url}
 
@@ -951,20 +1159,10 @@ async def delete_cover(user: dict = Depends(get_current_user)):
     """Delete cover image"""
     profile = await get_profile_by_user_id(user["user_id"])
     
-    if profile and profile.get("cover_image"):
-        cover_path = profile["cover_image"]
-        if cover_path.startswith("/api/uploads/"):
-            filename = cover_path.replace("/api/uploads/", "")
-            filepath = UPLOADS_DIR / filename
-            if filepath.exists():
-                filepath.unlink()
-        elif cover_path.startswith("/uploads/"):
-            filename = cover_path.replace("/uploads/", "")
-            filepath = UPLOADS_DIR / filename
-            if filepath.exists():
-                filepath.unlink()
-    
-    await update_profile(user["user_id"], {"cover_image": None, "cover_type": "color"})
+    await update_profile(user["user_id"], {"cover_image": None, "cover_variants": None, "cover_type": "color"})
+    if profile:
+        await release_profile_image(profile, "cover")
+    invalidate_public_profile(profile and profile["username"])
     
     return {"message": "Cover deleted"}
 
@@ -991,29 +1189,65 @@ async def create_link_route(link_data: LinkCreate, user: dict = Depends(get_curr
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    # Get max position
-    links = await get_links_by_profile_id(profile["profile_id"])
-    position = max([l.get("position", 0) for l in links], default=-1) + 1
-    
-    link_id = f"link_{uuid.uuid4().hex[:12]}"
-    
     link_doc = {
-        "link_id": link_id,
+        "link_id": f"link_{uuid.uuid4().hex[:12]}",
         "profile_id": profile["profile_id"],
         "type": link_data.type,
         "platform": link_data.platform,
         "url": link_data.url,
         "title": link_data.title,
-        "position": position,
-        "clicks": 0,
         "is_active": link_data.is_active
     }
     
+    # Appended after the last link; the position is assigned by the INSERT
     link = await create_link(link_doc)
+    invalidate_public_profile(profile["username"])
     link_dict = dict(link)
     link_dict.pop("id", None)
     return link_dict
 
+@api_router.post("/links/batch")
+async def create_links_batch(batch: LinksBatch, user: dict = Depends(get_current_user)):
+    """Append many links at once, in order (e.g. imported from another link-in-bio service)"""
+    if not 1 <= len(batch.links) <= MAX_LINK_BATCH:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_LINK_BATCH} links per batch")
+    
+    profile = await get_profile_by_user_id(user["user_id"])
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    links = await append_links(profile["profile_id"], [
+        {
+            "link_id": f"link_{uuid.uuid4().hex[:12]}",
+            "type": link_data.type,
+            "platform": link_data.platform,
+            "url": link_data.url,
+            "title": link_data.title,
+            "is_active": link_data.is_active
+        }
+        for link_data in batch.links
+    ])
+    invalidate_public_profile(profile["username"])
+    for link in links:
+        link.pop("id", None)
+    return links
+
+@api_router.put("/links/reorder")
+async def reorder_links_route(reorder: LinksReorder, user: dict = Depends(get_current_user)):
+    """Reorder links (declared before /links/{link_id} so it is not shadowed by it)"""
+    profile = await get_profile_by_user_id(user["user_id"])
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    # All positions in one statement, which also returns the new ordering
+    links = await reorder_links(profile["profile_id"], reorder.link_ids)
+    invalidate_public_profile(profile["username"])
+    
+    return [{"link_id": l["link_id"], "profile_id": l["profile_id"], "type": l["type"], 
+             "platform": l["platform"], "url": l["url"], "title": l["title"],
+             "clicks": l.get("clicks", 0), "position": l.get("position", 0), 
+             "is_active": l.get("is_active", True), "created_at": l["created_at"]} for l in links]
+
 @api_router.put("/links/{link_id}")
 async def update_link_route(link_id: str, update_data: LinkUpdate, user: dict = Depends(get_current_user)):
     """Update a link"""
@@ -1028,6 +1262,7 @@ async def update_link_route(link_id: str, update_data: LinkUpdate, user: dict =
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     
     updated_link = await update_link(link_id, update_dict)
+    invalidate_public_profile(profile["username"])
     link_dict = dict(updated_link)
     link_dict.pop("id", None)
     return link_dict
@@ -1044,41 +1279,116 @@ async def delete_link_route(link_id: str, user: dict = Depends(get_current_user)
         raise HTTPException(status_code=404, detail="Link not found")
     
     await delete_link(link_id)
+    invalidate_public_profile(profile["username"])
     return {"message": "Link deleted"}
 
-@api_router.put("/links/reorder")
-async def reorder_links(reorder: LinksReorder, user: dict = Depends(get_current_user)):
-    """Reorder links"""
+# ==================== CONTACTS ROUTES ====================
+
+# Contacts are listed newest first, one page at a time: the next page starts
+# after the (created_at, contact_id) of the last contact returned, which the
+# listing index reaches directly however deep the page is. Exports stream
+# every contact through a server-side cursor instead of loading them all.
+CONTACTS_PAGE_SIZE = int(os.environ.get("CONTACTS_PAGE_SIZE", "100"))
+MAX_CONTACTS_PAGE_SIZE = 500
+CONTACTS_EXPORT_PREFETCH = int(os.environ.get("CONTACTS_EXPORT_PREFETCH", "500"))
+CONTACT_CSV_FIELDS = ["name", "email", "phone", "message", "created_at", "contact_id"]
+
+def encode_contacts_cursor(contact: dict) -> str:
+    """Opaque cursor pointing after a contact"""
+    key = f"{contact['created_at'].isoformat()}|{contact['contact_id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_contacts_cursor(cursor: str) -> tuple:
+    """(created_at, contact_id) from a cursor, or 400"""
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, contact_id = key.split("|", 1)
+        return datetime.fromisoformat(created_at), contact_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def contact_response(contact: dict) -> dict:
+    return {"contact_id": contact["contact_id"], "profile_id": contact["profile_id"],
+            "name": contact["name"], "email": contact.get("email"), "phone": contact.get("phone"),
+            "message": contact.get("message"), "created_at": contact["created_at"]}
+
+def csv_cell(value) -> str:
+    """A CSV cell that spreadsheets will not run as a formula"""
+    if value is None:
+        return ""
+    value = value.isoformat() if isinstance(value, datetime) else str(value)
+    # Phone numbers like "+33 6..." stay as they are
+    if value[:1] in ("=", "@", "\t", "\r") or (value[:1] in ("+", "-") and not value[1:].replace(" ", "").isdigit()):
+        return "'" + value
+    return value
+
+async def stream_contacts_csv(profile_id: str):
+    """CSV export, one chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")  # so spreadsheets detect UTF-8
+    writer.writerow(CONTACT_CSV_FIELDS)
+    count = 0
+    async for contact in iter_contacts(profile_id, prefetch=CONTACTS_EXPORT_PREFETCH):
+        writer.writerow([csv_cell(contact[field]) for field in CONTACT_CSV_FIELDS])
+        count += 1
+        if count % CONTACTS_EXPORT_PREFETCH == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+async def stream_contacts_vcf(profile_id: str):
+    """Multi-entry vCard export, one chunk per batch of contacts"""
+    chunk = []
+    async for contact in iter_contacts(profile_id, prefetch=CONTACTS_EXPORT_PREFETCH):
+        chunk.append(build_contact_vcard(contact))
+        if len(chunk) == CONTACTS_EXPORT_PREFETCH:
+            yield b"".join(chunk)
+            chunk = []
+    yield b"".join(chunk)
+
+CONTACT_EXPORTS = {
+    "csv": (stream_contacts_csv, "text/csv; charset=utf-8"),
+    "vcf": (stream_contacts_vcf, "text/vcard; charset=utf-8"),
+}
+
+@api_router.get("/contacts")
+async def get_my_contacts(response: Response, limit: int = CONTACTS_PAGE_SIZE, cursor: Optional[str] = None,
+                          user: dict = Depends(get_current_user)):
+    """Get a page of contacts collected by user's profile (the next page's cursor is in X-Next-Cursor)"""
+    if not 1 <= limit <= MAX_CONTACTS_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_CONTACTS_PAGE_SIZE}")
+    after = decode_contacts_cursor(cursor) if cursor else None
+    
     profile = await get_profile_by_user_id(user["user_id"])
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    async with get_connection() as conn:
-        for i, link_id in enumerate(reorder.link_ids):
-            await conn.execute(
-                "UPDATE links SET position = $1 WHERE link_id = $2 AND profile_id = $3",
-                i, link_id, profile["profile_id"]
-            )
-    
-    links = await get_links_by_profile_id(profile["profile_id"])
-    return [{"link_id": l["link_id"], "profile_id": l["profile_id"], "type": l["type"], 
-             "platform": l["platform"], "url": l["url"], "title": l["title"],
-             "clicks": l.get("clicks", 0), "position": l.get("position", 0), 
-             "is_active": l.get("is_active", True), "created_at": l["created_at"]} for l in links]
-
-# ==================== CONTACTS ROUTES ====================
+    # One extra row tells whether there is a next page
+    contacts = await get_contacts_page(profile["profile_id"], limit + 1, after)
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        response.headers["X-Next-Cursor"] = encode_contacts_cursor(contacts[-1])
+    return [contact_response(c) for c in contacts]
 
-@api_router.get("/contacts")
-async def get_my_contacts(user: dict = Depends(get_current_user)):
-    """Get contacts collected by user's profile"""
+@api_router.get("/contacts/export")
+async def export_contacts(format: str = "csv", user: dict = Depends(get_current_user)):
+    """Download all contacts as CSV or as a multi-entry vCard (.vcf)"""
+    if format not in CONTACT_EXPORTS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(CONTACT_EXPORTS)}")
+    
     profile = await get_profile_by_user_id(user["user_id"])
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    contacts = await get_contacts_by_profile_id(profile["profile_id"])
-    return [{"contact_id": c["contact_id"], "profile_id": c["profile_id"], 
-             "name": c["name"], "email": c.get("email"), "phone": c.get("phone"),
-             "message": c.get("message"), "created_at": c["created_at"]} for c in contacts]
+    # The stream takes its own connection for as long as it runs
+    await release_request_connection()
+    stream, media_type = CONTACT_EXPORTS[format]
+    return StreamingResponse(stream(profile["profile_id"]), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="contacts-{profile["username"]}.{format}"',
+        "Cache-Control": "private, no-store",
+    })
 
 @api_router.delete("/contacts/{contact_id}")
 async def delete_contact(contact_id: str, user: dict = Depends(get_current_user)):
@@ -1106,39 +1416,25 @@ async def get_analytics(user: dict = Depends(get_current_user)):
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    # Get total views
-    total_views = profile.get("views", 0)
-    
-    # Get total link clicks
+    # Views, clicks and contacts in one query
+    totals = await get_analytics_totals(profile["profile_id"])
     links = await get_links_by_profile_id(profile["profile_id"])
-    total_clicks = sum(link.get("clicks", 0) for link in links)
     
-    # Get contacts count
-    async with get_connection() as conn:
-        row = await conn.fetchrow(
-            "SELECT COUNT(*) as count FROM contacts WHERE profile_id = $1",
-            profile["profile_id"]
-        )
-        contacts_count = row["count"] if row else 0
-    
-    # Get recent analytics events
-    events = await get_analytics_by_profile_id(profile["profile_id"], days=30)
+    # Get per-day counts (pre-aggregated in analytics_daily)
+    daily = await get_daily_analytics(profile["profile_id"], days=30)
     
-    # Aggregate by day
     daily_views = {}
     daily_clicks = {}
     
-    for event in events:
-        day = event["timestamp"].strftime("%Y-%m-%d")
-        if event["event_type"] == "view":
-            daily_views[day] = daily_views.get(day, 0) + 1
-        elif event["event_type"] == "click":
-            daily_clicks[day] = daily_clicks.get(day, 0) + 1
+    for row in daily:
+        day = row["day"].strftime("%Y-%m-%d")
+        if row["event_type"] == "view":
+            daily_views[day] = row["count"]
+        elif row["event_type"] == "click":
+            daily_clicks[day] = row["count"]
     
     return {
-        "total_views": total_views,
-        "total_clicks": total_clicks,
-        "total_contacts": contacts_count,
+        **totals,
         "daily_views": daily_views,
         "daily_clicks": daily_clicks,
         "links": [{"link_id": l["link_id"], "title": l["title"], "clicks": l.get("clicks", 0)} for l in links]
@@ -1149,132 +1445,80 @@ async def get_analytics(user: dict = Depends(get_current_user)):
 @api_router.get("/profile/user/{user_id}")
 async def get_public_profile_by_user_id(user_id: str, request: Request):
     """Get public profile by user_id (for QR code scanning)"""
-    profile = await get_profile_by_user_id(user_id)
-    if not profile:
+    # Profile and active links in a single round trip
+    payload = cache_public_profile(await get_public_profile_bundle(user_id=user_id))
+    if not payload:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    # Get active links
-    links = await get_links_by_profile_id(profile["profile_id"], active_only=True)
-    
-    # Record view
-    await increment_profile_views(profile["profile_id"])
+    # Record view (buffered, written in the next analytics flush)
+    record_profile_view(payload["profile"]["profile_id"], request.headers.get("referer"))
     
-    # Create analytics event
-    await create_analytics_event(
-        profile["profile_id"],
-        "view",
-        request.headers.get("referer")
-    )
-    
-    profile_dict = dict(profile)
-    profile_dict.pop("id", None)
-    
-    return {
-        "profile": profile_dict,
-        "links": [{"link_id": l["link_id"], "profile_id": l["profile_id"], "type": l["type"], 
-                   "platform": l["platform"], "url": l["url"], "title": l["title"],
-                   "clicks": l.get("clicks", 0), "position": l.get("position", 0), 
-                   "is_active": l.get("is_active", True), "created_at": l["created_at"]} for l in links]
-    }
+    return payload
 
 @api_router.get("/public/{username}")
 async def get_public_profile(username: str, request: Request):
     """Get public profile by username"""
-    profile = await get_profile_by_username(username.lower())
-    if not profile:
+    payload = await load_public_profile(username.lower())
+    if not payload:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    # Get active links
-    links = await get_links_by_profile_id(profile["profile_id"], active_only=True)
-    
-    # Record view
-    await increment_profile_views(profile["profile_id"])
+    profile_id = payload["profile"]["profile_id"]
     
-    # Create analytics event
-    await create_analytics_event(
-        profile["profile_id"],
-        "view",
-        request.headers.get("referer")
-    )
-    
-    profile_dict = dict(profile)
-    profile_dict.pop("id", None)
+    # Record view (buffered, written in the next analytics flush)
+    record_profile_view(profile_id, request.headers.get("referer"))
     
-    return {
-        "profile": profile_dict,
-        "links": [{"link_id": l["link_id"], "profile_id": l["profile_id"], "type": l["type"], 
-                   "platform": l["platform"], "url": l["url"], "title": l["title"],
-                   "clicks": l.get("clicks", 0), "position": l.get("position", 0), 
-                   "is_active": l.get("is_active", True), "created_at": l["created_at"]} for l in links]
-    }
+    return payload
 
 @api_router.get("/public/{username}/card/{card_id}")
 async def get_public_profile_with_card(username: str, card_id: str, request: Request):
     """Get public profile by username with card_id verification"""
+    payload = public_profile_cache.get(username.lower())
+    if payload is not None:
+        card = await get_physical_card(card_id.upper())
+    else:
+        # Card, profile and active links in a single round trip
+        bundle = await get_public_profile_bundle(username=username.lower(), card_id=card_id.upper())
+        card = bundle["card"]
+        payload = cache_public_profile(bundle)
+    
     # First verify the card exists
-    card = await get_physical_card(card_id.upper())
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
     
-    # Get the profile by username
-    profile = await get_profile_by_username(username.lower())
-    if not profile:
+    if not payload:
         raise HTTPException(status_code=404, detail="Profile not found")
     
+    profile_id = payload["profile"]["profile_id"]
+    
     # Verify the card is linked to this profile
-    if card["status"] != "activated" or card.get("profile_id") != profile["profile_id"]:
+    if card["status"] != "activated" or card.get("profile_id") != profile_id:
         raise HTTPException(status_code=403, detail="Card not linked to this profile")
     
-    # Get active links
-    links = await get_links_by_profile_id(profile["profile_id"], active_only=True)
+    # Record view with card_id info (buffered)
+    record_profile_view(profile_id, f"card:{card_id.upper()}")
     
-    # Record view
-    await increment_profile_views(profile["profile_id"])
-    
-    # Create analytics event with card_id info
-    await create_analytics_event(
-        profile["profile_id"],
-        "view",
-        f"card:{card_id.upper()}"
-    )
-    
-    profile_dict = dict(profile)
-    profile_dict.pop("id", None)
-    
-    return {
-        "profile": profile_dict,
-        "links": [{"link_id": l["link_id"], "profile_id": l["profile_id"], "type": l["type"], 
-                   "platform": l["platform"], "url": l["url"], "title": l["title"],
-                   "clicks": l.get("clicks", 0), "position": l.get("position", 0), 
-                   "is_active": l.get("is_active", True), "created_at": l["created_at"]} for l in links],
-        "card_id": card_id.upper()
-    }
+    return {**payload, "card_id": card_id.upper()}
 
 @api_router.post("/public/{username}/click/{link_id}")
 async def record_click(username: str, link_id: str):
     """Record link click"""
-    profile = await get_profile_by_username(username.lower())
-    if not profile:
+    payload = await load_public_profile(username.lower())
+    if not payload:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    await increment_link_clicks(link_id)
-    
-    # Create analytics event
-    async with get_connection() as conn:
-        await conn.execute("""
-            INSERT INTO analytics (profile_id, event_type, referrer, timestamp)
-            VALUES ($1, $2, $3, $4)
-        """, profile["profile_id"], "click", link_id, datetime.now(timezone.utc))
+    # Record click and analytics event (buffered)
+    record_link_click(payload["profile"]["profile_id"], link_id)
     
     return {"message": "Click recorded"}
 
 @api_router.post("/public/{username}/contact")
 async def submit_contact(username: str, contact_data: ContactCreate):
     """Submit contact form on public profile"""
-    profile = await get_profile_by_username(username.lower())
-    if not profile:
+    payload = await load_public_profile(username.lower())
+    if not payload:
         raise HTTPException(status_code=404, detail="Profile not found")
     
+    profile = payload["profile"]
     contact_id = f"contact_{uuid.uuid4().hex[:12]}"
     
     await create_contact({
@@ -1286,36 +1530,105 @@ async def submit_contact(username: str, contact_data: ContactCreate):
         "message": contact_data.message
     })
     
-    # Create analytics event
-    await create_analytics_event(profile["profile_id"], "contact_save", contact_id)
+    # Create analytics event (buffered)
+    record_analytics_event(profile["profile_id"], "contact_save", contact_id)
     
     return {"message": "Contact submitted", "contact_id": contact_id}
 
+# ==================== VCARD ====================
+
+# "Save contact" downloads a vCard built here with an already downscaled photo.
+# The bytes are cached under the profile's updated_at (and its links), so any
+# profile change produces a new entry without explicit invalidation.
+VCARD_CACHE_SIZE = int(os.environ.get("VCARD_CACHE_SIZE", "500"))
+VCARD_CACHE_TTL = float(os.environ.get("VCARD_CACHE_TTL", "3600"))
+VCARD_PHOTO_SIZE = 256
+
+vcard_cache = TTLCache(maxsize=VCARD_CACHE_SIZE, ttl=VCARD_CACHE_TTL)
+
+async def load_vcard_photo(profile: dict) -> Optional[bytes]:
+    """JPEG bytes of the profile's avatar at VCARD_PHOTO_SIZE, or None"""
+    variants = profile.get("avatar_variants") or {}
+    filename = upload_store.filename_for((variants.get("jpeg") or {}).get(str(VCARD_PHOTO_SIZE)))
+    try:
+        if filename:
+            return await asyncio.to_thread((UPLOADS_DIR / filename).read_bytes)
+        avatar = profile.get("avatar")
+        if avatar and avatar.startswith("/"):
+            # Legacy upload without variants: downscale it now (the result is cached)
+            source = UPLOADS_DIR / Path(avatar).name
+            if source.is_file():
+                return await create_thumbnail(source, VCARD_PHOTO_SIZE)
+    except (OSError, InvalidImageError) as e:
+        logger.warning(f"vCard photo unavailable for {profile['username']}: {e}")
+    return None
+
+async def load_vcard(payload: dict) -> tuple:
+    """Get (vcf bytes, response headers) for a public {profile, links} payload (cached)"""
+    profile = payload["profile"]
+    key = (
+        profile["profile_id"], str(profile.get("updated_at")),
+        tuple((link["link_id"], link.get("platform"), link.get("url")) for link in payload["links"])
+    )
+    cached = vcard_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    content = build_vcard(
+        profile, payload["links"], f"{FRONTEND_URL}/u/{profile['username']}", await load_vcard_photo(profile)
+    )
+    cached = (content, vcard_headers(profile, content))
+    vcard_cache.set(key, cached)
+    return cached
+
+@api_router.get("/public/{username}/vcard")
+async def get_public_vcard(username: str, request: Request):
+    """Download the profile as a vCard (.vcf)"""
+    payload = await load_public_profile(username.lower())
+    if not payload:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    profile = payload["profile"]
+    content, headers = await load_vcard(payload)
+    
+    # Record the save (buffered, written in the next analytics flush)
+    record_analytics_event(profile["profile_id"], "contact_save", "vcard")
+    
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content, media_type="text/vcard; charset=utf-8", headers=headers)
+
 # ==================== PHYSICAL CARDS ROUTES ====================
 
+# Characters for card codes (uppercase letters and digits, excluding confusing ones like 0/O, 1/I/L)
+CARD_CODE_CHARACTERS = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+# Unauthenticated endpoint: keep batches small unless the deployment raises the cap
+MAX_CARD_BATCH = int(os.environ.get("MAX_CARD_BATCH", "300"))
+# physical_cards.card_id is VARCHAR(10)
+MIN_CARD_CODE_LENGTH = 4
+MAX_CARD_CODE_LENGTH = 10
+
+def generate_card_code(code_length: int) -> str:
+    """Random card code from a CSPRNG"""
+    return ''.join(secrets.choice(CARD_CODE_CHARACTERS) for _ in range(code_length))
+
 @api_router.post("/cards/generate")
 async def generate_cards(count: int = 10, batch_name: str = None, code_length: int = 5):
     """Generate new physical cards (admin endpoint)"""
-    import string
-    import random
-    
-    cards = []
-    # Allow up to 300 cards at once for batch generation
-    max_count = min(count, 300)
-    
-    # Characters for card codes (uppercase letters and digits, excluding confusing ones like 0/O, 1/I/L)
-    characters = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+    # Allow up to MAX_CARD_BATCH cards at once for print runs
+    max_count = min(count, MAX_CARD_BATCH)
+    if max_count < 1:
+        raise HTTPException(status_code=400, detail="Count must be at least 1")
+    if not MIN_CARD_CODE_LENGTH <= code_length <= MAX_CARD_CODE_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Code length must be between {MIN_CARD_CODE_LENGTH} and {MAX_CARD_CODE_LENGTH}"
+        )
     
-    for _ in range(max_count):
-        # Generate random card code of specified length
-        card_id = ''.join(random.choices(characters, k=code_length))
-        
-        await create_physical_card({
-            "card_id": card_id,
-            "status": "unactivated",
-            "batch_name": batch_name
-        })
-        cards.append(card_id)
+    try:
+        cards = await create_physical_cards_bulk(max_count, batch_name, lambda: generate_card_code(code_length))
+    except ValueError:
+        raise HTTPException(status_code=409, detail="Not enough unique card codes left for this code length")
     
     return {"message": f"{len(cards)} cards generated", "card_ids": cards}
 
@@ -1370,6 +1683,8 @@ async def activate_card(card_id: str, user: dict = Depends(get_current_user)):
     # Update the public_url with the new card_id
     public_url = f"{FRONTEND_URL}/u/{profile['username']}/{card_id.upper()}"
     await update_public_url(user["user_id"], public_url)
+    invalidate_public_profile(profile["username"])
+    card_redirect_cache.set(card_id.upper(), ("activated", profile["username"]))
     
     return {
         "message": "Card activated successfully",
@@ -1394,9 +1709,40 @@ async def unlink_card(card_id: str, user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Card not found or not yours")
     
     await unlink_physical_card(card_id.upper())
+    invalidate_card_redirects(card_id=card_id.upper())
     
     return {"message": "Card unlinked successfully"}
 
+# ==================== CARD TAP REDIRECT ====================
+
+@app.get("/c/{card_id}")
+async def card_tap_redirect(card_id: str):
+    """Redirect a QR/NFC card tap straight to the profile (or activation page)"""
+    card_id = card_id.upper()
+    entry = await load_card_redirect(card_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Card not found")
+    
+    status, username = entry
+    if status == "activated" and username:
+        location = f"{FRONTEND_URL}/u/{username}/{card_id}"
+    else:
+        location = f"{FRONTEND_URL}/activate/{card_id}"
+    return RedirectResponse(location, status_code=302, headers={"Cache-Control": "no-store"})
+
+@app.get("/u/{username}", response_class=HTMLResponse)
+async def public_profile_snapshot(username: str, request: Request):
+    """Pre-rendered public profile page (views are recorded by the app's API call)"""
+    snapshot = await load_profile_snapshot(username.lower())
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    html, etag = snapshot
+    headers = {"ETag": etag, "Cache-Control": SNAPSHOT_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(html, headers=headers)
+
 # ==================== ROOT ENDPOINT ====================
 
 @api_router.get("/")
@@ -1421,4 +1767,5 @@ app.add_middleware(
     allow_origins=ALLOWED_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
@@ -2,114 +2,361 @@
 Supabase Database Connection Module
 """
 import os
+import json
+import time
+import uuid
+import secrets
+import asyncio
+import logging
 import asyncpg
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Callable
+from datetime import datetime, timezone, timedelta
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
 
 # Database URL from environment
 DATABASE_URL = os.environ.get("SUPABASE_DB_URL", "")
 
-# Connection pool
-_pool: Optional[asyncpg.Pool] = None
+# ==================== CONNECTION STRATEGIES ====================
 
-async def get_pool() -> asyncpg.Pool:
-    """Get or create the connection pool"""
-    global _pool
-    if _pool is None:
-        # statement_cache_size=0 is required for pgbouncer compatibility (Supabase uses pgbouncer)
-        _pool = await asyncpg.create_pool(
-            DATABASE_URL,
-            min_size=2,
-            max_size=10,
-            command_timeout=60,
-            statement_cache_size=0
+# How connections are obtained depends on the deployment: the long-running
+# backend keeps a pool, while a serverless function (api/index.py) opens one
+# connection per invocation. Select one with configure_database().
+
+class ServerPool:
+    """Long-lived asyncpg pool for the always-on backend"""
+    
+    # Analytics are buffered and flushed in the background
+    flush_per_request = False
+    
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool: Optional[asyncpg.Pool] = None
+    
+    async def get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            # statement_cache_size=0 is required for pgbouncer compatibility (Supabase uses pgbouncer)
+            self._pool = await asyncpg.create_pool(
+                self.dsn,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                command_timeout=60,
+                statement_cache_size=0
+            )
+        return self._pool
+    
+    async def acquire(self) -> asyncpg.Connection:
+        pool = await self.get_pool()
+        return await pool.acquire()
+    
+    async def release(self, conn: asyncpg.Connection) -> None:
+        await self._pool.release(conn)
+    
+    async def warm_up(self) -> None:
+        await self.get_pool()
+    
+    async def close(self) -> None:
+        if self._pool:
+            await self._pool.close()
+            self._pool = None
+    
+    def metrics(self) -> Dict:
+        if self._pool is None:
+            return {"strategy": "server", "size": 0, "idle": 0}
+        return {"strategy": "server", "size": self._pool.get_size(), "idle": self._pool.get_idle_size()}
+
+class ServerlessConnections:
+    """One reused connection per function instance, for serverless deployments
+
+    The connection is opened lazily on first use and kept across warm
+    invocations. If it was idle long enough to have gone stale, it is
+    health-checked (and reopened if dead) before being handed out. Acquires
+    that overlap the shared connection get a short-lived extra one. Frozen
+    functions can't run background work, so buffered analytics are flushed
+    at the end of every request.
+    """
+    
+    flush_per_request = True
+    
+    def __init__(self, dsn: str, healthcheck_after: float = 30.0, connect_timeout: float = 10.0):
+        self.dsn = dsn
+        self.healthcheck_after = healthcheck_after
+        self.connect_timeout = connect_timeout
+        self._conn: Optional[asyncpg.Connection] = None
+        self._loop = None
+        self._in_use = False
+        self._last_used = 0.0
+        self.stats = {"connects": 0, "reuses": 0, "reconnects": 0, "last_connect_ms": None, "total_connect_ms": 0.0}
+    
+    async def _connect(self) -> asyncpg.Connection:
+        started = time.perf_counter()
+        conn = await asyncpg.connect(
+            self.dsn, timeout=self.connect_timeout, command_timeout=60, statement_cache_size=0
         )
-    return _pool
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.stats["connects"] += 1
+        self.stats["last_connect_ms"] = elapsed_ms
+        self.stats["total_connect_ms"] = round(self.stats["total_connect_ms"] + elapsed_ms, 2)
+        logger.info(f"Database connection opened in {elapsed_ms} ms")
+        return conn
+    
+    async def _is_healthy(self, conn: asyncpg.Connection) -> bool:
+        if conn.is_closed() or self._loop is not asyncio.get_running_loop():
+            return False
+        if time.monotonic() - self._last_used < self.healthcheck_after:
+            return True
+        try:
+            await conn.execute("SELECT 1", timeout=self.connect_timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Dropping stale database connection: {e}")
+            return False
+    
+    async def acquire(self) -> asyncpg.Connection:
+        if self._in_use:
+            return await self._connect()
+        self._in_use = True
+        try:
+            if self._conn is not None and not await self._is_healthy(self._conn):
+                self._conn.terminate()
+                self._conn = None
+                self.stats["reconnects"] += 1
+            if self._conn is None:
+                self._conn = await self._connect()
+                self._loop = asyncio.get_running_loop()
+            else:
+                self.stats["reuses"] += 1
+        except BaseException:
+            self._in_use = False
+            raise
+        return self._conn
+    
+    async def release(self, conn: asyncpg.Connection) -> None:
+        if conn is not self._conn:
+            await conn.close()
+            return
+        self._in_use = False
+        self._last_used = time.monotonic()
+        if conn.is_in_transaction():
+            # Never carry an open transaction into the next invocation
+            conn.terminate()
+            self._conn = None
+    
+    async def warm_up(self) -> None:
+        await self.release(await self.acquire())
+    
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+    
+    def metrics(self) -> Dict:
+        return {"strategy": "serverless", "connected": self._conn is not None and not self._conn.is_closed(),
+                **self.stats}
+
+POOL_STRATEGIES = {
+    "server": lambda dsn: ServerPool(
+        dsn,
+        min_size=int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+        max_size=int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+    ),
+    "serverless": lambda dsn: ServerlessConnections(
+        dsn,
+        healthcheck_after=float(os.environ.get("DB_HEALTHCHECK_AFTER", "30")),
+        connect_timeout=float(os.environ.get("DB_CONNECT_TIMEOUT", "10"))
+    ),
+}
+
+_strategy = POOL_STRATEGIES[os.environ.get("DB_POOL_STRATEGY", "server")](DATABASE_URL)
+
+def configure_database(strategy: str, dsn: Optional[str] = None) -> None:
+    """Select the connection strategy ("server" or "serverless"), before first use"""
+    global _strategy, DATABASE_URL
+    if dsn is not None:
+        DATABASE_URL = dsn
+    _strategy = POOL_STRATEGIES[strategy](DATABASE_URL)
+
+async def get_pool() -> asyncpg.Pool:
+    """Get or create the connection pool (server strategy)"""
+    return await _strategy.get_pool()
+
+async def warm_up_database() -> None:
+    """Open the active strategy's connections ahead of the first request"""
+    await _strategy.warm_up()
 
 async def close_pool():
     """Close the connection pool"""
-    global _pool
-    if _pool:
-        await _pool.close()
-        _pool = None
+    await _strategy.close()
+
+def connection_metrics() -> Dict:
+    """Connection statistics of the active strategy (connect times, reuse, pool usage)"""
+    return _strategy.metrics()
+
+class _RequestConnection:
+    """A connection lent to one request, acquired on first use"""
+    
+    def __init__(self):
+        # Only the request's own task may use it: tasks it spawns get their own
+        self.task = asyncio.current_task()
+        self.conn: Optional[asyncpg.Connection] = None
+
+_request_connection: ContextVar[Optional[_RequestConnection]] = ContextVar("request_connection", default=None)
 
 @asynccontextmanager
-async def get_connection():
-    """Get a connection from the pool"""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+async def get_connection(conn: Optional[asyncpg.Connection] = None):
+    """Get a connection: the one passed in, the current request's, or one from the pool"""
+    if conn is not None:
         yield conn
+        return
+    
+    scope = _request_connection.get()
+    if scope is not None and scope.task is asyncio.current_task():
+        if scope.conn is None:
+            scope.conn = await _strategy.acquire()
+        yield scope.conn
+        return
+    
+    conn = await _strategy.acquire()
+    try:
+        yield conn
+    finally:
+        await _strategy.release(conn)
+
+async def request_connection():
+    """FastAPI dependency lending one pooled connection to the whole request
+
+    The connection is only checked out when the request first touches the
+    database, and returned to the pool when the request is done.
+    """
+    token = _request_connection.set(_RequestConnection())
+    try:
+        yield
+    finally:
+        if _strategy.flush_per_request:
+            try:
+                await flush_analytics()
+            except Exception:
+                pass  # already logged and requeued
+        await release_request_connection()
+        _request_connection.reset(token)
+
+async def release_request_connection() -> None:
+    """Return the request's connection to the pool early, e.g. before slow non-database work"""
+    scope = _request_connection.get()
+    if scope is not None and scope.conn is not None:
+        conn, scope.conn = scope.conn, None
+        await _strategy.release(conn)
 
 # ==================== USER OPERATIONS ====================
 
 async def create_user(user_id: str, email: str, name: str, password: str = None, 
-                      auth_type: str = "email", google_id: str = None, picture: str = None) -> Dict:
-    """Create a new user"""
-    async with get_connection() as conn:
-        await conn.execute("""
+                      auth_type: str = "email", google_id: str = None, picture: str = None,
+                      conn: Optional[asyncpg.Connection] = None) -> Dict:
+    """Create a new user (returns the existing user if the email is taken)"""
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow("""
             INSERT INTO users (user_id, email, name, password, auth_type, google_id, picture, created_at, updated_at)
             VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $8)
             ON CONFLICT (email) DO NOTHING
+            RETURNING *
         """, user_id, email, name, password, auth_type, google_id, picture, datetime.now(timezone.utc))
         
-        return await get_user_by_email(email)
+        if row is None:
+            row = await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
+        return dict(row) if row else None
 
-async def get_user_by_email(email: str) -> Optional[Dict]:
+async def get_user_by_email(email: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Get user by email"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         row = await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
         return dict(row) if row else None
 
-async def get_user_by_id(user_id: str) -> Optional[Dict]:
+async def get_user_by_id(user_id: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Get user by ID"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         row = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
         return dict(row) if row else None
 
-async def delete_user(user_id: str) -> bool:
+async def delete_user(user_id: str, conn: Optional[asyncpg.Connection] = None) -> bool:
     """Delete a user"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         result = await conn.execute("DELETE FROM users WHERE user_id = $1", user_id)
         return "DELETE 1" in result
 
 # ==================== SESSION OPERATIONS ====================
 
-async def create_session(session_id: str, user_id: str, token: str, expires_at: datetime) -> Dict:
+async def create_session(session_id: str, user_id: str, token: str, expires_at: datetime, conn: Optional[asyncpg.Connection] = None) -> Dict:
     """Create a new session"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         await conn.execute("""
             INSERT INTO user_sessions (session_id, user_id, token, created_at, expires_at)
             VALUES ($1, $2, $3, $4, $5)
         """, session_id, user_id, token, datetime.now(timezone.utc), expires_at)
         return {"session_id": session_id, "user_id": user_id, "token": token}
 
-async def get_session_by_token(token: str) -> Optional[Dict]:
+async def get_session_by_token(token: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Get session by token"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         row = await conn.fetchrow("""
             SELECT * FROM user_sessions WHERE token = $1 AND expires_at > $2
         """, token, datetime.now(timezone.utc))
         return dict(row) if row else None
 
-async def delete_session(token: str) -> bool:
+async def get_user_by_session_token(token: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
+    """Get a valid session and its user in one query
+
+    Returns the users row plus "session_expires_at", with user columns set to
+    None if the user no longer exists, or None if the session is invalid.
+    """
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow("""
+            SELECT u.*, s.expires_at AS session_expires_at
+            FROM user_sessions s
+            LEFT JOIN users u ON u.user_id = s.user_id
+            WHERE s.token = $1 AND s.expires_at > $2
+        """, token, datetime.now(timezone.utc))
+        return dict(row) if row else None
+
+async def delete_session(token: str, conn: Optional[asyncpg.Connection] = None) -> bool:
     """Delete a session"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         result = await conn.execute("DELETE FROM user_sessions WHERE token = $1", token)
         return "DELETE 1" in result
 
-async def delete_user_sessions(user_id: str) -> bool:
+async def delete_user_sessions(user_id: str, conn: Optional[asyncpg.Connection] = None) -> bool:
     """Delete all sessions for a user"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         await conn.execute("DELETE FROM user_sessions WHERE user_id = $1", user_id)
         return True
 
 # ==================== PROFILE OPERATIONS ====================
 
-async def create_profile(profile_data: Dict) -> Dict:
+def _decode_json(value: Any, default: Any) -> Any:
+    """Convert a JSONB/JSON string column to a Python value"""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return default
+    return value or default
+
+def _profile_from_row(row) -> Dict:
+    """Build a profile dict from a row, decoding its JSON columns"""
+    result = dict(row)
+    result["emails"] = _decode_json(result.get("emails"), [])
+    result["phones"] = _decode_json(result.get("phones"), [])
+    for key in ("avatar_variants", "cover_variants"):
+        if key in result:
+            result[key] = _decode_json(result[key], None)
+    return result
+
+async def create_profile(profile_data: Dict, conn: Optional[asyncpg.Connection] = None) -> Dict:
     """Create a new profile"""
-    import json
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         # Handle emails and phones - could be JSON string or list
         emails = profile_data.get("emails", "[]")
         if isinstance(emails, list):
@@ -118,12 +365,13 @@ async def create_profile(profile_data: Dict) -> Dict:
         if isinstance(phones, list):
             phones = json.dumps(phones)
             
-        await conn.execute("""
+        row = await conn.fetchrow("""
             INSERT INTO profiles (
                 profile_id, user_id, username, first_name, last_name, title, company,
                 bio, location, website, emails, phones, avatar, cover_image, cover_type,
                 cover_color, views, created_at, updated_at
             ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $18)
+            RETURNING *
         """, 
             profile_data.get("profile_id"),
             profile_data.get("user_id"),
@@ -144,65 +392,60 @@ async def create_profile(profile_data: Dict) -> Dict:
             profile_data.get("views", 0),
             datetime.now(timezone.utc)
         )
-        return await get_profile_by_username(profile_data.get("username"))
+        return _profile_from_row(row)
 
-async def get_profile_by_user_id(user_id: str) -> Optional[Dict]:
+async def get_profile_by_user_id(user_id: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Get profile by user ID"""
-    import json
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         row = await conn.fetchrow("SELECT * FROM profiles WHERE user_id = $1", user_id)
-        if row:
-            result = dict(row)
-            # Convert JSONB/JSON string to Python lists
-            emails = result.get("emails")
-            phones = result.get("phones")
-            if isinstance(emails, str):
-                try:
-                    result["emails"] = json.loads(emails)
-                except:
-                    result["emails"] = []
-            else:
-                result["emails"] = emails or []
-            if isinstance(phones, str):
-                try:
-                    result["phones"] = json.loads(phones)
-                except:
-                    result["phones"] = []
-            else:
-                result["phones"] = phones or []
-            return result
-        return None
+        return _profile_from_row(row) if row else None
 
-async def get_profile_by_username(username: str) -> Optional[Dict]:
+async def get_profile_by_username(username: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Get profile by username"""
-    import json
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         row = await conn.fetchrow("SELECT * FROM profiles WHERE username = $1", username)
-        if row:
-            result = dict(row)
-            # Convert JSONB/JSON string to Python lists
-            emails = result.get("emails")
-            phones = result.get("phones")
-            if isinstance(emails, str):
-                try:
-                    result["emails"] = json.loads(emails)
-                except:
-                    result["emails"] = []
-            else:
-                result["emails"] = emails or []
-            if isinstance(phones, str):
-                try:
-                    result["phones"] = json.loads(phones)
-                except:
-                    result["phones"] = []
-            else:
-                result["phones"] = phones or []
-            return result
-        return None
+        return _profile_from_row(row) if row else None
+
+async def get_public_profile_bundle(username: str = None, user_id: str = None,
+                                    card_id: str = None,
+                                    conn: Optional[asyncpg.Connection] = None) -> Dict:
+    """Get a profile, its active links and optionally a physical card in one query
 
-async def update_profile(user_id: str, updates: Dict) -> Optional[Dict]:
+    Returns {"profile": dict or None, "links": [...], "card": dict or None}. The
+    card is looked up independently of the profile so callers can tell a missing
+    card from a missing profile.
+    """
+    column = "username" if username is not None else "user_id"
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow(f"""
+            SELECT p.*,
+                COALESCE((
+                    SELECT json_agg(json_build_object(
+                        'link_id', l.link_id, 'profile_id', l.profile_id, 'type', l.type,
+                        'platform', l.platform, 'url', l.url, 'title', l.title,
+                        'clicks', COALESCE(l.clicks, 0), 'position', COALESCE(l.position, 0),
+                        'is_active', l.is_active, 'created_at', l.created_at
+                    ) ORDER BY l.position)
+                    FROM links l
+                    WHERE l.profile_id = p.profile_id AND l.is_active = TRUE
+                ), '[]'::json) AS public_links,
+                (SELECT row_to_json(c) FROM physical_cards c WHERE c.card_id = $2) AS public_card
+            FROM (SELECT 1) AS anchor
+            LEFT JOIN profiles p ON p.{column} = $1
+        """, username if username is not None else user_id, card_id)
+        
+        result = dict(row)
+        links = json.loads(result.pop("public_links"))
+        card = result.pop("public_card")
+        card = json.loads(card) if card else None
+        
+        if result.get("profile_id") is None:
+            return {"profile": None, "links": [], "card": card}
+        return {"profile": _profile_from_row(result), "links": links, "card": card}
+
+async def update_profile(user_id: str, updates: Dict, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Update profile"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         # Build dynamic update query
         set_clauses = []
         values = []
@@ -220,25 +463,29 @@ async def update_profile(user_id: str, updates: Dict) -> Optional[Dict]:
             idx += 1
             
             values.append(user_id)
-            query = f"UPDATE profiles SET {', '.join(set_clauses)} WHERE user_id = ${idx}"
-            await conn.execute(query, *values)
+            query = f"UPDATE profiles SET {', '.join(set_clauses)} WHERE user_id = ${idx} RETURNING *"
+            row = await conn.fetchrow(query, *values)
+        else:
+            row = await conn.fetchrow("SELECT * FROM profiles WHERE user_id = $1", user_id)
         
-        return await get_profile_by_user_id(user_id)
+        return _profile_from_row(row) if row else None
 
-async def delete_profile(profile_id: str) -> bool:
+async def delete_profile(profile_id: str, conn: Optional[asyncpg.Connection] = None) -> bool:
     """Delete a profile"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
+        if await _has_analytics_daily(conn):
+            await conn.execute("DELETE FROM analytics_daily WHERE profile_id = $1", profile_id)
         result = await conn.execute("DELETE FROM profiles WHERE profile_id = $1", profile_id)
         return "DELETE 1" in result
 
-async def increment_profile_views(profile_id: str) -> None:
+async def increment_profile_views(profile_id: str, conn: Optional[asyncpg.Connection] = None) -> None:
     """Increment profile views"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         await conn.execute("UPDATE profiles SET views = views + 1 WHERE profile_id = $1", profile_id)
 
-async def check_username_exists(username: str, exclude_user_id: str = None) -> bool:
+async def check_username_exists(username: str, exclude_user_id: str = None, conn: Optional[asyncpg.Connection] = None) -> bool:
     """Check if username exists"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         if exclude_user_id:
             row = await conn.fetchrow(
                 "SELECT 1 FROM profiles WHERE username = $1 AND user_id != $2", 
@@ -248,22 +495,207 @@ async def check_username_exists(username: str, exclude_user_id: str = None) -> b
             row = await conn.fetchrow("SELECT 1 FROM profiles WHERE username = $1", username)
         return row is not None
 
-async def update_public_url(user_id: str, public_url: str) -> None:
+async def update_public_url(user_id: str, public_url: str, conn: Optional[asyncpg.Connection] = None) -> None:
     """Update the public_url for a profile"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         await conn.execute(
             "UPDATE profiles SET public_url = $1, updated_at = $2 WHERE user_id = $3",
             public_url, datetime.now(timezone.utc), user_id
         )
 
+# ==================== SIGNUP OPERATIONS ====================
+
+# Each sign-up/sign-in flow runs on one connection in one transaction: the
+# user, their default profile (with public_url) and the session are committed
+# together. Username collisions are settled by the profiles unique index.
+USERNAME_ATTEMPTS = 5
+SESSION_DAYS = 7
+
+def new_account_data(email: str, name: str, auth_type: str, **user_fields) -> tuple:
+    """Build the (user, default profile) rows for a first sign-in"""
+    user_id = f"user_{uuid.uuid4().hex[:12]}"
+    
+    # Parse name into first/last
+    name_parts = name.split(" ", 1)
+    profile_data = {
+        "profile_id": f"profile_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "username": email.split("@")[0].lower().replace(".", "")[:20],
+        "first_name": name_parts[0],
+        "last_name": name_parts[1] if len(name_parts) > 1 else "",
+        "avatar": user_fields.get("picture") if auth_type == "google" else None,
+        "cover_color": "#8645D6",
+        "cover_type": "color",
+        "emails": [{"type": "email", "value": email, "label": "Principal"}],
+        "phones": [],
+    }
+    user_data = {"user_id": user_id, "email": email, "name": name, "auth_type": auth_type, **user_fields}
+    return user_data, profile_data
+
+def new_session_data(user_id: str = None) -> dict:
+    """A fresh session row (token, session_id, expires_at)"""
+    return {
+        "session_id": f"session_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "token": secrets.token_urlsafe(32),
+        "expires_at": datetime.now(timezone.utc) + timedelta(days=SESSION_DAYS),
+    }
+
+async def _insert_default_profile(conn, profile_data: Dict, public_url_prefix: str) -> Dict:
+    """Insert a profile, suffixing the username until it is free"""
+    now = datetime.now(timezone.utc)
+    base_username = profile_data["username"]
+    for attempt in range(USERNAME_ATTEMPTS):
+        username = base_username if attempt == 0 else f"{base_username}{uuid.uuid4().hex[:4]}"
+        row = await conn.fetchrow("""
+            INSERT INTO profiles (
+                profile_id, user_id, username, first_name, last_name, emails, phones,
+                avatar, cover_type, cover_color, views, public_url, created_at, updated_at
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, 0, $11, $12, $12)
+            ON CONFLICT (username) DO NOTHING
+            RETURNING *
+        """,
+            profile_data["profile_id"],
+            profile_data["user_id"],
+            username,
+            profile_data.get("first_name"),
+            profile_data.get("last_name"),
+            json.dumps(profile_data.get("emails", [])),
+            json.dumps(profile_data.get("phones", [])),
+            profile_data.get("avatar"),
+            profile_data.get("cover_type", "color"),
+            profile_data.get("cover_color", "#8645D6"),
+            f"{public_url_prefix}{username}",
+            now
+        )
+        if row:
+            return _profile_from_row(row)
+    raise ValueError(f"No free username found for {base_username}")
+
+async def _insert_new_user(conn, user_data: Dict, profile_data: Dict, public_url_prefix: str) -> Optional[Dict]:
+    """Insert a user and their default profile; None if the email is taken"""
+    row = await conn.fetchrow("""
+        INSERT INTO users (user_id, supabase_user_id, email, name, password, auth_type, google_id, picture,
+                           created_at, updated_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $9)
+        ON CONFLICT (email) DO NOTHING
+        RETURNING *
+    """,
+        user_data["user_id"],
+        user_data.get("supabase_user_id"),
+        user_data["email"],
+        user_data.get("name"),
+        user_data.get("password"),
+        user_data.get("auth_type", "email"),
+        user_data.get("google_id"),
+        user_data.get("picture"),
+        datetime.now(timezone.utc)
+    )
+    if row is None:
+        return None
+    await _insert_default_profile(conn, profile_data, public_url_prefix)
+    return dict(row)
+
+async def _insert_session(conn, session_data: Dict) -> None:
+    await conn.execute("""
+        INSERT INTO user_sessions (session_id, user_id, token, created_at, expires_at)
+        VALUES ($1, $2, $3, $4, $5)
+    """, session_data["session_id"], session_data["user_id"], session_data["token"],
+        datetime.now(timezone.utc), session_data["expires_at"])
+
+async def register_user(user_data: Dict, profile_data: Dict, session_data: Dict,
+                        public_url_prefix: str, emails: Optional[List[tuple]] = None,
+                        conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
+    """Create a user, their default profile and a session; None if the email is taken
+
+    emails, (to_email, subject, html) messages such as the welcome email, are
+    added to the outbox in the same transaction.
+    """
+    async with get_connection(conn) as conn:
+        async with conn.transaction():
+            user = await _insert_new_user(conn, user_data, profile_data, public_url_prefix)
+            if user is not None:
+                await _insert_session(conn, session_data)
+                if emails:
+                    await enqueue_emails(emails, conn)
+            return user
+
+async def _find_or_create_user(conn, find_user, user_data: Dict, profile_data: Dict,
+                               public_url_prefix: str) -> tuple:
+    """Run find_user() (which updates and returns the user row), creating the user if it finds none"""
+    row = await find_user()
+    if row is None:
+        user = await _insert_new_user(conn, user_data, profile_data, public_url_prefix)
+        if user is not None:
+            return user, True
+        # The email was registered concurrently: update that user instead
+        row = await find_user()
+    return dict(row), False
+
+async def sign_in_oauth_user(user_data: Dict, profile_data: Dict, session_data: Dict,
+                             public_url_prefix: str,
+                             conn: Optional[asyncpg.Connection] = None) -> tuple:
+    """Refresh an OAuth user by email, or create them; then open a session
+
+    Returns (user, created). session_data["user_id"] is filled in.
+    """
+    async with get_connection(conn) as conn:
+        async def find_user():
+            return await conn.fetchrow("""
+                UPDATE users SET name = $1, picture = $2, updated_at = $3
+                WHERE email = $4
+                RETURNING *
+            """, user_data.get("name"), user_data.get("picture"), datetime.now(timezone.utc),
+                user_data["email"])
+        
+        async with conn.transaction():
+            user, created = await _find_or_create_user(conn, find_user, user_data, profile_data, public_url_prefix)
+            session_data["user_id"] = user["user_id"]
+            await _insert_session(conn, session_data)
+            return user, created
+
+async def sign_in_supabase_user(user_data: Dict, profile_data: Dict, session_data: Dict,
+                                public_url_prefix: str,
+                                conn: Optional[asyncpg.Connection] = None) -> tuple:
+    """Sync a Supabase user (by Supabase ID, then by email for legacy users), or create them
+
+    Returns (user, created). session_data["user_id"] is filled in.
+    """
+    async with get_connection(conn) as conn:
+        async def find_user():
+            now = datetime.now(timezone.utc)
+            row = await conn.fetchrow("""
+                UPDATE users SET name = $1, email = $2, updated_at = $3
+                WHERE supabase_user_id = $4
+                RETURNING *
+            """, user_data.get("name"), user_data["email"], now, user_data["supabase_user_id"])
+            if row is None:
+                # Legacy user: link the Supabase ID to the existing account
+                row = await conn.fetchrow("""
+                    UPDATE users SET supabase_user_id = $1, updated_at = $2
+                    WHERE email = $3
+                    RETURNING *
+                """, user_data["supabase_user_id"], now, user_data["email"])
+            return row
+        
+        async with conn.transaction():
+            user, created = await _find_or_create_user(conn, find_user, user_data, profile_data, public_url_prefix)
+            session_data["user_id"] = user["user_id"]
+            await _insert_session(conn, session_data)
+            return user, created
+
 # ==================== LINKS OPERATIONS ====================
 
-async def create_link(link_data: Dict) -> Dict:
-    """Create a new link"""
-    async with get_connection() as conn:
-        await conn.execute("""
+async def create_link(link_data: Dict, conn: Optional[asyncpg.Connection] = None) -> Dict:
+    """Create a new link, after the profile's last link unless link_data has a position"""
+    if link_data.get("position") is None:
+        return (await append_links(link_data["profile_id"], [link_data], conn=conn))[0]
+    
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow("""
             INSERT INTO links (link_id, profile_id, type, platform, url, title, clicks, position, is_active, created_at)
             VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+            RETURNING *
         """,
             link_data.get("link_id"),
             link_data.get("profile_id"),
@@ -272,21 +704,54 @@ async def create_link(link_data: Dict) -> Dict:
             link_data.get("url"),
             link_data.get("title"),
             link_data.get("clicks", 0),
-            link_data.get("position", 0),
+            link_data["position"],
             link_data.get("is_active", True),
             datetime.now(timezone.utc)
         )
-        return await get_link_by_id(link_data.get("link_id"))
+        return dict(row)
+
+async def append_links(profile_id: str, links: List[Dict], conn: Optional[asyncpg.Connection] = None) -> List[Dict]:
+    """Insert links after the profile's last link, in the given order, with one INSERT
+
+    Positions are computed inside the INSERT. A per-profile advisory lock taken
+    first makes concurrent appends to the same profile wait for each other, so
+    they never get the same position.
+    """
+    async with get_connection(conn) as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('links:' || $1))", profile_id)
+            rows = await conn.fetch("""
+                INSERT INTO links (link_id, profile_id, type, platform, url, title, clicks, position, is_active, created_at)
+                SELECT l.link_id, $1, l.type, l.platform, l.url, l.title, 0,
+                       next.position + l.ordinality - 1, l.is_active, $8
+                FROM unnest($2::text[], $3::text[], $4::text[], $5::text[], $6::text[], $7::boolean[])
+                    WITH ORDINALITY AS l(link_id, type, platform, url, title, is_active, ordinality)
+                CROSS JOIN (
+                    SELECT COALESCE(MAX(position), -1) + 1 AS position FROM links WHERE profile_id = $1
+                ) AS next
+                ORDER BY l.ordinality
+                RETURNING *
+            """,
+                profile_id,
+                [link.get("link_id") for link in links],
+                [link.get("type", "social") for link in links],
+                [link.get("platform") for link in links],
+                [link.get("url") for link in links],
+                [link.get("title") for link in links],
+                [link.get("is_active", True) for link in links],
+                datetime.now(timezone.utc)
+            )
+        return sorted((dict(row) for row in rows), key=lambda row: row["position"])
 
-async def get_link_by_id(link_id: str) -> Optional[Dict]:
+async def get_link_by_id(link_id: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Get link by ID"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         row = await conn.fetchrow("SELECT * FROM links WHERE link_id = $1", link_id)
         return dict(row) if row else None
 
-async def get_links_by_profile_id(profile_id: str, active_only: bool = False) -> List[Dict]:
+async def get_links_by_profile_id(profile_id: str, active_only: bool = False, conn: Optional[asyncpg.Connection] = None) -> List[Dict]:
     """Get all links for a profile"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         if active_only:
             rows = await conn.fetch(
                 "SELECT * FROM links WHERE profile_id = $1 AND is_active = TRUE ORDER BY position",
@@ -299,9 +764,9 @@ async def get_links_by_profile_id(profile_id: str, active_only: bool = False) ->
             )
         return [dict(row) for row in rows]
 
-async def update_link(link_id: str, updates: Dict) -> Optional[Dict]:
+async def update_link(link_id: str, updates: Dict, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Update a link"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         set_clauses = []
         values = []
         idx = 1
@@ -314,27 +779,56 @@ async def update_link(link_id: str, updates: Dict) -> Optional[Dict]:
         
         if set_clauses:
             values.append(link_id)
-            query = f"UPDATE links SET {', '.join(set_clauses)} WHERE link_id = ${idx}"
-            await conn.execute(query, *values)
+            query = f"UPDATE links SET {', '.join(set_clauses)} WHERE link_id = ${idx} RETURNING *"
+            row = await conn.fetchrow(query, *values)
+        else:
+            row = await conn.fetchrow("SELECT * FROM links WHERE link_id = $1", link_id)
         
-        return await get_link_by_id(link_id)
+        return dict(row) if row else None
 
-async def delete_link(link_id: str) -> bool:
+async def delete_link(link_id: str, conn: Optional[asyncpg.Connection] = None) -> bool:
     """Delete a link"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         result = await conn.execute("DELETE FROM links WHERE link_id = $1", link_id)
         return "DELETE 1" in result
 
-async def increment_link_clicks(link_id: str) -> None:
+async def reorder_links(profile_id: str, link_ids: List[str], conn: Optional[asyncpg.Connection] = None) -> List[Dict]:
+    """Give each link its index in link_ids as position; return all the profile's links in the new order
+
+    One statement, so it is atomic on its own. The profile's links are locked
+    in link_id order first, which serializes concurrent reorders of the same
+    profile without deadlocks. Links missing from link_ids keep their position.
+    """
+    async with get_connection(conn) as conn:
+        rows = await conn.fetch("""
+            WITH locked AS MATERIALIZED (
+                SELECT link_id FROM links WHERE profile_id = $2 ORDER BY link_id FOR UPDATE
+            ),
+            moved AS (
+                UPDATE links l SET position = o.ordinality - 1
+                FROM unnest($1::text[]) WITH ORDINALITY AS o(link_id, ordinality)
+                JOIN locked ON locked.link_id = o.link_id
+                WHERE l.link_id = o.link_id AND l.profile_id = $2
+                RETURNING l.*
+            )
+            SELECT * FROM moved
+            UNION ALL
+            SELECT * FROM links
+            WHERE profile_id = $2 AND link_id NOT IN (SELECT link_id FROM moved)
+            ORDER BY position
+        """, link_ids, profile_id)
+        return [dict(row) for row in rows]
+
+async def increment_link_clicks(link_id: str, conn: Optional[asyncpg.Connection] = None) -> None:
     """Increment link clicks"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         await conn.execute("UPDATE links SET clicks = clicks + 1 WHERE link_id = $1", link_id)
 
 # ==================== CONTACTS OPERATIONS ====================
 
-async def create_contact(contact_data: Dict) -> Dict:
+async def create_contact(contact_data: Dict, conn: Optional[asyncpg.Connection] = None) -> Dict:
     """Create a new contact"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         await conn.execute("""
             INSERT INTO contacts (contact_id, profile_id, name, email, phone, message, created_at)
             VALUES ($1, $2, $3, $4, $5, $6, $7)
@@ -349,28 +843,70 @@ async def create_contact(contact_data: Dict) -> Dict:
         )
         return contact_data
 
-async def get_contacts_by_profile_id(profile_id: str) -> List[Dict]:
+async def get_contacts_by_profile_id(profile_id: str, conn: Optional[asyncpg.Connection] = None) -> List[Dict]:
     """Get all contacts for a profile"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         rows = await conn.fetch(
-            "SELECT * FROM contacts WHERE profile_id = $1 ORDER BY created_at DESC",
+            "SELECT * FROM contacts WHERE profile_id = $1 ORDER BY created_at DESC, contact_id DESC",
             profile_id
         )
         return [dict(row) for row in rows]
 
-# ==================== ANALYTICS OPERATIONS ====================
+CONTACT_COLUMNS = "contact_id, profile_id, name, email, phone, message, created_at"
 
-async def create_analytics_event(profile_id: str, event_type: str, referrer: str = None) -> None:
-    """Create an analytics event"""
+async def migrate_contacts_index() -> None:
+    """Index contacts in listing order, so pages and exports never sort"""
     async with get_connection() as conn:
         await conn.execute("""
-            INSERT INTO analytics (profile_id, event_type, referrer, timestamp)
-            VALUES ($1, $2, $3, $4)
-        """, profile_id, event_type, referrer, datetime.now(timezone.utc))
+            CREATE INDEX IF NOT EXISTS contacts_profile_created_idx
+            ON contacts (profile_id, created_at DESC, contact_id DESC)
+        """)
 
-async def get_analytics_by_profile_id(profile_id: str, days: int = 30) -> List[Dict]:
+async def get_contacts_page(
+    profile_id: str, limit: int, after: Optional[tuple] = None, conn: Optional[asyncpg.Connection] = None
+) -> List[Dict]:
+    """Get up to `limit` contacts, newest first, after the (created_at, contact_id) of the previous page"""
+    async with get_connection(conn) as conn:
+        if after is None:
+            rows = await conn.fetch(f"""
+                SELECT {CONTACT_COLUMNS} FROM contacts WHERE profile_id = $1
+                ORDER BY created_at DESC, contact_id DESC LIMIT $2
+            """, profile_id, limit)
+        else:
+            rows = await conn.fetch(f"""
+                SELECT {CONTACT_COLUMNS} FROM contacts
+                WHERE profile_id = $1 AND (created_at, contact_id) < ($2, $3)
+                ORDER BY created_at DESC, contact_id DESC LIMIT $4
+            """, profile_id, after[0], after[1], limit)
+        return [dict(row) for row in rows]
+
+async def iter_contacts(profile_id: str, prefetch: int = 500, conn: Optional[asyncpg.Connection] = None):
+    """Yield all contacts of a profile, newest first, fetching `prefetch` rows at a time"""
+    async with get_connection(conn) as conn:
+        # Server-side cursors only live inside a transaction
+        async with conn.transaction(readonly=True):
+            async for row in conn.cursor(f"""
+                SELECT {CONTACT_COLUMNS} FROM contacts WHERE profile_id = $1
+                ORDER BY created_at DESC, contact_id DESC
+            """, profile_id, prefetch=prefetch):
+                yield dict(row)
+
+# ==================== ANALYTICS OPERATIONS ====================
+
+async def create_analytics_event(profile_id: str, event_type: str, referrer: str = None, conn: Optional[asyncpg.Connection] = None) -> None:
+    """Create an analytics event"""
+    now = datetime.now(timezone.utc)
+    async with get_connection(conn) as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                INSERT INTO analytics (profile_id, event_type, referrer, timestamp)
+                VALUES ($1, $2, $3, $4)
+            """, profile_id, event_type, referrer, now)
+            await _add_to_analytics_daily(conn, {(profile_id, now.date(), event_type): 1})
+
+async def get_analytics_by_profile_id(profile_id: str, days: int = 30, conn: Optional[asyncpg.Connection] = None) -> List[Dict]:
     """Get analytics for a profile"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         rows = await conn.fetch("""
             SELECT * FROM analytics 
             WHERE profile_id = $1 AND timestamp > NOW() - INTERVAL '%s days'
@@ -378,53 +914,474 @@ async def get_analytics_by_profile_id(profile_id: str, days: int = 30) -> List[D
         """ % days, profile_id)
         return [dict(row) for row in rows]
 
-# ==================== PHYSICAL CARDS OPERATIONS ====================
+async def get_analytics_totals(profile_id: str, conn: Optional[asyncpg.Connection] = None) -> Dict:
+    """Get lifetime view, click and contact totals for a profile in one query"""
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow("""
+            SELECT
+                COALESCE((SELECT views FROM profiles WHERE profile_id = $1), 0) AS total_views,
+                (SELECT COALESCE(SUM(clicks), 0) FROM links WHERE profile_id = $1) AS total_clicks,
+                (SELECT COUNT(*) FROM contacts WHERE profile_id = $1) AS total_contacts
+        """, profile_id)
+        return dict(row)
 
-async def create_physical_card(card_data: Dict) -> Dict:
-    """Create a physical card"""
+# analytics_daily holds one counter per (profile, UTC day, event type). It is
+# updated in the same transaction as every analytics insert, so the dashboard
+# never has to scan raw events. Whether the table exists is looked up on the
+# first write or read (once per process or cold start, until it does), so
+# entry points that never run migrate_analytics_daily() still maintain it;
+# without it the rollup is left alone and reads aggregate the raw events.
+_analytics_daily_exists = False
+
+# First UTC day of a `$2`-day window, shared by the rollup and raw-event reads
+ANALYTICS_WINDOW_START = "((NOW() AT TIME ZONE 'UTC')::date - $2::int)"
+
+async def _has_analytics_daily(conn, writing: bool = False) -> bool:
+    """Whether the analytics_daily rollup table exists"""
+    global _analytics_daily_exists
+    if not _analytics_daily_exists:
+        if writing:
+            # Called inside the writer's transaction: the shared lock orders it
+            # against migrate_analytics_daily(), so its events either commit
+            # before the backfill reads raw events or see the new table
+            await conn.execute("SELECT pg_advisory_xact_lock_shared(hashtext('analytics_daily'))")
+        _analytics_daily_exists = await conn.fetchval("SELECT to_regclass('analytics_daily') IS NOT NULL")
+    return _analytics_daily_exists
+
+async def migrate_analytics_daily() -> None:
+    """Create the analytics_daily rollup table, backfilling it from raw events once"""
+    global _analytics_daily_exists
+    async with get_connection() as conn:
+        async with conn.transaction():
+            # Serialize concurrent workers so the backfill runs exactly once
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('analytics_daily'))")
+            exists = await conn.fetchval("SELECT to_regclass('analytics_daily') IS NOT NULL")
+            if exists:
+                _analytics_daily_exists = True
+                return
+            await conn.execute("""
+                CREATE TABLE analytics_daily (
+                    profile_id TEXT NOT NULL,
+                    day DATE NOT NULL,
+                    event_type TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (profile_id, day, event_type)
+                )
+            """)
+            await conn.execute("""
+                INSERT INTO analytics_daily (profile_id, day, event_type, count)
+                SELECT profile_id, (timestamp AT TIME ZONE 'UTC')::date, event_type, COUNT(*)
+                FROM analytics
+                WHERE profile_id IS NOT NULL AND event_type IS NOT NULL
+                GROUP BY 1, 2, 3
+            """)
+    _analytics_daily_exists = True
+
+async def _add_to_analytics_daily(conn, counts: Dict[tuple, int]) -> None:
+    """Add {(profile_id, day, event_type): n} to the daily rollup"""
+    if not counts or not await _has_analytics_daily(conn, writing=True):
+        return
+    keys = list(counts.keys())
+    await conn.execute("""
+        INSERT INTO analytics_daily (profile_id, day, event_type, count)
+        SELECT * FROM unnest($1::text[], $2::date[], $3::text[], $4::int[])
+        ON CONFLICT (profile_id, day, event_type)
+        DO UPDATE SET count = analytics_daily.count + EXCLUDED.count
+    """, [k[0] for k in keys], [k[1] for k in keys], [k[2] for k in keys], list(counts.values()))
+
+async def get_daily_analytics(profile_id: str, days: int = 30, conn: Optional[asyncpg.Connection] = None) -> List[Dict]:
+    """Get per-day event counts for a profile ({day, event_type, count} rows)
+
+    Served from analytics_daily; falls back to aggregating raw events in SQL
+    if the rollup table is not available.
+    """
+    async with get_connection(conn) as conn:
+        if await _has_analytics_daily(conn):
+            rows = await conn.fetch(f"""
+                SELECT day, event_type, count FROM analytics_daily
+                WHERE profile_id = $1 AND day >= {ANALYTICS_WINDOW_START}
+            """, profile_id, days)
+        else:
+            rows = await conn.fetch(f"""
+                SELECT (timestamp AT TIME ZONE 'UTC')::date AS day, event_type, COUNT(*) AS count
+                FROM analytics
+                WHERE profile_id = $1 AND timestamp >= {ANALYTICS_WINDOW_START}::timestamp AT TIME ZONE 'UTC'
+                GROUP BY 1, 2
+            """, profile_id, days)
+        return [dict(row) for row in rows]
+
+# ==================== ANALYTICS WRITE-BEHIND BUFFER ====================
+
+# Public profile hits used to run an UPDATE on the (hot) profiles row plus an
+# INSERT into analytics on the request path. Events are now buffered in memory
+# and written in batches, either every ANALYTICS_FLUSH_INTERVAL_MS or as soon as
+# ANALYTICS_FLUSH_MAX_EVENTS are pending.
+ANALYTICS_FLUSH_INTERVAL_MS = int(os.environ.get("ANALYTICS_FLUSH_INTERVAL_MS", "1000"))
+ANALYTICS_FLUSH_MAX_EVENTS = int(os.environ.get("ANALYTICS_FLUSH_MAX_EVENTS", "500"))
+# Hard cap on events kept in memory while the database is unreachable
+ANALYTICS_BUFFER_LIMIT = int(os.environ.get("ANALYTICS_BUFFER_LIMIT", "50000"))
+
+_pending_events: List[tuple] = []
+_pending_views: Dict[str, int] = {}
+_pending_clicks: Dict[str, int] = {}
+_flush_lock = asyncio.Lock()
+_flush_task: Optional[asyncio.Task] = None
+_flush_scheduled = False
+# Running early flushes, referenced until done so they are not garbage collected
+_early_flushes: set = set()
+
+def _early_flush_done(task: asyncio.Task) -> None:
+    _early_flushes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        # flush_analytics() has already put the events back for the next flush
+        logger.error(f"Early analytics flush failed: {task.exception()}")
+
+def _schedule_flush_if_full() -> None:
+    """Start an early flush once enough events are pending"""
+    global _flush_scheduled
+    if _flush_scheduled or len(_pending_events) < ANALYTICS_FLUSH_MAX_EVENTS:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _flush_scheduled = True
+    task = loop.create_task(flush_analytics())
+    _early_flushes.add(task)
+    task.add_done_callback(_early_flush_done)
+
+def record_analytics_event(profile_id: str, event_type: str, referrer: str = None) -> None:
+    """Buffer an analytics event (view, click, contact_save) for the next flush"""
+    _pending_events.append((profile_id, event_type, referrer, datetime.now(timezone.utc)))
+    _schedule_flush_if_full()
+
+def record_profile_view(profile_id: str, referrer: str = None) -> None:
+    """Buffer a profile view: one views increment plus a 'view' analytics event"""
+    _pending_views[profile_id] = _pending_views.get(profile_id, 0) + 1
+    record_analytics_event(profile_id, "view", referrer)
+
+def record_link_click(profile_id: str, link_id: str) -> None:
+    """Buffer a link click: one clicks increment plus a 'click' analytics event"""
+    _pending_clicks[link_id] = _pending_clicks.get(link_id, 0) + 1
+    record_analytics_event(profile_id, "click", link_id)
+
+async def flush_analytics() -> None:
+    """Write all buffered analytics events and counters in one transaction"""
+    global _pending_events, _pending_views, _pending_clicks, _flush_scheduled
+    async with _flush_lock:
+        _flush_scheduled = False
+        events, views, clicks = _pending_events, _pending_views, _pending_clicks
+        if not (events or views or clicks):
+            return
+        _pending_events, _pending_views, _pending_clicks = [], {}, {}
+        
+        try:
+            async with get_connection() as conn:
+                async with conn.transaction():
+                    if events:
+                        await conn.executemany("""
+                            INSERT INTO analytics (profile_id, event_type, referrer, timestamp)
+                            VALUES ($1, $2, $3, $4)
+                        """, events)
+                        daily = {}
+                        for profile_id, event_type, _, timestamp in events:
+                            key = (profile_id, timestamp.date(), event_type)
+                            daily[key] = daily.get(key, 0) + 1
+                        await _add_to_analytics_daily(conn, daily)
+                    if views:
+                        await conn.execute("""
+                            UPDATE profiles p SET views = p.views + v.n
+                            FROM unnest($1::text[], $2::int[]) AS v(profile_id, n)
+                            WHERE p.profile_id = v.profile_id
+                        """, list(views.keys()), list(views.values()))
+                    if clicks:
+                        await conn.execute("""
+                            UPDATE links l SET clicks = l.clicks + c.n
+                            FROM unnest($1::text[], $2::int[]) AS c(link_id, n)
+                            WHERE l.link_id = c.link_id
+                        """, list(clicks.keys()), list(clicks.values()))
+        except Exception as e:
+            logger.error(f"Analytics flush failed, requeueing {len(events)} events: {e}")
+            # Put the batch back in front of anything buffered meanwhile
+            _pending_events = (events + _pending_events)[-ANALYTICS_BUFFER_LIMIT:]
+            for profile_id, n in views.items():
+                _pending_views[profile_id] = _pending_views.get(profile_id, 0) + n
+            for link_id, n in clicks.items():
+                _pending_clicks[link_id] = _pending_clicks.get(link_id, 0) + n
+            raise
+
+async def _analytics_flush_loop() -> None:
+    while True:
+        await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL_MS / 1000)
+        try:
+            await flush_analytics()
+        except Exception:
+            pass  # already logged and requeued
+
+def start_analytics_flusher() -> None:
+    """Start the periodic analytics flush task"""
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.get_running_loop().create_task(_analytics_flush_loop())
+
+async def stop_analytics_flusher() -> None:
+    """Stop the periodic flush task and drain whatever is still buffered"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    await asyncio.gather(*_early_flushes, return_exceptions=True)
+    await flush_analytics()
+
+# ==================== UPLOAD REFERENCE OPERATIONS ====================
+
+# Content-addressed uploads are shared between profiles; upload_refs counts how
+# many profile images (avatar/cover_image and their variants) use each file.
+
+async def migrate_upload_refs() -> None:
+    """Create the upload_refs table"""
     async with get_connection() as conn:
         await conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_refs (
+                filename TEXT PRIMARY KEY,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+
+async def acquire_uploads(filenames: List[str], conn: Optional[asyncpg.Connection] = None) -> None:
+    """Add one reference to each file"""
+    async with get_connection(conn) as conn:
+        await conn.execute("""
+            INSERT INTO upload_refs (filename, ref_count, updated_at)
+            SELECT filename, 1, now() FROM unnest($1::text[]) AS filename
+            ON CONFLICT (filename)
+            DO UPDATE SET ref_count = upload_refs.ref_count + 1, updated_at = now()
+        """, filenames)
+
+async def release_uploads(filenames: List[str], conn: Optional[asyncpg.Connection] = None) -> None:
+    """Drop one reference from each file"""
+    async with get_connection(conn) as conn:
+        await conn.execute("""
+            UPDATE upload_refs SET ref_count = GREATEST(ref_count - 1, 0), updated_at = now()
+            WHERE filename = ANY($1::text[])
+        """, filenames)
+
+async def get_referenced_uploads(filenames: List[str], conn: Optional[asyncpg.Connection] = None) -> List[str]:
+    """Return the files that still have references"""
+    async with get_connection(conn) as conn:
+        rows = await conn.fetch(
+            "SELECT filename FROM upload_refs WHERE filename = ANY($1::text[]) AND ref_count > 0",
+            filenames
+        )
+        return [row["filename"] for row in rows]
+
+async def forget_uploads(filenames: List[str], conn: Optional[asyncpg.Connection] = None) -> None:
+    """Remove the (unreferenced) reference rows of deleted files"""
+    async with get_connection(conn) as conn:
+        await conn.execute(
+            "DELETE FROM upload_refs WHERE filename = ANY($1::text[]) AND ref_count = 0",
+            filenames
+        )
+
+# ==================== EMAIL OUTBOX OPERATIONS ====================
+
+# Transactional emails are written to email_outbox and sent by the worker in
+# email_service.py. A claimed row is leased until locked_until, so a row held
+# by a worker that died is picked up again once the lease runs out.
+
+async def migrate_email_outbox() -> None:
+    """Create the email_outbox table"""
+    async with get_connection() as conn:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id BIGSERIAL PRIMARY KEY,
+                to_email TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                html TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                locked_until TIMESTAMPTZ,
+                last_error TEXT,
+                provider_id TEXT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                sent_at TIMESTAMPTZ
+            )
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS email_outbox_due_idx
+            ON email_outbox (next_attempt_at) WHERE status IN ('pending', 'sending')
+        """)
+
+async def enqueue_email(to_email: str, subject: str, html: str, conn: Optional[asyncpg.Connection] = None) -> int:
+    """Add an email to the outbox and return its id"""
+    async with get_connection(conn) as conn:
+        return await conn.fetchval("""
+            INSERT INTO email_outbox (to_email, subject, html) VALUES ($1, $2, $3)
+            RETURNING id
+        """, to_email, subject, html)
+
+async def enqueue_emails(messages: List[tuple], conn: Optional[asyncpg.Connection] = None) -> List[int]:
+    """Add (to_email, subject, html) messages to the outbox in one statement; return their ids"""
+    async with get_connection(conn) as conn:
+        rows = await conn.fetch("""
+            INSERT INTO email_outbox (to_email, subject, html)
+            SELECT * FROM unnest($1::text[], $2::text[], $3::text[])
+            RETURNING id
+        """, *(list(column) for column in zip(*messages)))
+        return [row["id"] for row in rows]
+
+async def claim_emails(limit: int, lease_seconds: float, conn: Optional[asyncpg.Connection] = None) -> List[Dict]:
+    """Lease up to limit due emails, skipping rows other workers are claiming"""
+    async with get_connection(conn) as conn:
+        rows = await conn.fetch("""
+            WITH due AS (
+                SELECT id FROM email_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= now())
+                   OR (status = 'sending' AND locked_until <= now())
+                ORDER BY next_attempt_at
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE email_outbox o
+            SET status = 'sending', attempts = o.attempts + 1,
+                locked_until = now() + make_interval(secs => $2)
+            FROM due WHERE o.id = due.id
+            RETURNING o.*
+        """, limit, lease_seconds)
+        return [dict(row) for row in rows]
+
+async def mark_email_sent(email_id: int, provider_id: Optional[str], conn: Optional[asyncpg.Connection] = None) -> None:
+    """Record a delivered email"""
+    async with get_connection(conn) as conn:
+        await conn.execute("""
+            UPDATE email_outbox
+            SET status = 'sent', provider_id = $2, sent_at = now(), locked_until = NULL, last_error = NULL
+            WHERE id = $1
+        """, email_id, provider_id)
+
+async def mark_email_unsent(email_id: int, status: str, error: str, retry_at: Optional[datetime] = None,
+                            conn: Optional[asyncpg.Connection] = None) -> None:
+    """Record a failed attempt: status 'pending' retries at retry_at, anything else is final"""
+    async with get_connection(conn) as conn:
+        await conn.execute("""
+            UPDATE email_outbox
+            SET status = $2, last_error = $3, next_attempt_at = COALESCE($4, next_attempt_at), locked_until = NULL
+            WHERE id = $1
+        """, email_id, status, error, retry_at)
+
+async def get_outbox_email(email_id: int, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
+    """Get an outbox row by id"""
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow("SELECT * FROM email_outbox WHERE id = $1", email_id)
+        return dict(row) if row else None
+
+# ==================== PHYSICAL CARDS OPERATIONS ====================
+
+async def create_physical_card(card_data: Dict, conn: Optional[asyncpg.Connection] = None) -> Dict:
+    """Create a physical card"""
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow("""
             INSERT INTO physical_cards (card_id, status, batch_name, created_at)
             VALUES ($1, $2, $3, $4)
+            RETURNING *
         """,
             card_data.get("card_id"),
             card_data.get("status", "unactivated"),
             card_data.get("batch_name"),
             datetime.now(timezone.utc)
         )
-        return await get_physical_card(card_data.get("card_id"))
+        return dict(row)
+
+async def create_physical_cards_bulk(count: int, batch_name: str, generate_code: Callable[[], str],
+                                     max_rounds: int = 10,
+                                     conn: Optional[asyncpg.Connection] = None) -> List[str]:
+    """Create count cards with fresh unique codes in one transaction; returns the codes
+
+    Candidate codes are COPYed into a staging table and inserted with an
+    anti-join against physical_cards (ON CONFLICT also covers concurrent
+    batches); only the codes that collided are regenerated for the next round.
+    """
+    created: List[str] = []
+    async with get_connection(conn) as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE physical_cards_staging (card_id TEXT PRIMARY KEY) ON COMMIT DROP
+            """)
+            for _ in range(max_rounds):
+                missing = count - len(created)
+                if missing == 0:
+                    return created
+                candidates = set()
+                while len(candidates) < missing:
+                    candidates.add(generate_code())
+
+                await conn.copy_records_to_table(
+                    "physical_cards_staging", records=[(code,) for code in candidates], columns=["card_id"]
+                )
+                rows = await conn.fetch("""
+                    INSERT INTO physical_cards (card_id, status, batch_name, created_at)
+                    SELECT s.card_id, 'unactivated', $1, $2
+                    FROM physical_cards_staging s
+                    WHERE NOT EXISTS (SELECT 1 FROM physical_cards p WHERE p.card_id = s.card_id)
+                    ON CONFLICT (card_id) DO NOTHING
+                    RETURNING card_id
+                """, batch_name, datetime.now(timezone.utc))
+                created.extend(row["card_id"] for row in rows)
+                await conn.execute("TRUNCATE physical_cards_staging")
 
-async def get_physical_card(card_id: str) -> Optional[Dict]:
+            if len(created) < count:
+                raise ValueError("Could not generate enough unique card codes")
+    return created
+
+async def get_physical_card(card_id: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Get physical card by ID"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         row = await conn.fetchrow("SELECT * FROM physical_cards WHERE card_id = $1", card_id)
         return dict(row) if row else None
 
-async def activate_physical_card(card_id: str, user_id: str, profile_id: str) -> Optional[Dict]:
+async def activate_physical_card(card_id: str, user_id: str, profile_id: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
     """Activate a physical card"""
-    async with get_connection() as conn:
-        await conn.execute("""
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow("""
             UPDATE physical_cards 
             SET user_id = $1, profile_id = $2, status = 'activated', activated_at = $3
             WHERE card_id = $4
+            RETURNING *
         """, user_id, profile_id, datetime.now(timezone.utc), card_id)
-        return await get_physical_card(card_id)
+        return dict(row) if row else None
 
-async def get_user_physical_cards(user_id: str) -> List[Dict]:
+async def get_user_physical_cards(user_id: str, conn: Optional[asyncpg.Connection] = None) -> List[Dict]:
     """Get all physical cards for a user"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         rows = await conn.fetch(
             "SELECT * FROM physical_cards WHERE user_id = $1 ORDER BY activated_at DESC",
             user_id
         )
         return [dict(row) for row in rows]
 
-async def unlink_physical_card(card_id: str) -> bool:
+async def unlink_physical_card(card_id: str, conn: Optional[asyncpg.Connection] = None) -> bool:
     """Unlink a physical card from user"""
-    async with get_connection() as conn:
+    async with get_connection(conn) as conn:
         result = await conn.execute("""
             UPDATE physical_cards 
             SET user_id = NULL, profile_id = NULL, status = 'unactivated', activated_at = NULL
             WHERE card_id = $1
         """, card_id)
         return "UPDATE 1" in result
+
+async def get_card_redirect(card_id: str, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict]:
+    """Get a card's status and linked username ({card_id, status, username})"""
+    async with get_connection(conn) as conn:
+        row = await conn.fetchrow("""
+            SELECT c.card_id, c.status, p.username
+            FROM physical_cards c
+            LEFT JOIN profiles p ON p.profile_id = c.profile_id
+            WHERE c.card_id = $1
+        """, card_id)
+        return dict(row) if row else None
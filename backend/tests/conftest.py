@@ -0,0 +1,42 @@
+"""
+Shared FlexCard test fixtures
+"""
+
+import pytest
+import requests
+import os
+import time
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="module")
+def registered_user(request):
+    """Register a fresh user for the test module and return (headers, username)
+
+    The user is named after the module (test_vcard.py registers "Vcard Test")
+    and its profile is deleted once the module's tests are done.
+    """
+    topic = request.module.__name__.rsplit(".", 1)[-1].removeprefix("test_")
+    response = requests.post(
+        f"{BASE_URL}/api/auth/register",
+        json={
+            "email": f"test{topic.replace('_', '')}{time.time_ns()}@test.com",
+            "name": f"{topic.replace('_', ' ').title()} Test",
+            "password": "test123"
+        }
+    )
+    if response.status_code != 200:
+        pytest.skip("Could not register test user")
+    headers = {"Authorization": f"Bearer {response.json()['session_token']}"}
+
+    profile = requests.get(f"{BASE_URL}/api/profile", headers=headers).json()
+    yield headers, profile["username"]
+
+    requests.delete(f"{BASE_URL}/api/profile", headers=headers)
+
+
+@pytest.fixture(scope="module")
+def auth_headers(registered_user):
+    """Auth headers of the module's registered user"""
+    return registered_user[0]
@@ -0,0 +1,124 @@
+"""
+FlexCard Analytics Tests
+Tests the write-behind buffer's early flushes, and that analytics_daily is
+maintained by processes that never ran its migration (such as the serverless
+entry point)
+"""
+
+import pytest
+import asyncio
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+pytestmark = pytest.mark.skipif(not os.environ.get('SUPABASE_DB_URL'), reason="SUPABASE_DB_URL not set")
+
+import supabase_db
+from supabase_db import (
+    close_pool, configure_database, flush_analytics, get_connection, get_daily_analytics,
+    migrate_analytics_daily, record_analytics_event
+)
+
+
+def run_serverless(scenario):
+    """Run an async scenario as a fresh serverless instance would: its own connection, no migrations"""
+    async def main():
+        # The table itself exists, as created by the long-running backend
+        await migrate_analytics_daily()
+        await close_pool()
+        configure_database("serverless")
+        supabase_db._analytics_daily_exists = False
+        try:
+            return await scenario()
+        finally:
+            await close_pool()
+            configure_database("server")
+    return asyncio.run(main())
+
+
+class TestAnalyticsRollup:
+    """Test analytics_daily detection in the shared database module"""
+
+    def test_flush_updates_rollup_without_migration(self):
+        """Buffered events reach analytics_daily even if migrate_analytics_daily() never ran here"""
+        profile_id = f"profile_rollup{time.time_ns()}"
+
+        async def scenario():
+            for _ in range(3):
+                record_analytics_event(profile_id, "view")
+            await flush_analytics()
+            async with get_connection() as conn:
+                count = await conn.fetchval(
+                    "SELECT SUM(count) FROM analytics_daily WHERE profile_id = $1 AND event_type = 'view'",
+                    profile_id
+                )
+            return count, await get_daily_analytics(profile_id, days=30)
+
+        count, daily = run_serverless(scenario)
+        assert count == 3
+        assert [(row["event_type"], row["count"]) for row in daily] == [("view", 3)]
+        print("✓ Serverless flush updated analytics_daily")
+
+    def test_rollup_and_raw_reads_share_the_window(self, monkeypatch):
+        """Events on the first day of the window and on the day before it are counted the same way by both paths"""
+        profile_id = f"profile_window{time.time_ns()}"
+
+        async def scenario():
+            async with get_connection() as conn:
+                today = await conn.fetchval("SELECT (NOW() AT TIME ZONE 'UTC')::date")
+                timestamps = [
+                    datetime.combine(today - timedelta(days=30), datetime.min.time(), timezone.utc),
+                    datetime.combine(today - timedelta(days=31), datetime.max.time(), timezone.utc),
+                ]
+                async with conn.transaction():
+                    await conn.executemany(
+                        "INSERT INTO analytics (profile_id, event_type, timestamp) VALUES ($1, 'view', $2)",
+                        [(profile_id, ts) for ts in timestamps]
+                    )
+                    await supabase_db._add_to_analytics_daily(conn, {(profile_id, ts.date(), "view"): 1 for ts in timestamps})
+            from_rollup = await get_daily_analytics(profile_id, days=30)
+
+            async def no_rollup(conn, writing=False):
+                return False
+            monkeypatch.setattr(supabase_db, "_has_analytics_daily", no_rollup)
+            from_raw = await get_daily_analytics(profile_id, days=30)
+            return today, from_rollup, from_raw
+
+        today, from_rollup, from_raw = run_serverless(scenario)
+        assert [(row["day"], row["count"]) for row in from_rollup] == [(today - timedelta(days=30), 1)]
+        assert [(row["day"], row["count"]) for row in from_raw] == [(row["day"], row["count"]) for row in from_rollup]
+        print("✓ Rollup and raw-event reads agree on the window boundary")
+
+
+class TestEarlyFlush:
+    """Test the flush started when the buffer fills up"""
+
+    def test_failed_early_flush_is_logged_and_requeued(self, monkeypatch, caplog):
+        """A failing early flush logs an error and keeps its events for the next flush"""
+        @asynccontextmanager
+        async def unavailable(conn=None):
+            raise ConnectionError("database unavailable")
+            yield
+
+        monkeypatch.setattr(supabase_db, "get_connection", unavailable)
+        monkeypatch.setattr(supabase_db, "ANALYTICS_FLUSH_MAX_EVENTS", 3)
+        monkeypatch.setattr(supabase_db, "_pending_events", [])
+
+        async def scenario():
+            for _ in range(3):
+                record_analytics_event("profile_earlyflush", "view")
+            assert len(supabase_db._early_flushes) == 1
+            await asyncio.gather(*supabase_db._early_flushes, return_exceptions=True)
+            await asyncio.sleep(0)
+            return len(supabase_db._pending_events), len(supabase_db._early_flushes)
+
+        with caplog.at_level(logging.ERROR, logger="supabase_db"):
+            pending, running = asyncio.run(scenario())
+        assert (pending, running) == (3, 0)
+        assert "Early analytics flush failed: database unavailable" in caplog.text
+        print("✓ Failed early flush logged and requeued")
@@ -0,0 +1,47 @@
+"""
+FlexCard Bulk Card Generation Tests
+Tests for POST /api/cards/generate batches
+"""
+
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestBulkCardGeneration:
+    """Test bulk physical card generation"""
+
+    def test_generate_large_batch(self):
+        """A full batch returns the requested number of distinct codes"""
+        response = requests.post(
+            f"{BASE_URL}/api/cards/generate",
+            params={"count": 300, "batch_name": "test_bulk", "code_length": 6}
+        )
+        assert response.status_code == 200
+        card_ids = response.json()["card_ids"]
+        assert len(card_ids) == 300
+        assert len(set(card_ids)) == 300
+        assert all(len(card_id) == 6 for card_id in card_ids)
+
+        card = requests.get(f"{BASE_URL}/api/cards/{card_ids[-1]}").json()
+        assert card["status"] == "unactivated"
+        print("✓ Generated 300 unique cards")
+
+    def test_batch_is_capped(self):
+        """Oversized batches are capped at the default MAX_CARD_BATCH"""
+        response = requests.post(f"{BASE_URL}/api/cards/generate", params={"count": 100000, "batch_name": "test_cap"})
+        assert response.status_code == 200
+        assert len(response.json()["card_ids"]) == 300
+        print("✓ Batch capped at 300 cards")
+
+    def test_code_length_boundaries(self):
+        """Code lengths must fit physical_cards.card_id (VARCHAR(10))"""
+        response = requests.post(f"{BASE_URL}/api/cards/generate", params={"count": 1, "code_length": 10})
+        assert response.status_code == 200
+        assert len(response.json()["card_ids"][0]) == 10
+        for code_length in (3, 11, 16):
+            response = requests.post(f"{BASE_URL}/api/cards/generate", params={"count": 1, "code_length": code_length})
+            assert response.status_code == 400
+        print("✓ Code lengths 4-10 accepted, others rejected")
@@ -0,0 +1,90 @@
+"""
+FlexCard Card Tap Redirect Tests
+Tests for GET /c/{card_id}
+"""
+
+import pytest
+import requests
+import os
+import time
+import subprocess
+import sys
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+API_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'api')
+
+# Creates a card, taps it through the Vercel entry point, activates it and taps again
+SERVERLESS_TAP_SCRIPT = """
+import asyncio, sys, httpx, index, supabase_db
+
+async def main():
+    card_id = (await supabase_db.create_physical_cards_bulk(1, "test", lambda: sys.argv[2]))[0]
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://serverless") as client:
+        print((await client.get("/c/NOSUCHCARD")).status_code)
+        print((await client.get("/c/" + card_id.lower())).headers["location"])
+        response = await client.post("/api/auth/register", json={"email": sys.argv[1], "name": "Serverless Tap", "password": "test123"})
+        headers = {"Authorization": "Bearer " + response.json()["session_token"]}
+        await client.post("/api/cards/" + card_id + "/activate", headers=headers)
+        print((await client.get("/api/profile", headers=headers)).json()["username"])
+        print((await client.get("/c/" + card_id)).headers["location"])
+        await client.delete("/api/profile", headers=headers)
+
+asyncio.run(main())
+"""
+
+
+def tap(card_id):
+    return requests.get(f"{BASE_URL}/c/{card_id}", allow_redirects=False)
+
+
+class TestCardTapRedirect:
+    """Test the direct card tap redirect"""
+
+    def test_unknown_card(self):
+        """Unknown cards return 404"""
+        assert tap("NOSUCHCARD").status_code == 404
+        print("✓ Unknown card returns 404")
+
+    def test_redirect_follows_card_lifecycle(self, registered_user):
+        """The redirect tracks activation, username changes and unlinking"""
+        headers, username = registered_user
+        card_id = requests.post(f"{BASE_URL}/api/cards/generate", params={"count": 1}).json()["card_ids"][0]
+
+        response = tap(card_id)
+        assert response.status_code == 302
+        assert response.headers["location"].endswith(f"/activate/{card_id}")
+
+        assert requests.post(f"{BASE_URL}/api/cards/{card_id}/activate", headers=headers).status_code == 200
+        response = tap(card_id.lower())
+        assert response.status_code == 302
+        assert response.headers["location"].endswith(f"/u/{username}/{card_id}")
+        print("✓ Activated card redirects to the profile")
+
+        new_username = f"tap{int(time.time())}"
+        response = requests.put(f"{BASE_URL}/api/profile/username", headers=headers, json={"username": new_username})
+        assert response.status_code == 200
+        assert tap(card_id).headers["location"].endswith(f"/u/{new_username}/{card_id}")
+        print("✓ Username change updates the redirect")
+
+        assert requests.delete(f"{BASE_URL}/api/cards/{card_id}/unlink", headers=headers).status_code == 200
+        assert tap(card_id).headers["location"].endswith(f"/activate/{card_id}")
+        print("✓ Unlinked card redirects to activation")
+
+
+@pytest.mark.skipif(not os.environ.get('SUPABASE_DB_URL'), reason="SUPABASE_DB_URL not set")
+class TestServerlessCardTap:
+    """Test that the Vercel entry point (api/index.py) answers card taps too"""
+
+    def test_tap_redirects(self):
+        """GET /c/{card_id} redirects on api/index.py"""
+        card_id = f"T{time.time_ns() % 10**9:09d}"
+        result = subprocess.run(
+            [sys.executable, "-c", SERVERLESS_TAP_SCRIPT, f"testtapserverless{time.time_ns()}@test.com", card_id],
+            cwd=API_DIR, capture_output=True, text=True, check=True
+        )
+        unknown, unactivated, username, activated = result.stdout.strip().split("\n")
+        assert unknown == "404"
+        assert unactivated.endswith(f"/activate/{card_id}")
+        assert activated.endswith(f"/u/{username}/{card_id}")
+        print("✓ Serverless entry point redirects card taps")
@@ -0,0 +1,77 @@
+"""
+FlexCard Cold Start Tests
+Tests that importing the Vercel entry point stays within its import time budget,
+and that every backend module it imports is bundled with the function
+"""
+
+import pytest
+import os
+import json
+import fnmatch
+import re
+import subprocess
+import sys
+
+API_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'api')
+REPO_DIR = os.path.abspath(os.path.join(API_DIR, '..'))
+
+# Cumulative import time of api/index.py, best of RUNS, in milliseconds
+COLD_START_BUDGET_MS = float(os.environ.get('COLD_START_BUDGET_MS', '750'))
+RUNS = 3
+
+# Only imported by the routes that need them
+LAZY_MODULES = ("httpx", "resend", "jose", "PIL", "email_service", "jinja2", "profile_snapshot")
+
+
+def import_index(*args, report="','.join(sorted(sys.modules))"):
+    """Import api/index.py in a fresh interpreter and return the completed process"""
+    env = dict(os.environ, SUPABASE_DB_URL=os.environ.get('SUPABASE_DB_URL', 'postgresql://localhost/flexcard'))
+    return subprocess.run(
+        [sys.executable, *args, "-c", f"import sys, index; print({report})"],
+        cwd=API_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+@pytest.fixture(scope="module")
+def warm_bytecode():
+    """Compile once so the timed runs measure imports, not bytecode compilation"""
+    import_index()
+
+
+class TestColdStart:
+    """Test the import cost of the serverless entry point"""
+
+    def test_optional_modules_not_imported(self, warm_bytecode):
+        """Optional clients are not loaded at import time"""
+        loaded = set(import_index().stdout.strip().split(","))
+        assert not loaded & set(LAZY_MODULES), f"Imported eagerly: {sorted(loaded & set(LAZY_MODULES))}"
+        print("✓ Optional modules are imported lazily")
+
+    def test_import_time_within_budget(self, warm_bytecode):
+        """python -X importtime reports index within COLD_START_BUDGET_MS"""
+        timings = []
+        for _ in range(RUNS):
+            report = import_index("-X", "importtime").stderr
+            match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| index$", report, re.MULTILINE)
+            assert match, "index missing from the -X importtime report"
+            timings.append(int(match.group(1)) / 1000)
+
+        best = min(timings)
+        assert best <= COLD_START_BUDGET_MS, f"index imports in {best:.0f} ms (budget {COLD_START_BUDGET_MS:.0f} ms)"
+        print(f"✓ index imports in {best:.0f} ms (budget {COLD_START_BUDGET_MS:.0f} ms)")
+
+    def test_backend_modules_bundled(self):
+        """Every backend module api/index.py imports matches the function's includeFiles"""
+        with open(os.path.join(REPO_DIR, "Vercel.json")) as f:
+            include_files = json.load(f)["functions"]["api/index.py"]["includeFiles"]
+        files = import_index(report="'\\n'.join(m.__file__ for m in list(sys.modules.values()) if getattr(m, '__file__', None))")
+        backend_files = {
+            os.path.relpath(os.path.realpath(path), REPO_DIR)
+            for path in files.stdout.split("\n")
+            if os.path.realpath(path).startswith(os.path.join(REPO_DIR, "backend") + os.sep)
+        }
+        assert "backend/supabase_db.py" in backend_files
+        patterns = include_files.strip("{}").split(",")
+        missing = sorted(path for path in backend_files if not any(fnmatch.fnmatch(path, p) for p in patterns))
+        assert not missing, f"Not bundled by includeFiles ({include_files}): {missing}"
+        print(f"✓ {len(backend_files)} backend modules covered by {include_files}")
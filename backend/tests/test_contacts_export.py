@@ -0,0 +1,102 @@
+"""
+FlexCard Contacts Tests
+Tests cursor pagination of GET /api/contacts and the CSV/vCard exports
+"""
+
+import pytest
+import requests
+import os
+import csv
+import io
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+CONTACT_COUNT = 25
+
+
+@pytest.fixture(scope="module")
+def user_with_contacts(registered_user):
+    """Send CONTACT_COUNT contacts to the registered user's profile and return (headers, names)"""
+    headers, username = registered_user
+    names = []
+    for i in range(CONTACT_COUNT):
+        name = f"Lead {i}, Ünïcode"
+        response = requests.post(f"{BASE_URL}/api/public/{username}/contact", json={
+            "name": name, "email": f"lead{i}@example.com", "phone": "+33 6 12 34 56 78",
+            "message": "=HYPERLINK(\"http://evil\")" if i == 0 else f"Met at booth {i}"
+        })
+        assert response.status_code == 200
+        names.append(name)
+    return headers, names
+
+
+class TestContactsPagination:
+    """Test keyset pagination of GET /api/contacts"""
+
+    def test_pages_cover_all_contacts_once(self, user_with_contacts):
+        """Following X-Next-Cursor returns every contact exactly once, newest first"""
+        headers, names = user_with_contacts
+        contacts, cursor, pages = [], None, 0
+        while True:
+            params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+            response = requests.get(f"{BASE_URL}/api/contacts", headers=headers, params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= 10
+            contacts.extend(page)
+            pages += 1
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+
+        assert pages == 3
+        assert [c["name"] for c in contacts] == list(reversed(names))
+        assert len({c["contact_id"] for c in contacts}) == CONTACT_COUNT
+        print(f"✓ {CONTACT_COUNT} contacts returned over {pages} pages")
+
+    def test_invalid_parameters(self, user_with_contacts):
+        """Bad cursors and limits are rejected"""
+        headers, _ = user_with_contacts
+        response = requests.get(f"{BASE_URL}/api/contacts", headers=headers, params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+        response = requests.get(f"{BASE_URL}/api/contacts", headers=headers, params={"limit": 0})
+        assert response.status_code == 400
+        print("✓ Invalid cursor and limit rejected")
+
+
+class TestContactsExport:
+    """Test GET /api/contacts/export"""
+
+    def test_csv_export(self, user_with_contacts):
+        """The CSV has a header and one row per contact, with formulas neutralized"""
+        headers, names = user_with_contacts
+        response = requests.get(f"{BASE_URL}/api/contacts/export", headers=headers, params={"format": "csv"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert "attachment" in response.headers["content-disposition"]
+
+        rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+        assert [row["name"] for row in rows] == list(reversed(names))
+        assert rows[-1]["message"].startswith("'=")
+        assert rows[0]["phone"] == "+33 6 12 34 56 78"
+        print(f"✓ CSV export has {len(rows)} rows")
+
+    def test_vcf_export(self, user_with_contacts):
+        """The VCF holds one escaped vCard per contact"""
+        headers, names = user_with_contacts
+        response = requests.get(f"{BASE_URL}/api/contacts/export", headers=headers, params={"format": "vcf"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/vcard")
+
+        lines = response.content.decode("utf-8").replace("\r\n ", "").split("\r\n")
+        assert lines.count("BEGIN:VCARD") == CONTACT_COUNT
+        assert lines.count("END:VCARD") == CONTACT_COUNT
+        assert f"FN:{names[0].replace(',', chr(92) + ',')}" in lines
+        print(f"✓ VCF export has {CONTACT_COUNT} vCards")
+
+    def test_unknown_format(self, user_with_contacts):
+        """Unsupported formats are rejected"""
+        headers, _ = user_with_contacts
+        response = requests.get(f"{BASE_URL}/api/contacts/export", headers=headers, params={"format": "xlsx"})
+        assert response.status_code == 400
+        print("✓ Unknown export format rejected")
@@ -0,0 +1,194 @@
+"""
+FlexCard Email Outbox Tests
+Tests the outbox worker against the fake transport, the compiled email
+templates, and that auth routes queue their emails instead of sending them inline
+"""
+
+import pytest
+import requests
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+pytestmark = pytest.mark.skipif(not os.environ.get('SUPABASE_DB_URL'), reason="SUPABASE_DB_URL not set")
+
+from supabase_db import (
+    close_pool, get_connection, enqueue_email, get_outbox_email, migrate_email_outbox,
+    register_user, new_account_data, new_session_data
+)
+from email_service import FakeTransport, OutboxWorker, get_welcome_email, queue_card_activation_emails
+
+
+def run(scenario):
+    """Run an async scenario against the database with a pool of its own"""
+    async def main():
+        try:
+            await migrate_email_outbox()
+            return await scenario()
+        finally:
+            await close_pool()
+    return asyncio.run(main())
+
+
+async def make_due(email_id):
+    async with get_connection() as conn:
+        await conn.execute("UPDATE email_outbox SET next_attempt_at = now() WHERE id = $1", email_id)
+
+
+class TestOutboxWorker:
+    """Test delivery, retries and claiming of outbox rows"""
+
+    def test_queued_email_is_sent(self):
+        """A queued email is delivered and marked sent"""
+        to_email = f"outbox{time.time_ns()}@test.com"
+        transport = FakeTransport()
+
+        async def scenario():
+            email_id = await enqueue_email(to_email, "Hello", "<p>Hello</p>")
+            await OutboxWorker(transport).run_once()
+            return await get_outbox_email(email_id)
+
+        email = run(scenario)
+        assert email["status"] == "sent"
+        assert email["attempts"] == 1
+        assert email["provider_id"] and email["sent_at"]
+        assert [to_email] in [message["to"] for message in transport.sent]
+        print("✓ Queued email sent and marked sent")
+
+    def test_failed_send_is_retried_with_backoff(self):
+        """A failed attempt is rescheduled, then sent on the next attempt"""
+        to_email = f"outbox{time.time_ns()}@test.com"
+        transport = FakeTransport(failures=1)
+
+        async def scenario():
+            email_id = await enqueue_email(to_email, "Retry", "<p>Retry</p>")
+            worker = OutboxWorker(transport, batch_size=1)
+            while (await get_outbox_email(email_id))["attempts"] == 0:
+                await worker.run_once()
+            retrying = await get_outbox_email(email_id)
+            await make_due(email_id)
+            while (await get_outbox_email(email_id))["status"] == "pending":
+                await worker.run_once()
+            return retrying, await get_outbox_email(email_id)
+
+        retrying, email = run(scenario)
+        assert retrying["status"] == "pending"
+        assert retrying["last_error"]
+        assert retrying["next_attempt_at"] > retrying["created_at"]
+        assert email["status"] == "sent"
+        assert email["attempts"] == 2
+        print("✓ Failed send retried after backoff")
+
+    def test_gives_up_after_max_attempts(self):
+        """An email that keeps failing ends up failed"""
+        to_email = f"outbox{time.time_ns()}@test.com"
+        transport = FakeTransport(failures=10)
+
+        async def scenario():
+            email_id = await enqueue_email(to_email, "Fail", "<p>Fail</p>")
+            worker = OutboxWorker(transport, batch_size=1, max_attempts=2)
+            while (await get_outbox_email(email_id))["status"] != "failed":
+                await make_due(email_id)
+                await worker.run_once()
+            return await get_outbox_email(email_id)
+
+        email = run(scenario)
+        assert email["attempts"] == 2
+        assert email["last_error"]
+        print("✓ Email marked failed after max attempts")
+
+    def test_concurrent_workers_send_each_email_once(self):
+        """Workers draining the outbox together never claim the same row"""
+        to_emails = [f"outbox{time.time_ns()}_{i}@test.com" for i in range(20)]
+        transports = [FakeTransport() for _ in range(3)]
+
+        async def scenario():
+            ids = [await enqueue_email(to_email, "Batch", "<p>Batch</p>") for to_email in to_emails]
+            workers = [OutboxWorker(transport, batch_size=5) for transport in transports]
+            while any(await asyncio.gather(*(worker.run_once() for worker in workers))):
+                pass
+            return [await get_outbox_email(email_id) for email_id in ids]
+
+        emails = run(scenario)
+        assert all(email["status"] == "sent" and email["attempts"] == 1 for email in emails)
+        sent = [message["to"][0] for transport in transports for message in transport.sent]
+        assert sorted(to for to in sent if to in to_emails) == sorted(to_emails)
+        print("✓ 20 emails sent exactly once by 3 workers")
+
+
+class TestEmailTemplates:
+    """Test rendering of the compiled email templates"""
+
+    def test_fields_are_escaped(self):
+        """Recipient fields are HTML-escaped in the rendered email"""
+        subject, html = get_welcome_email("<b>Eve</b>", "https://flexcard.co/verify?a=1&b=2")
+        assert "&lt;b&gt;Eve&lt;/b&gt;" in html and "<b>Eve</b>" not in html
+        assert "verify?a=1&amp;b=2" in html
+        print("✓ Template fields are escaped")
+
+    def test_card_activation_campaign_is_queued(self):
+        """A campaign renders one personalized email per recipient and queues them all"""
+        stamp = time.time_ns()
+        recipients = [
+            {"email": f"campaign{stamp}_{i}@test.com", "user_name": f"User {i}",
+             "card_id": f"FC{i:04d}", "profile_link": f"https://flexcard.co/u/user{i}"}
+            for i in range(50)
+        ]
+
+        async def scenario():
+            ids = await queue_card_activation_emails(recipients)
+            return [await get_outbox_email(email_id) for email_id in ids]
+
+        emails = run(scenario)
+        assert [email["to_email"] for email in emails] == [r["email"] for r in recipients]
+        for recipient, email in zip(recipients, emails):
+            assert recipient["card_id"] in email["subject"]
+            assert recipient["user_name"] in email["html"] and recipient["profile_link"] in email["html"]
+        print("✓ 50 personalized activation emails queued")
+
+
+class TestAuthEmails:
+    """Test that auth routes write to the outbox"""
+
+    def test_register_and_forgot_password_queue_emails(self):
+        """Register and forgot-password each leave an outbox row"""
+        test_email = f"testoutbox{time.time_ns()}@test.com"
+        response = requests.post(
+            f"{BASE_URL}/api/auth/register",
+            json={"email": test_email, "name": "Outbox Test", "password": "test123"}
+        )
+        assert response.status_code == 200
+        response = requests.post(f"{BASE_URL}/api/auth/forgot-password", json={"email": test_email})
+        assert response.status_code == 200
+
+        async def scenario():
+            async with get_connection() as conn:
+                return await conn.fetch("SELECT subject, status FROM email_outbox WHERE to_email = $1", test_email)
+
+        rows = run(scenario)
+        assert len(rows) == 2
+        print("✓ Welcome and password reset emails queued")
+
+        headers = {"Authorization": f"Bearer {requests.post(f'{BASE_URL}/api/auth/login', json={'email': test_email, 'password': 'test123'}).json()['session_token']}"}
+        requests.delete(f"{BASE_URL}/api/profile", headers=headers)
+
+    def test_registration_and_welcome_email_commit_together(self):
+        """If the outbox row cannot be written, the user is not created either"""
+        test_email = f"testoutboxatomic{time.time_ns()}@test.com"
+        new_user, profile_data = new_account_data(test_email, "Atomic Test", "email", password="x")
+
+        async def scenario():
+            with pytest.raises(Exception):
+                # A NULL subject violates email_outbox's NOT NULL constraint
+                await register_user(new_user, profile_data, new_session_data(new_user["user_id"]),
+                                    "https://example.com/u/", emails=[(test_email, None, "<p>Hi</p>")])
+            async with get_connection() as conn:
+                return await conn.fetchval("SELECT COUNT(*) FROM users WHERE email = $1", test_email)
+
+        assert run(scenario) == 0
+        print("✓ Failed outbox insert rolls back the registration")
@@ -0,0 +1,54 @@
+"""
+FlexCard Link Position Tests
+Tests position assignment on link creation and POST /api/links/batch
+"""
+
+import requests
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+def new_link(i):
+    return {"type": "website", "url": f"https://example.com/{i}", "title": f"Link {i}"}
+
+
+class TestLinkPositions:
+    """Test that created links are appended with distinct positions"""
+
+    def test_concurrent_creates_get_distinct_positions(self, auth_headers):
+        """Links created concurrently all end up with different positions"""
+        def create(i):
+            return requests.post(f"{BASE_URL}/api/links", headers=auth_headers, json=new_link(i))
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            responses = list(executor.map(create, range(10)))
+        assert all(response.status_code == 200 for response in responses)
+
+        positions = [l["position"] for l in requests.get(f"{BASE_URL}/api/links", headers=auth_headers).json()]
+        assert sorted(positions) == list(range(10))
+        print("✓ 10 concurrent creates got positions 0..9")
+
+    def test_batch_appends_in_order(self, auth_headers):
+        """A batch is appended after the existing links, in request order"""
+        existing = len(requests.get(f"{BASE_URL}/api/links", headers=auth_headers).json())
+        batch = [new_link(f"batch{i}") for i in range(25)]
+        response = requests.post(f"{BASE_URL}/api/links/batch", headers=auth_headers, json={"links": batch})
+        assert response.status_code == 200
+        links = response.json()
+        assert [l["url"] for l in links] == [l["url"] for l in batch]
+        assert [l["position"] for l in links] == list(range(existing, existing + 25))
+        assert all(l["link_id"].startswith("link_") for l in links)
+
+        all_links = requests.get(f"{BASE_URL}/api/links", headers=auth_headers).json()
+        assert len(all_links) == existing + 25
+        print("✓ Batch of 25 links appended in order")
+
+    def test_batch_limits(self, auth_headers):
+        """Empty and invalid batches are rejected"""
+        response = requests.post(f"{BASE_URL}/api/links/batch", headers=auth_headers, json={"links": []})
+        assert response.status_code == 400
+        response = requests.post(f"{BASE_URL}/api/links/batch", headers=auth_headers, json={"links": [{"url": "x"}]})
+        assert response.status_code == 422
+        print("✓ Invalid batches rejected")
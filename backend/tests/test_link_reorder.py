@@ -0,0 +1,77 @@
+"""
+FlexCard Link Reorder Tests
+Tests PUT /api/links/reorder
+"""
+
+import pytest
+import requests
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="module")
+def user_with_links(registered_user):
+    """Give the registered user 8 links and return (headers, link_ids)"""
+    headers, _ = registered_user
+    link_ids = []
+    for i in range(8):
+        response = requests.post(
+            f"{BASE_URL}/api/links",
+            headers=headers,
+            json={"type": "website", "url": f"https://example.com/{i}", "title": f"Link {i}"}
+        )
+        assert response.status_code == 200
+        link_ids.append(response.json()["link_id"])
+    return headers, link_ids
+
+
+class TestLinkReorder:
+    """Test batch link reordering"""
+
+    def test_reorder_returns_new_order(self, user_with_links):
+        """The response and later reads follow the requested order"""
+        headers, link_ids = user_with_links
+        new_order = list(reversed(link_ids))
+        response = requests.put(f"{BASE_URL}/api/links/reorder", headers=headers, json={"link_ids": new_order})
+        assert response.status_code == 200
+        links = response.json()
+        assert [l["link_id"] for l in links] == new_order
+        assert [l["position"] for l in links] == list(range(len(new_order)))
+
+        links = requests.get(f"{BASE_URL}/api/links", headers=headers).json()
+        assert [l["link_id"] for l in links] == new_order
+        print("✓ Links reordered in one request")
+
+    def test_unknown_link_ids_are_ignored(self, user_with_links):
+        """Ids that are not the user's links do not affect anything"""
+        headers, link_ids = user_with_links
+        response = requests.put(
+            f"{BASE_URL}/api/links/reorder",
+            headers=headers,
+            json={"link_ids": ["link_doesnotexist"] + link_ids}
+        )
+        assert response.status_code == 200
+        links = response.json()
+        assert [l["link_id"] for l in links] == link_ids
+        assert [l["position"] for l in links] == list(range(1, len(link_ids) + 1))
+        print("✓ Unknown link ids ignored")
+
+    def test_concurrent_reorders_do_not_interleave(self, user_with_links):
+        """After concurrent reorders the ordering is exactly one of the requested ones"""
+        headers, link_ids = user_with_links
+        orders = [random.sample(link_ids, len(link_ids)) for _ in range(10)]
+
+        def reorder(order):
+            return requests.put(f"{BASE_URL}/api/links/reorder", headers=headers, json={"link_ids": order})
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            responses = list(executor.map(reorder, orders))
+        assert all(response.status_code == 200 for response in responses)
+
+        links = requests.get(f"{BASE_URL}/api/links", headers=headers).json()
+        assert [l["link_id"] for l in links] in orders
+        assert [l["position"] for l in links] == list(range(len(link_ids)))
+        print("✓ Concurrent reorders applied atomically")
@@ -0,0 +1,148 @@
+"""
+FlexCard Profile Snapshot Tests
+Tests the pre-rendered HTML public profile served at /u/{username}
+"""
+
+import pytest
+import requests
+import os
+import time
+import io
+import subprocess
+import sys
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from profile_snapshot import render_profile_snapshot
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+API_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'api')
+
+# Registers a user through the Vercel entry point and fetches its snapshot there
+SERVERLESS_SNAPSHOT_SCRIPT = """
+import asyncio, sys, httpx, index
+
+async def main():
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://serverless") as client:
+        response = await client.post("/api/auth/register", json={"email": sys.argv[1], "name": "Serverless Snapshot", "password": "test123"})
+        headers = {"Authorization": "Bearer " + response.json()["session_token"]}
+        username = (await client.get("/api/profile", headers=headers)).json()["username"]
+        response = await client.get("/u/" + username)
+        print(response.status_code)
+        print(response.headers.get("content-type"))
+        print((await client.get("/u/" + username, headers={"If-None-Match": response.headers["etag"]})).status_code)
+        print(response.text)
+        await client.delete("/api/profile", headers=headers)
+
+asyncio.run(main())
+"""
+
+
+class TestProfileSnapshot:
+    """Test the /u/{username} HTML snapshot"""
+
+    def test_unknown_username(self):
+        """An unknown username returns 404"""
+        response = requests.get(f"{BASE_URL}/u/nosuchuser{int(time.time())}")
+        assert response.status_code == 404
+        print("✓ Unknown username returns 404")
+
+    def test_snapshot_renders_profile(self, registered_user):
+        """The snapshot is HTML with the profile and Open Graph tags"""
+        headers, username = registered_user
+        response = requests.get(f"{BASE_URL}/u/{username}")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/html")
+        assert "Snapshot" in response.text
+        assert '<meta property="og:title"' in response.text
+        assert f"/u/{username}" in response.text
+        print("✓ Snapshot contains the profile and OG tags")
+
+    def test_snapshot_revalidates_with_etag(self, registered_user):
+        """A matching If-None-Match returns 304"""
+        headers, username = registered_user
+        etag = requests.get(f"{BASE_URL}/u/{username}").headers["etag"]
+        response = requests.get(f"{BASE_URL}/u/{username}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        print("✓ Unchanged snapshot answered with 304")
+
+    def test_snapshot_follows_profile_and_link_changes(self, registered_user):
+        """Profile and link changes show up in the next snapshot, escaped"""
+        headers, username = registered_user
+        before = requests.get(f"{BASE_URL}/u/{username}")
+
+        response = requests.put(f"{BASE_URL}/api/profile", headers=headers, json={"title": "CEO <Acme>"})
+        assert response.status_code == 200
+        response = requests.post(
+            f"{BASE_URL}/api/links",
+            headers=headers,
+            json={"type": "website", "url": "https://example.com/snapshot", "title": "Snapshot Site"}
+        )
+        assert response.status_code == 200
+        requests.post(
+            f"{BASE_URL}/api/links",
+            headers=headers,
+            json={"type": "website", "url": "javascript:alert(1)", "title": "Bad Link"}
+        )
+
+        after = requests.get(f"{BASE_URL}/u/{username}")
+        assert after.headers["etag"] != before.headers["etag"]
+        assert "CEO &lt;Acme&gt;" in after.text
+        assert 'href="https://example.com/snapshot"' in after.text
+        assert "javascript:" not in after.text
+        print("✓ Snapshot re-rendered after profile and link changes")
+
+    def test_avatar_set_through_profile_replaces_uploaded_variants(self, registered_user):
+        """An avatar URL saved with PUT /profile is shown instead of the uploaded image's variants"""
+        headers, username = registered_user
+        buffer = io.BytesIO()
+        Image.new("RGB", (300, 300), (200, 40, 40)).save(buffer, "PNG")
+        response = requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers=headers,
+            files={"file": ("avatar.png", buffer.getvalue(), "image/png")}
+        )
+        assert response.status_code == 200
+        uploaded = response.json()["avatar"]
+
+        response = requests.put(f"{BASE_URL}/api/profile", headers=headers, json={"avatar": "https://example.com/me.jpg"})
+        assert response.status_code == 200
+        assert response.json()["avatar_variants"] is None
+
+        html = requests.get(f"{BASE_URL}/u/{username}").text
+        assert "https://example.com/me.jpg" in html
+        assert uploaded not in html
+        print("✓ Avatar set through PUT /profile replaces the uploaded variants")
+
+
+class TestSnapshotAssets:
+    """Test the React build references in the snapshot"""
+
+    def test_asset_urls_point_at_the_frontend(self):
+        """Build assets are loaded from the frontend's host, not the one serving the snapshot"""
+        payload = {"profile": {"username": "assets", "first_name": "Asset"}, "links": []}
+        assets = {"scripts": ["/static/js/main.abc.js"], "styles": ["/static/css/main.abc.css"]}
+        html = render_profile_snapshot(payload, "https://flexcard.example", assets)
+        assert '<script defer src="https://flexcard.example/static/js/main.abc.js">' in html
+        assert 'href="https://flexcard.example/static/css/main.abc.css"' in html
+        print("✓ Snapshot assets prefixed with the frontend URL")
+
+
+@pytest.mark.skipif(not os.environ.get('SUPABASE_DB_URL'), reason="SUPABASE_DB_URL not set")
+class TestServerlessSnapshot:
+    """Test that the Vercel entry point (api/index.py) serves /u/{username} too"""
+
+    def test_snapshot_route_exists(self):
+        """GET /u/{username} works on api/index.py"""
+        result = subprocess.run(
+            [sys.executable, "-c", SERVERLESS_SNAPSHOT_SCRIPT, f"testsnapshotserverless{time.time_ns()}@test.com"],
+            cwd=API_DIR, capture_output=True, text=True, check=True
+        )
+        status, content_type, revalidated, html = result.stdout.split("\n", 3)
+        assert status == "200"
+        assert content_type.startswith("text/html")
+        assert revalidated == "304"
+        assert "<h1>Serverless Snapshot</h1>" in html
+        print("✓ Serverless entry point serves profile snapshots")
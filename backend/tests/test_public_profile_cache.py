@@ -0,0 +1,68 @@
+"""
+FlexCard Public Profile Cache Tests
+Tests that profile and link changes are visible on the public profile right away
+"""
+
+import requests
+import os
+import time
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestPublicProfileCache:
+    """Test write-through invalidation of the public profile cache"""
+
+    def test_profile_update_invalidates_cache(self, registered_user):
+        """Updating the profile is reflected on the next public read"""
+        headers, username = registered_user
+
+        # Warm the cache
+        response = requests.get(f"{BASE_URL}/api/public/{username}")
+        assert response.status_code == 200
+
+        new_title = f"Title {int(time.time())}"
+        response = requests.put(f"{BASE_URL}/api/profile", headers=headers, json={"title": new_title})
+        assert response.status_code == 200
+
+        response = requests.get(f"{BASE_URL}/api/public/{username}")
+        assert response.status_code == 200
+        assert response.json()["profile"]["title"] == new_title
+        print("✓ Profile update visible on public profile")
+
+    def test_link_changes_invalidate_cache(self, registered_user):
+        """Creating and deleting a link is reflected on the next public read"""
+        headers, username = registered_user
+
+        requests.get(f"{BASE_URL}/api/public/{username}")
+
+        response = requests.post(
+            f"{BASE_URL}/api/links",
+            headers=headers,
+            json={"type": "social", "platform": "github", "url": "https://github.com/test", "title": "GitHub"}
+        )
+        assert response.status_code == 200
+        link_id = response.json()["link_id"]
+
+        links = requests.get(f"{BASE_URL}/api/public/{username}").json()["links"]
+        assert link_id in [l["link_id"] for l in links]
+        print("✓ New link visible on public profile")
+
+        requests.delete(f"{BASE_URL}/api/links/{link_id}", headers=headers)
+        links = requests.get(f"{BASE_URL}/api/public/{username}").json()["links"]
+        assert link_id not in [l["link_id"] for l in links]
+        print("✓ Deleted link removed from public profile")
+
+    def test_username_change_invalidates_old_username(self, registered_user):
+        """The old username stops resolving once it has been changed"""
+        headers, username = registered_user
+
+        requests.get(f"{BASE_URL}/api/public/{username}")
+
+        new_username = f"cache{int(time.time())}"
+        response = requests.put(f"{BASE_URL}/api/profile/username", headers=headers, json={"username": new_username})
+        assert response.status_code == 200
+
+        assert requests.get(f"{BASE_URL}/api/public/{username}").status_code == 404
+        assert requests.get(f"{BASE_URL}/api/public/{new_username}").status_code == 200
+        print("✓ Username change invalidates the old public URL")
@@ -0,0 +1,60 @@
+"""
+FlexCard Signup Tests
+Tests that registration creates user, profile and session together
+"""
+
+import pytest
+import requests
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+def register(email):
+    return requests.post(
+        f"{BASE_URL}/api/auth/register",
+        json={"email": email, "name": "Signup Test", "password": "test123"}
+    )
+
+
+class TestSignup:
+    """Test the transactional signup flow"""
+
+    def test_register_creates_profile_with_public_url(self):
+        """A new account gets its profile and public_url in the same request"""
+        response = register(f"testsignup{int(time.time())}@test.com")
+        assert response.status_code == 200
+        headers = {"Authorization": f"Bearer {response.json()['session_token']}"}
+
+        profile = requests.get(f"{BASE_URL}/api/profile", headers=headers).json()
+        assert profile["public_url"].endswith(f"/u/{profile['username']}")
+        print(f"✓ Profile created with public URL {profile['public_url']}")
+
+        requests.delete(f"{BASE_URL}/api/profile", headers=headers)
+
+    def test_duplicate_email_rejected(self):
+        """Registering an existing email fails without creating anything"""
+        email = f"testsignupdup{int(time.time())}@test.com"
+        first = register(email)
+        assert first.status_code == 200
+        assert register(email).status_code == 400
+
+        requests.delete(f"{BASE_URL}/api/profile", headers={"Authorization": f"Bearer {first.json()['session_token']}"})
+        print("✓ Duplicate email rejected")
+
+    def test_concurrent_signups_get_distinct_usernames(self):
+        """Signups sharing an email local part each get a unique username"""
+        local = f"testsignupsame{int(time.time())}"
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            responses = list(pool.map(register, [f"{local}@domain{i}.com" for i in range(5)]))
+        assert all(r.status_code == 200 for r in responses)
+
+        usernames = set()
+        for r in responses:
+            headers = {"Authorization": f"Bearer {r.json()['session_token']}"}
+            usernames.add(requests.get(f"{BASE_URL}/api/profile", headers=headers).json()["username"])
+            requests.delete(f"{BASE_URL}/api/profile", headers=headers)
+        assert len(usernames) == 5
+        print(f"✓ Concurrent signups got distinct usernames: {sorted(usernames)}")
@@ -0,0 +1,275 @@
+"""
+FlexCard Streaming Upload Tests
+Tests for:
+- Multipart avatar/cover upload endpoints
+- Base64 JSON upload compatibility
+- Upload size limit
+- Resized WebP/JPEG variants
+"""
+
+import pytest
+import requests
+import os
+import io
+import base64
+import asyncio
+import asyncpg
+from PIL import Image
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Small test image (1x1 red pixel PNG)
+TEST_IMAGE_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg=="
+)
+
+
+class TestMultipartUpload:
+    """Test multipart/form-data upload endpoints"""
+
+    def test_avatar_file_upload(self, auth_headers):
+        """Avatar upload via multipart is stored and set on the profile"""
+        response = requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers=auth_headers,
+            files={"file": ("avatar.png", TEST_IMAGE_PNG, "image/png")}
+        )
+        assert response.status_code == 200
+        avatar_url = response.json()["avatar"]
+        assert avatar_url.startswith("/api/uploads/")
+
+        profile = requests.get(f"{BASE_URL}/api/profile", headers=auth_headers).json()
+        assert profile["avatar"] == avatar_url
+
+        image = requests.get(f"{BASE_URL}{avatar_url}")
+        assert image.status_code == 200
+        print(f"✓ Multipart avatar upload served at {avatar_url}")
+
+    def test_cover_file_upload(self, auth_headers):
+        """Cover upload via multipart switches the cover type to image"""
+        response = requests.post(
+            f"{BASE_URL}/api/upload/cover/file",
+            headers=auth_headers,
+            files={"file": ("cover.png", TEST_IMAGE_PNG, "image/png")}
+        )
+        assert response.status_code == 200
+        assert response.json()["cover_image"].startswith("/api/uploads/")
+
+        profile = requests.get(f"{BASE_URL}/api/profile", headers=auth_headers).json()
+        assert profile["cover_type"] == "image"
+        print("✓ Multipart cover upload works")
+
+    def test_avatar_variants(self, auth_headers):
+        """Avatar uploads are resized into square WebP and JPEG variants"""
+        buffer = io.BytesIO()
+        Image.new("RGB", (1024, 800), (134, 69, 214)).save(buffer, "JPEG")
+        response = requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers=auth_headers,
+            files={"file": ("avatar.jpg", buffer.getvalue(), "image/jpeg")}
+        )
+        assert response.status_code == 200
+
+        profile = requests.get(f"{BASE_URL}/api/profile", headers=auth_headers).json()
+        variants = profile["avatar_variants"]
+        assert profile["avatar"] == variants["jpeg"]["512"]
+        for fmt in ("jpeg", "webp"):
+            for size in ("128", "256", "512"):
+                image = requests.get(f"{BASE_URL}{variants[fmt][size]}")
+                assert image.status_code == 200
+                assert Image.open(io.BytesIO(image.content)).size == (int(size), int(size))
+        print("✓ Avatar variants generated at 128/256/512 in WebP and JPEG")
+
+    def test_rejects_corrupt_image(self, auth_headers):
+        """Bytes that are not a decodable image are rejected"""
+        response = requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers=auth_headers,
+            files={"file": ("avatar.png", b"not really a png", "image/png")}
+        )
+        assert response.status_code == 400
+        print("✓ Corrupt image rejected")
+
+    def test_rejects_non_image(self, auth_headers):
+        """Non-image content types are rejected"""
+        response = requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers=auth_headers,
+            files={"file": ("notes.txt", b"hello", "text/plain")}
+        )
+        assert response.status_code == 400
+        print("✓ Non-image upload rejected")
+
+    def test_rejects_missing_file(self, auth_headers):
+        """A form without a file field is rejected"""
+        response = requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers=auth_headers,
+            data={"other": "value"}
+        )
+        assert response.status_code == 400
+        print("✓ Missing file rejected")
+
+    def test_rejects_oversized_chunked_upload(self, auth_headers):
+        """The size limit also applies to chunked uploads, which have no Content-Length"""
+        boundary = "flexcardtestboundary"
+
+        def body():
+            yield (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="big.png"\r\n'
+                f'Content-Type: image/png\r\n\r\n'
+            ).encode()
+            for _ in range(200):  # 12.5 MB, over the default 10 MB limit
+                yield b"\0" * 65536
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+        response = requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers={**auth_headers, "Content-Type": f"multipart/form-data; boundary={boundary}"},
+            data=body()
+        )
+        assert response.status_code == 413
+        print("✓ Oversized chunked upload rejected")
+
+
+class TestBase64Compatibility:
+    """Test the legacy base64 JSON upload endpoints"""
+
+    def test_base64_avatar_upload(self, auth_headers):
+        """Base64 data URLs are still accepted"""
+        data_url = "data:image/png;base64," + base64.b64encode(TEST_IMAGE_PNG).decode()
+        response = requests.post(f"{BASE_URL}/api/upload/avatar", headers=auth_headers, json={"image": data_url})
+        assert response.status_code == 200
+        avatar_url = response.json()["avatar"]
+
+        image = requests.get(f"{BASE_URL}{avatar_url}")
+        assert image.status_code == 200
+        print("✓ Base64 avatar upload still works")
+
+    def test_base64_requires_image(self, auth_headers):
+        """Missing image data is rejected"""
+        response = requests.post(f"{BASE_URL}/api/upload/avatar", headers=auth_headers, json={})
+        assert response.status_code == 400
+        print("✓ Empty base64 upload rejected")
+
+
+class TestContentAddressedStore:
+    """Test that identical uploads share content-addressed files"""
+
+    def test_identical_uploads_are_deduplicated(self, auth_headers):
+        """Uploading the same bytes twice yields the same immutable URLs"""
+        buffer = io.BytesIO()
+        Image.new("RGB", (300, 300), (12, 140, 90)).save(buffer, "PNG")
+        upload = lambda: requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers=auth_headers,
+            files={"file": ("avatar.png", buffer.getvalue(), "image/png")}
+        )
+
+        first = upload()
+        assert first.status_code == 200
+        second = upload()
+        assert second.status_code == 200
+        assert first.json()["avatar"] == second.json()["avatar"]
+
+        filename = first.json()["avatar"].rsplit("/", 1)[-1]
+        assert len(filename.split(".")[0]) == 64
+
+        # Re-uploading dropped the old references but the file is still in use
+        assert requests.get(f"{BASE_URL}{first.json()['avatar']}").status_code == 200
+        print("✓ Identical uploads share one stored file")
+
+    @pytest.mark.skipif(not os.environ.get('SUPABASE_DB_URL'), reason="SUPABASE_DB_URL not set")
+    def test_profile_update_keeps_references(self, auth_headers):
+        """Setting avatar through PUT /profile retains the new file and releases the old ones"""
+        def ref_counts(urls):
+            async def query():
+                conn = await asyncpg.connect(os.environ['SUPABASE_DB_URL'])
+                try:
+                    rows = await conn.fetch(
+                        "SELECT filename, ref_count FROM upload_refs WHERE filename = ANY($1::text[])",
+                        [url.rsplit("/", 1)[-1] for url in urls]
+                    )
+                    return {row["filename"]: row["ref_count"] for row in rows}
+                finally:
+                    await conn.close()
+            return asyncio.run(query())
+
+        def upload(color):
+            buffer = io.BytesIO()
+            Image.new("RGB", (300, 300), color).save(buffer, "PNG")
+            response = requests.post(
+                f"{BASE_URL}/api/upload/avatar/file",
+                headers=auth_headers,
+                files={"file": ("avatar.png", buffer.getvalue(), "image/png")}
+            )
+            assert response.status_code == 200
+            return requests.get(f"{BASE_URL}/api/profile", headers=auth_headers).json()
+
+        # Uploaded then replaced by another upload: its files have no references left...
+        first = upload((250, 10, 10))
+        first_urls = [url for sizes in first["avatar_variants"].values() for url in sizes.values()]
+        second = upload((10, 10, 250))
+
+        # ...until a profile points back at one of them through PUT /profile
+        response = requests.put(f"{BASE_URL}/api/profile", headers=auth_headers, json={"avatar": first["avatar"]})
+        assert response.status_code == 200
+        counts = ref_counts(first_urls)
+        assert counts[first["avatar"].rsplit("/", 1)[-1]] == 1
+        second_urls = [url for sizes in second["avatar_variants"].values() for url in sizes.values()]
+        assert set(ref_counts(second_urls).values()) == {0}
+
+        # Replacing it with an external URL releases it again
+        requests.put(f"{BASE_URL}/api/profile", headers=auth_headers, json={"avatar": "https://example.com/me.jpg"})
+        assert ref_counts([first["avatar"]]) == {first["avatar"].rsplit("/", 1)[-1]: 0}
+        print("✓ PUT /profile retains and releases upload references")
+
+
+@pytest.fixture(scope="module")
+def avatar_url(auth_headers):
+    """Upload an avatar and return its absolute URL"""
+    response = requests.post(
+        f"{BASE_URL}/api/upload/avatar/file",
+        headers=auth_headers,
+        files={"file": ("avatar.png", TEST_IMAGE_PNG, "image/png")}
+    )
+    assert response.status_code == 200
+    return f"{BASE_URL}{response.json()['avatar']}"
+
+
+class TestUploadServing:
+    """Test cache headers, conditional requests and byte ranges on /api/uploads"""
+
+    def test_immutable_cache_headers(self, avatar_url):
+        """Content-addressed files are cacheable for a year with a strong ETag"""
+        response = requests.get(avatar_url)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        sha = avatar_url.rsplit("/", 1)[-1].split(".")[0]
+        assert response.headers["etag"] == f'"{sha}"'
+        print("✓ Immutable cache headers and strong ETag")
+
+    def test_if_none_match_returns_304(self, avatar_url):
+        """A matching If-None-Match is answered with 304 and no body"""
+        etag = requests.get(avatar_url).headers["etag"]
+        response = requests.get(avatar_url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        print("✓ If-None-Match returns 304")
+
+    def test_range_request(self, avatar_url):
+        """Byte ranges are answered with 206 and the requested slice"""
+        full = requests.get(avatar_url).content
+
+        response = requests.get(avatar_url, headers={"Range": "bytes=0-9"})
+        assert response.status_code == 206
+        assert response.content == full[:10]
+        assert response.headers["content-range"] == f"bytes 0-9/{len(full)}"
+
+        response = requests.get(avatar_url, headers={"Range": "bytes=-5"})
+        assert response.status_code == 206
+        assert response.content == full[-5:]
+
+        response = requests.get(avatar_url, headers={"Range": f"bytes={len(full)}-"})
+        assert response.status_code == 416
+        print("✓ Range requests return partial content")
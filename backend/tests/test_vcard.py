@@ -0,0 +1,133 @@
+"""
+FlexCard vCard Tests
+Tests the server-generated vCard download of public profiles
+"""
+
+import pytest
+import requests
+import os
+import io
+import time
+import base64
+import subprocess
+import sys
+from PIL import Image
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+API_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'api')
+
+# Registers a user through the Vercel entry point and downloads its vCard there
+SERVERLESS_VCARD_SCRIPT = """
+import asyncio, sys, httpx, index
+
+async def main():
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://serverless") as client:
+        response = await client.post("/api/auth/register", json={"email": sys.argv[1], "name": "Serverless Vcard", "password": "test123"})
+        headers = {"Authorization": "Bearer " + response.json()["session_token"]}
+        username = (await client.get("/api/profile", headers=headers)).json()["username"]
+        response = await client.get("/api/public/" + username + "/vcard")
+        print(response.status_code)
+        print(response.headers.get("content-type"))
+        print(response.text)
+        await client.delete("/api/profile", headers=headers)
+
+asyncio.run(main())
+"""
+
+
+@pytest.fixture(scope="module")
+def vcard_user(registered_user):
+    """Give the registered user contact details and return (headers, username)"""
+    headers, _ = registered_user
+    requests.put(f"{BASE_URL}/api/profile", headers=headers, json={
+        "first_name": "Zoé", "last_name": "Martin", "company": "Acme, Inc; Paris",
+        "bio": "Line one\nLine two " + "long text " * 20,
+        "phones": [{"type": "phone", "value": "+33 6 12 34 56 78", "label": "Mobile"}],
+    })
+    profile = requests.get(f"{BASE_URL}/api/profile", headers=headers).json()
+    return headers, profile["username"]
+
+
+def unfold(content):
+    return content.replace("\r\n ", "").split("\r\n")
+
+
+class TestVcard:
+    """Test GET /api/public/{username}/vcard"""
+
+    def test_unknown_username(self):
+        """An unknown username returns 404"""
+        response = requests.get(f"{BASE_URL}/api/public/nosuchuser{int(time.time())}/vcard")
+        assert response.status_code == 404
+        print("✓ Unknown username returns 404")
+
+    def test_vcard_is_well_formed(self, vcard_user):
+        """The vCard is 3.0, escaped, folded at 75 octets and served as a download"""
+        headers, username = vcard_user
+        response = requests.get(f"{BASE_URL}/api/public/{username}/vcard")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/vcard")
+        assert "attachment" in response.headers["content-disposition"]
+
+        raw = response.content
+        assert all(len(line) <= 75 for line in raw.split(b"\r\n"))
+        lines = unfold(raw.decode("utf-8"))
+        assert lines[:2] == ["BEGIN:VCARD", "VERSION:3.0"]
+        assert lines[-2:] == ["END:VCARD", ""]
+        assert "FN:Zoé Martin" in lines
+        assert "N:Martin;Zoé;;;" in lines
+        assert "ORG:Acme\\, Inc\\; Paris" in lines
+        assert "TEL;TYPE=CELL:+33 6 12 34 56 78" in lines
+        assert any(line.startswith("NOTE:Line one\\nLine two") for line in lines)
+        print("✓ vCard is well formed")
+
+    def test_vcard_revalidates_and_follows_updates(self, vcard_user):
+        """The cached vCard answers 304, and a profile update produces a new one"""
+        headers, username = vcard_user
+        first = requests.get(f"{BASE_URL}/api/public/{username}/vcard")
+        response = requests.get(f"{BASE_URL}/api/public/{username}/vcard", headers={"If-None-Match": first.headers["etag"]})
+        assert response.status_code == 304
+
+        requests.put(f"{BASE_URL}/api/profile", headers=headers, json={"title": "Directrice"})
+        second = requests.get(f"{BASE_URL}/api/public/{username}/vcard")
+        assert second.headers["etag"] != first.headers["etag"]
+        assert "TITLE:Directrice" in unfold(second.content.decode("utf-8"))
+        print("✓ vCard cache follows profile updates")
+
+    def test_vcard_embeds_downscaled_photo(self, vcard_user):
+        """An uploaded avatar is embedded as a JPEG of at most 256 px"""
+        headers, username = vcard_user
+        buffer = io.BytesIO()
+        Image.new("RGB", (1200, 900), (30, 120, 200)).save(buffer, "PNG")
+        response = requests.post(
+            f"{BASE_URL}/api/upload/avatar/file",
+            headers=headers,
+            files={"file": ("avatar.png", buffer.getvalue(), "image/png")}
+        )
+        assert response.status_code == 200
+
+        lines = unfold(requests.get(f"{BASE_URL}/api/public/{username}/vcard").content.decode("utf-8"))
+        photo = [line for line in lines if line.startswith("PHOTO;ENCODING=b;TYPE=JPEG:")]
+        assert len(photo) == 1
+        image = Image.open(io.BytesIO(base64.b64decode(photo[0].split(":", 1)[1])))
+        assert image.format == "JPEG"
+        assert max(image.size) <= 256
+        print(f"✓ Photo embedded at {image.size[0]}x{image.size[1]}")
+
+
+@pytest.mark.skipif(not os.environ.get('SUPABASE_DB_URL'), reason="SUPABASE_DB_URL not set")
+class TestServerlessVcard:
+    """Test that the Vercel entry point (api/index.py) serves the vCard route too"""
+
+    def test_vcard_route_exists(self):
+        """GET /api/public/{username}/vcard works on api/index.py"""
+        result = subprocess.run(
+            [sys.executable, "-c", SERVERLESS_VCARD_SCRIPT, f"testvcardserverless{time.time_ns()}@test.com"],
+            cwd=API_DIR, capture_output=True, text=True, check=True
+        )
+        status, content_type, vcard = result.stdout.split("\n", 2)
+        assert status == "200"
+        assert content_type.startswith("text/vcard")
+        assert "FN:Serverless Vcard" in vcard.splitlines()
+        print("✓ Serverless entry point serves vCards")
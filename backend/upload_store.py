@@ -0,0 +1,220 @@
+"""
+Content-Addressed Upload Store
+Stores uploaded files under the SHA-256 of their content, reference counted
+from the profile image columns and garbage collected once unreferenced, and
+serves them with immutable caching and byte-range support
+"""
+
+import os
+import re
+import asyncio
+import time
+import uuid
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, PlainTextResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from supabase_db import acquire_uploads, release_uploads, get_referenced_uploads, forget_uploads
+
+logger = logging.getLogger(__name__)
+
+# <sha256>.<ext> - anything else in the uploads directory is a legacy upload
+CONTENT_NAME_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+# A content-addressed URL never changes meaning; legacy files can be overwritten
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class UploadStore:
+    """Content-addressed files in a directory, served under url_prefix"""
+
+    def __init__(self, root: Path, url_prefix: str = "/api/uploads/"):
+        self.root = root
+        self.url_prefix = url_prefix
+        self._gc_task: Optional[asyncio.Task] = None
+
+    def put_bytes(self, data: bytes, extension: str) -> str:
+        """Store data (once) and return its filename"""
+        filename = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = self.root / filename
+        if path.exists():
+            # Refresh mtime so a concurrent garbage collection keeps the file
+            os.utime(path)
+        else:
+            tmp_path = self.root / f".{filename}.{uuid.uuid4().hex}.part"
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        return filename
+
+    def url_for(self, filename: str) -> str:
+        return f"{self.url_prefix}{filename}"
+
+    def filename_for(self, url: Optional[str]) -> Optional[str]:
+        """Return the content-addressed filename behind a URL, or None"""
+        if not url or not url.startswith(self.url_prefix):
+            return None
+        filename = url[len(self.url_prefix):]
+        return filename if CONTENT_NAME_RE.match(filename) else None
+
+    async def retain(self, urls: Iterable[str]) -> None:
+        """Add one reference to each distinct content-addressed URL"""
+        filenames = self._filenames(urls)
+        if filenames:
+            await acquire_uploads(filenames)
+
+    async def release(self, urls: Iterable[str]) -> None:
+        """Drop one reference from each distinct content-addressed URL"""
+        filenames = self._filenames(urls)
+        if filenames:
+            await release_uploads(filenames)
+
+    async def collect_garbage(self, grace_seconds: float) -> int:
+        """Delete stored files without references, untouched for grace_seconds"""
+        cutoff = time.time() - grace_seconds
+        candidates = [
+            entry.name for entry in os.scandir(self.root)
+            if CONTENT_NAME_RE.match(entry.name) and entry.stat().st_mtime < cutoff
+        ]
+        if not candidates:
+            return 0
+
+        referenced = set(await get_referenced_uploads(candidates))
+        deleted = []
+        for filename in candidates:
+            if filename in referenced:
+                continue
+            path = self.root / filename
+            try:
+                # Re-check: an upload of the same content may have just touched it
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    deleted.append(filename)
+            except FileNotFoundError:
+                pass
+
+        if deleted:
+            await forget_uploads(deleted)
+            logger.info(f"Upload GC removed {len(deleted)} unreferenced files")
+        return len(deleted)
+
+    async def _gc_loop(self, interval: float, grace_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.collect_garbage(grace_seconds)
+            except Exception as e:
+                logger.error(f"Upload GC failed: {e}")
+
+    def start_collector(self, interval: float, grace_seconds: float) -> None:
+        """Start the periodic garbage collection task"""
+        if self._gc_task is None:
+            self._gc_task = asyncio.get_running_loop().create_task(self._gc_loop(interval, grace_seconds))
+
+    async def stop_collector(self) -> None:
+        """Stop the periodic garbage collection task"""
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            try:
+                await self._gc_task
+            except asyncio.CancelledError:
+                pass
+            self._gc_task = None
+
+    def _filenames(self, urls: Iterable[str]) -> List[str]:
+        return sorted({name for name in (self.filename_for(url) for url in urls) if name})
+
+
+class FileRangeResponse(FileResponse):
+    """206 response carrying bytes start..end (inclusive) of a file"""
+
+    def __init__(self, path: str, start: int, end: int, stat_result: os.stat_result, headers: dict):
+        super().__init__(path, status_code=206, headers=headers, stat_result=stat_result)
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start + 1)
+        self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+
+class UploadFiles(StaticFiles):
+    """StaticFiles for the uploads directory
+
+    Content-addressed files are cached for a year as immutable, with their
+    SHA-256 as a strong ETag. Conditional requests are answered from the file's
+    stat alone, and single byte ranges get a 206. Full responses go through
+    FileResponse, which hands the path to the server (zero-copy) when it
+    supports the ASGI pathsend extension.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope,
+                      status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        filename = os.path.basename(full_path)
+        headers = {"accept-ranges": "bytes"}
+        if CONTENT_NAME_RE.match(filename):
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+            headers["etag"] = f'"{filename.split(".", 1)[0]}"'
+        else:
+            headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+
+        response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if status_code != 200 or not range_header or (if_range and if_range != response.headers["etag"]):
+            return response
+
+        byte_range = self.parse_range(range_header, stat_result.st_size)
+        if byte_range is None:
+            return response  # multiple or malformed ranges: send the whole file
+        if byte_range == ():
+            return PlainTextResponse(
+                "Range Not Satisfiable", status_code=416,
+                headers={"content-range": f"bytes */{stat_result.st_size}"}
+            )
+        start, end = byte_range
+        headers["etag"] = response.headers["etag"]
+        return FileRangeResponse(full_path, start, end, stat_result, headers)
+
+    @staticmethod
+    def parse_range(range_header: str, size: int):
+        """Parse a single "bytes=" range into (start, end); () if unsatisfiable, None if unsupported"""
+        match = RANGE_RE.match(range_header.strip())
+        if not match or match.groups() == ("", ""):
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        else:
+            start, end = max(size - int(last), 0), size - 1
+            if int(last) == 0:
+                return ()
+        if start >= size:
+            return ()
+        return start, end
@@ -0,0 +1,138 @@
+"""
+vCard Module
+Builds vCard 3.0 (RFC 2426) contact files from public profiles
+"""
+
+import base64
+import hashlib
+import urllib.parse
+from typing import Dict, List, Optional
+
+# Contact labels (as entered in the dashboard) to vCard TYPE values
+EMAIL_TYPES = {"pro": "WORK", "work": "WORK", "travail": "WORK", "bureau": "WORK",
+               "perso": "HOME", "personnel": "HOME", "home": "HOME", "domicile": "HOME"}
+PHONE_TYPES = {**EMAIL_TYPES, "mobile": "CELL", "portable": "CELL", "cell": "CELL", "fixe": "VOICE"}
+
+MAX_LINE_OCTETS = 75
+
+def escape(value) -> str:
+    """Escape a text value (backslash, comma, semicolon, newlines)"""
+    return (
+        str(value).replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+        .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+    )
+
+def uri(value) -> str:
+    """A URI value: not escaped, but kept on one line"""
+    return "".join(str(value).split())
+
+def fold(line: str) -> List[str]:
+    """Split a content line into chunks of at most 75 octets, never inside a UTF-8 character"""
+    chunks, current, size = [], [], 0
+    for char in line:
+        octets = len(char.encode())
+        # Continuation lines start with a space, which counts toward their length
+        limit = MAX_LINE_OCTETS if not chunks else MAX_LINE_OCTETS - 1
+        if size + octets > limit:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += octets
+    chunks.append("".join(current))
+    return chunks
+
+def _serialize(lines: List[str]) -> bytes:
+    """Folded, CRLF-terminated content lines"""
+    return "".join(
+        "\r\n ".join(fold(line)) + "\r\n" for line in lines
+    ).encode("utf-8")
+
+def _typed(values: Optional[List[Dict]], types: Dict[str, str], defaults: tuple) -> List[tuple]:
+    """(TYPE, value) pairs from the profile's [{value, label}] contact lists"""
+    pairs = []
+    for index, item in enumerate(values or []):
+        if not item.get("value"):
+            continue
+        label = (item.get("label") or "").strip().lower()
+        pairs.append((types.get(label, defaults[0] if index == 0 else defaults[1]), item["value"]))
+    return pairs
+
+def build_vcard(profile: Dict, links: List[Dict], profile_url: str, photo: Optional[bytes] = None) -> bytes:
+    """vCard of a public profile, with an optional JPEG photo embedded"""
+    first_name = profile.get("first_name") or ""
+    last_name = profile.get("last_name") or ""
+    display_name = " ".join(part for part in (first_name, last_name) if part) or profile.get("title") or profile["username"]
+
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"FN:{escape(display_name)}",
+        f"N:{escape(last_name)};{escape(first_name)};;;",
+    ]
+    if profile.get("title"):
+        lines.append(f"TITLE:{escape(profile['title'])}")
+    if profile.get("company"):
+        lines.append(f"ORG:{escape(profile['company'])}")
+
+    emails = _typed(profile.get("emails"), EMAIL_TYPES, ("WORK", "HOME"))
+    if not emails and profile.get("email"):
+        emails = [("WORK", profile["email"])]
+    lines.extend(f"EMAIL;TYPE=INTERNET,{kind}:{escape(value)}" for kind, value in emails)
+
+    phones = _typed(profile.get("phones"), PHONE_TYPES, ("CELL", "WORK"))
+    if not phones and profile.get("phone"):
+        phones = [("CELL", profile["phone"])]
+    lines.extend(f"TEL;TYPE={kind}:{escape(value)}" for kind, value in phones)
+
+    if profile.get("website"):
+        website = profile["website"]
+        if not website.startswith(("http://", "https://")):
+            website = f"https://{website}"
+        lines.append(f"URL:{uri(website)}")
+    if profile.get("location"):
+        lines.append(f"ADR;TYPE=WORK:;;{escape(profile['location'])};;;;")
+    if profile.get("bio"):
+        lines.append(f"NOTE:{escape(profile['bio'])}")
+
+    for link in links:
+        if link.get("url"):
+            platform = "".join(c for c in (link.get("platform") or "other") if c.isalnum()) or "other"
+            lines.append(f"X-SOCIALPROFILE;TYPE={platform}:{uri(link['url'])}")
+    lines.append(f"URL;TYPE=FlexCard:{uri(profile_url)}")
+
+    if photo:
+        lines.append(f"PHOTO;ENCODING=b;TYPE=JPEG:{base64.b64encode(photo).decode()}")
+    lines.append("END:VCARD")
+    return _serialize(lines)
+
+def build_contact_vcard(contact: Dict) -> bytes:
+    """vCard of a contact collected through a profile's contact form"""
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"FN:{escape(contact['name'])}",
+        f"N:{escape(contact['name'])};;;;",
+    ]
+    if contact.get("email"):
+        lines.append(f"EMAIL;TYPE=INTERNET:{escape(contact['email'])}")
+    if contact.get("phone"):
+        lines.append(f"TEL;TYPE=CELL:{escape(contact['phone'])}")
+    if contact.get("message"):
+        lines.append(f"NOTE:{escape(contact['message'])}")
+    if contact.get("created_at"):
+        lines.append(f"REV:{contact['created_at'].strftime('%Y-%m-%dT%H:%M:%SZ')}")
+    lines.append("END:VCARD")
+    return _serialize(lines)
+
+def vcard_headers(profile: Dict, content: bytes) -> Dict[str, str]:
+    """ETag, caching and download filename headers for a profile's vCard"""
+    display_name = " ".join(part for part in (profile.get("first_name"), profile.get("last_name")) if part)
+    filename = "_".join((display_name or profile["username"]).split()) + ".vcf"
+    ascii_filename = filename.encode("ascii", "ignore").decode().replace('"', "").replace("\\", "")
+    return {
+        "ETag": f'"{hashlib.sha256(content).hexdigest()[:32]}"',
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": (
+            f'attachment; filename="{ascii_filename}"; filename*=UTF-8\'\'{urllib.parse.quote(filename)}'
+        ),
+    }
@@ -115,128 +115,10 @@ const PublicProfile = () => {
     }
   };
 
-  const handleSaveContact = async () => {
+  const handleSaveContact = () => {
     if (!data?.profile) return;
-    const { profile, links } = data;
-    
-    const displayName = [profile.first_name, profile.last_name].filter(Boolean).join(" ") || profile.title || username;
-    const firstName = profile.first_name || "";
-    const lastName = profile.last_name || "";
-    
-    // Build vCard with all information
-    let vcardLines = [
-      "BEGIN:VCARD",
-      "VERSION:3.0",
-      `FN:${displayName}`,
-      `N:${lastName};${firstName};;;`,
-    ];
-    
-    // Add title and organization
-    if (profile.title) vcardLines.push(`TITLE:${profile.title}`);
-    if (profile.company) vcardLines.push(`ORG:${profile.company}`);
-    
-    // Add all emails with labels
-    if (profile.emails && profile.emails.length > 0) {
-      profile.emails.forEach((email, index) => {
-        const type = email.label?.toUpperCase() || (index === 0 ? "WORK" : "HOME");
-        vcardLines.push(`EMAIL;TYPE=${type}:${email.value}`);
-      });
-    } else if (profile.email) {
-      vcardLines.push(`EMAIL:${profile.email}`);
-    }
-    
-    // Add all phone numbers with labels
-    if (profile.phones && profile.phones.length > 0) {
-      profile.phones.forEach((phone, index) => {
-        const type = phone.label?.toUpperCase() || (index === 0 ? "CELL" : "WORK");
-        vcardLines.push(`TEL;TYPE=${type}:${phone.value}`);
-      });
-    } else if (profile.phone) {
-      vcardLines.push(`TEL:${profile.phone}`);
-    }
-    
-    // Add website
-    if (profile.website) vcardLines.push(`URL:${ensureProtocol(profile.website)}`);
-    
-    // Add location
-    if (profile.location) vcardLines.push(`ADR:;;${profile.location};;;;`);
-    
-    // Add bio as note
-    if (profile.bio) vcardLines.push(`NOTE:${profile.bio.replace(/\n/g, "\\n")}`);
-    
-    // Add social media links as URLs
-    if (links && links.length > 0) {
-      links.forEach(link => {
-        if (link.url) {
-          vcardLines.push(`X-SOCIALPROFILE;TYPE=${link.platform || "other"}:${link.url}`);
-        }
-      });
-    }
-    
-    // Add profile URL
-    vcardLines.push(`URL;TYPE=FlexCard:${window.location.href}`);
-    
-    // Helper function to download vCard
-    const downloadVCard = (vcardContent) => {
-      const blob = new Blob([vcardContent], { type: "text/vcard;charset=utf-8" });
-      const url = URL.createObjectURL(blob);
-      const link = document.createElement("a");
-      link.href = url;
-      link.download = `${displayName.replace(/\s+/g, "_")}.vcf`;
-      document.body.appendChild(link);
-      link.click();
-      document.body.removeChild(link);
-      URL.revokeObjectURL(url);
-    };
-    
-    // Try to add profile photo
-    const avatarUrl = getAvatarUrl(profile);
-    if (avatarUrl) {
-      try {
-        // Build full URL for avatar
-        let fullAvatarUrl = avatarUrl;
-        if (avatarUrl.startsWith("/")) {
-          fullAvatarUrl = `${window.location.origin}${avatarUrl}`;
-        }
-        
-        // Fetch the image and convert to base64
-        const response = await fetch(fullAvatarUrl);
-        if (response.ok) {
-          const blob = await response.blob();
-          const reader = new FileReader();
-          
-          reader.onloadend = () => {
-            const base64data = reader.result.split(',')[1];
-            if (base64data) {
-              const mimeType = blob.type || "image/jpeg";
-              const photoType = mimeType.includes("png") ? "PNG" : "JPEG";
-              vcardLines.push(`PHOTO;ENCODING=b;TYPE=${photoType}:${base64data}`);
-            }
-            vcardLines.push("END:VCARD");
-            downloadVCard(vcardLines.join("\r\n"));
-          };
-          
-          reader.onerror = () => {
-            vcardLines.push("END:VCARD");
-            downloadVCard(vcardLines.join("\r\n"));
-          };
-          
-          reader.readAsDataURL(blob);
-        } else {
-          // If fetch fails, download without photo
-          vcardLines.push("END:VCARD");
-          downloadVCard(vcardLines.join("\r\n"));
-        }
-      } catch (err) {
-        console.error("Error loading photo for vCard:", err);
-        vcardLines.push("END:VCARD");
-        downloadVCard(vcardLines.join("\r\n"));
-      }
-    } else {
-      // No photo, download directly
-      vcardLines.push("END:VCARD");
-      downloadVCard(vcardLines.join("\r\n"));
-    }
+    // The backend builds the vCard (with a downscaled photo) and records the save
+    window.location.href = `${API}/public/${data.profile.username}/vcard`;
   };
 
   const handleShare = async () => {
@@ -677,62 +559,10 @@ const ProfileByUserId = () => {
     }
   };
 
-  const handleSaveContact = async () => {
+  const handleSaveContact = () => {
     if (!data?.profile) return;
-    const { profile, links } = data;
-    
-    const displayName = [profile.first_name, profile.last_name].filter(Boolean).join(" ") || profile.title || "Contact";
-    const firstName = profile.first_name || "";
-    const lastName = profile.last_name || "";
-    
-    let vcardLines = [
-      "BEGIN:VCARD",
-      "VERSION:3.0",
-      `FN:${displayName}`,
-      `N:${lastName};${firstName};;;`,
-    ];
-    
-    if (profile.title) vcardLines.push(`TITLE:${profile.title}`);
-    if (profile.company) vcardLines.push(`ORG:${profile.company}`);
-    
-    if (profile.emails && profile.emails.length > 0) {
-      profile.emails.forEach((email, index) => {
-        const type = email.label?.toUpperCase() || (index === 0 ? "WORK" : "HOME");
-        vcardLines.push(`EMAIL;TYPE=${type}:${email.value}`);
-      });
-    }
-    
-    if (profile.phones && profile.phones.length > 0) {
-      profile.phones.forEach((phone, index) => {
-        const type = phone.label?.toUpperCase() || (index === 0 ? "CELL" : "WORK");
-        vcardLines.push(`TEL;TYPE=${type}:${phone.value}`);
-      });
-    }
-    
-    if (profile.website) vcardLines.push(`URL:${ensureProtocol(profile.website)}`);
-    if (profile.location) vcardLines.push(`ADR:;;${profile.location};;;;`);
-    if (profile.bio) vcardLines.push(`NOTE:${profile.bio.replace(/\n/g, "\\n")}`);
-    
-    if (links && links.length > 0) {
-      links.forEach(link => {
-        if (link.url) {
-          vcardLines.push(`X-SOCIALPROFILE;TYPE=${link.platform || "other"}:${link.url}`);
-        }
-      });
-    }
-    
-    vcardLines.push(`URL;TYPE=FlexCard:${window.location.href}`);
-    vcardLines.push("END:VCARD");
-    
-    const blob = new Blob([vcardLines.join("\r\n")], { type: "text/vcard;charset=utf-8" });
-    const url = URL.createObjectURL(blob);
-    const link = document.createElement("a");
-    link.href = url;
-    link.download = `${displayName.replace(/\s+/g, "_")}.vcf`;
-    document.body.appendChild(link);
-    link.click();
-    document.body.removeChild(link);
-    URL.revokeObjectURL(url);
+    // The backend builds the vCard (with a downscaled photo) and records the save
+    window.location.href = `${API}/public/${data.profile.username}/vcard`;
   };
 
   const handleShare = async () => {
@@ -991,108 +821,10 @@ const PublicProfileWithCard = () => {
     }
   };
 
-  const handleSaveContact = async () => {
+  const handleSaveContact = () => {
     if (!data?.profile) return;
-    const { profile, links } = data;
-    
-    const displayName = [profile.first_name, profile.last_name].filter(Boolean).join(" ") || profile.title || username;
-    const firstName = profile.first_name || "";
-    const lastName = profile.last_name || "";
-    
-    let vcardLines = [
-      "BEGIN:VCARD",
-      "VERSION:3.0",
-      `FN:${displayName}`,
-      `N:${lastName};${firstName};;;`,
-    ];
-    
-    if (profile.title) vcardLines.push(`TITLE:${profile.title}`);
-    if (profile.company) vcardLines.push(`ORG:${profile.company}`);
-    
-    if (profile.emails && profile.emails.length > 0) {
-      profile.emails.forEach((email, index) => {
-        const type = email.label?.toUpperCase() || (index === 0 ? "WORK" : "HOME");
-        vcardLines.push(`EMAIL;TYPE=${type}:${email.value}`);
-      });
-    }
-    
-    if (profile.phones && profile.phones.length > 0) {
-      profile.phones.forEach((phone, index) => {
-        const type = phone.label?.toUpperCase() || (index === 0 ? "CELL" : "WORK");
-        vcardLines.push(`TEL;TYPE=${type}:${phone.value}`);
-      });
-    }
-    
-    if (profile.website) vcardLines.push(`URL:${ensureProtocol(profile.website)}`);
-    if (profile.location) vcardLines.push(`ADR:;;${profile.location};;;;`);
-    if (profile.bio) vcardLines.push(`NOTE:${profile.bio.replace(/\n/g, "\\n")}`);
-    
-    if (links && links.length > 0) {
-      links.forEach(link => {
-        if (link.url) {
-          vcardLines.push(`X-SOCIALPROFILE;TYPE=${link.platform || "other"}:${link.url}`);
-        }
-      });
-    }
-    
-    vcardLines.push(`URL;TYPE=FlexCard:${window.location.href}`);
-    
-    // Try to add profile photo
-    const avatarUrl = getAvatarUrl(profile);
-    
-    const downloadVCard = (vcardContent) => {
-      const blob = new Blob([vcardContent], { type: "text/vcard;charset=utf-8" });
-      const url = URL.createObjectURL(blob);
-      const link = document.createElement("a");
-      link.href = url;
-      link.download = `${displayName.replace(/\s+/g, "_")}.vcf`;
-      document.body.appendChild(link);
-      link.click();
-      document.body.removeChild(link);
-      URL.revokeObjectURL(url);
-    };
-    
-    if (avatarUrl) {
-      try {
-        let fullAvatarUrl = avatarUrl;
-        if (avatarUrl.startsWith("/")) {
-          fullAvatarUrl = `${window.location.origin}${avatarUrl}`;
-        }
-        
-        const response = await fetch(fullAvatarUrl);
-        if (response.ok) {
-          const blob = await response.blob();
-          const reader = new FileReader();
-          
-          reader.onloadend = () => {
-            const base64data = reader.result.split(',')[1];
-            if (base64data) {
-              const mimeType = blob.type || "image/jpeg";
-              const photoType = mimeType.includes("png") ? "PNG" : "JPEG";
-              vcardLines.push(`PHOTO;ENCODING=b;TYPE=${photoType}:${base64data}`);
-            }
-            vcardLines.push("END:VCARD");
-            downloadVCard(vcardLines.join("\r\n"));
-          };
-          
-          reader.onerror = () => {
-            vcardLines.push("END:VCARD");
-            downloadVCard(vcardLines.join("\r\n"));
-          };
-          
-          reader.readAsDataURL(blob);
-        } else {
-          vcardLines.push("END:VCARD");
-          downloadVCard(vcardLines.join("\r\n"));
-        }
-      } catch (err) {
-        vcardLines.push("END:VCARD");
-        downloadVCard(vcardLines.join("\r\n"));
-      }
-    } else {
-      vcardLines.push("END:VCARD");
-      downloadVCard(vcardLines.join("\r\n"));
-    }
+    // The backend builds the vCard (with a downscaled photo) and records the save
+    window.location.href = `${API}/public/${data.profile.username}/vcard`;
   };
 
   const handleShare = async () => {